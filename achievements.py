@@ -0,0 +1,346 @@
+import argparse
+import bisect
+import sys
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import archive
+import database
+import money
+import storage
+
+# Milestones and achievements are declared once here and evaluated against a
+# small per-user counter row that every write keeps up to date, so checking
+# them costs O(rules) no matter how long the user's history is.
+
+COUNTERS = (
+    "expense_count", "needs_cents", "wants_cents", "completed_goals", "balance_high_water_cents",
+    "reward_count", "savings_streak_weeks",
+)
+
+# metric: a counter name or a derived metric from METRICS below.
+# reward: earned rules are stored in the rewards table (and shown as trophies);
+#         otherwise the rule is a display-only achievement.
+# bonus_xp: FinPet XP granted once, when a reward is first earned.
+# Names are unique across RULES: stored rewards are deduplicated by name.
+Rule = namedtuple("Rule", "name description icon metric threshold reward bonus_xp")
+
+RULES = [
+    # Savings milestones
+    Rule("Saving Starter", "Saved your first $100", "💰", "balance_high_water_cents", money.to_cents(100), True, 1),
+    Rule("Penny Pincher", "Reached $500 in savings", "🪙", "balance_high_water_cents", money.to_cents(500), True, 5),
+    Rule("Money Master", "Saved $1,000", "💵", "balance_high_water_cents", money.to_cents(1000), True, 10),
+    Rule("Wealth Builder", "Accumulated $5,000 in savings", "🏆", "balance_high_water_cents", money.to_cents(5000), True, 50),
+    # FinPet level milestones
+    Rule("Level 5 Badge", "Reached level 5 with your FinPet", "🌱", "level", 5, True, 0),
+    Rule("Hatched", "Your FinPet hatched from its egg at level 10", "🐣", "level", 10, True, 0),
+    Rule("Evolution", "Your FinPet evolved to its teen form", "✨", "level", 20, True, 0),
+    Rule("Final Form", "Your FinPet reached its final form", "🌟", "level", 30, True, 0),
+    # Achievements shown on the FinPet page
+    Rule("First Steps", "Reached level 5", "🏆", "level", 5, False, 0),
+    Rule("Hatchling", "Reached level 10 and hatched from egg", "🏆", "level", 10, False, 0),
+    Rule("Growing Up", "Reached level 20 and evolved", "🏆", "level", 20, False, 0),
+    Rule("Financial Master", "Reached level 30 and achieved final form", "🏆", "level", 30, False, 0),
+    Rule("Tracker Beginner", "Recorded 10+ expenses", "📊", "expense_count", 10, False, 0),
+    Rule("Expense Expert", "Recorded 50+ expenses", "📊", "expense_count", 50, False, 0),
+    Rule("Needs-Focused", "60%+ of spending on needs", "🧠", "needs_ratio", 0.6, False, 0),
+    Rule("Frugality Master", "80%+ of spending on needs", "🧠", "needs_ratio", 0.8, False, 0),
+    Rule("Goal Getter", "Completed first savings goal", "🎯", "completed_goals", 1, False, 0),
+    Rule("Goal Master", "Completed 3+ savings goals", "🎯", "completed_goals", 3, False, 0),
+]
+
+def _needs_ratio(counters):
+    total = counters["needs_cents"] + counters["wants_cents"]
+    return counters["needs_cents"] / total if total > 0 else 0
+
+METRICS = {
+    "needs_ratio": _needs_ratio,
+}
+
+# ------------------------
+# Counters
+# ------------------------
+
+# Monday of the week a movement falls in
+_WEEK_EXPR = "date(m.date, 'weekday 0', '-6 days')"
+
+# Distinct weeks with a deposit, newest first, tagged so consecutive weeks share a group
+_DEPOSIT_WEEKS = f'''
+    SELECT week, CAST(julianday(week) AS INTEGER) / 7 + ROW_NUMBER() OVER (ORDER BY week DESC) AS grp
+    FROM (
+        SELECT DISTINCT {_WEEK_EXPR} AS week FROM money_movements m
+        WHERE m.user_id = u.id AND m.kind = 'deposit' AND m.amount_cents > 0
+    )
+'''
+
+# Recomputes the counters from full history; only used to seed a missing row
+_REBUILD_QUERY = '''
+INSERT OR REPLACE INTO user_counters (user_id, {counters}, last_savings_week)
+SELECT u.id,
+       (SELECT COUNT(*) FROM expenses e WHERE e.user_id = u.id),
+       (SELECT COALESCE(SUM(e.amount_cents), 0) FROM expenses e WHERE e.user_id = u.id AND e.type = 'Needs'),
+       (SELECT COALESCE(SUM(e.amount_cents), 0) FROM expenses e WHERE e.user_id = u.id AND e.type = 'Wants'),
+       (SELECT COUNT(*) FROM goals g WHERE g.user_id = u.id AND g.current_cents >= g.target_cents),
+       (SELECT COALESCE(MAX(running), 0) FROM (
+            SELECT SUM(m.amount_cents) OVER (ORDER BY m.id) AS running
+            FROM money_movements m WHERE m.user_id = u.id
+       )),
+       (SELECT COUNT(*) FROM rewards r WHERE r.user_id = u.id),
+       (SELECT COUNT(*) FROM (
+            SELECT grp, MAX(grp) OVER () AS latest FROM ({deposit_weeks})
+       ) WHERE grp = latest),
+       (SELECT MAX({week}) FROM money_movements m
+        WHERE m.user_id = u.id AND m.kind = 'deposit' AND m.amount_cents > 0)
+FROM users u
+'''.format(counters=", ".join(COUNTERS), deposit_weeks=_DEPOSIT_WEEKS, week=_WEEK_EXPR)
+
+# Adds archived expenses (see archive.py) to the counters _REBUILD_QUERY wrote
+_ARCHIVED_QUERY = '''
+UPDATE user_counters
+SET expense_count = expense_count + a.expenses,
+    needs_cents = needs_cents + a.needs,
+    wants_cents = wants_cents + a.wants
+FROM (
+    SELECT user_id,
+           COUNT(*) AS expenses,
+           COALESCE(SUM(amount_cents) FILTER (WHERE type = 'Needs'), 0) AS needs,
+           COALESCE(SUM(amount_cents) FILTER (WHERE type = 'Wants'), 0) AS wants
+    FROM temp.archived_expenses
+    GROUP BY user_id
+) AS a
+WHERE user_counters.user_id = a.user_id
+'''
+
+def rebuild_counters(conn, user_id=None, commit=True):
+    """Recompute counters from history for one user, or for every user. Returns the number of rows written."""
+    cursor = conn.cursor()
+    if user_id is None:
+        cursor.execute(_REBUILD_QUERY)
+    else:
+        cursor.execute(_REBUILD_QUERY + " WHERE u.id = ?", (user_id,))
+    written = cursor.rowcount
+    archive.load_temp(conn, None if user_id is None else [user_id])
+    cursor.execute(_ARCHIVED_QUERY)
+    archive.drop_temp(conn)
+    if commit:
+        conn.commit()
+    return written
+
+def seed_counters(conn):
+    """Rebuild counters for every user without a row, without committing. Returns the users seeded."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM users WHERE id NOT IN (SELECT user_id FROM user_counters)")
+    user_ids = [row[0] for row in cursor.fetchall()]
+    for user_id in user_ids:
+        rebuild_counters(conn, user_id, commit=False)
+    return len(user_ids)
+
+@storage.serialized_write
+def _seed_user_counters(conn, user_id):
+    rebuild_counters(conn, user_id)
+
+def _ensure_counters(conn, user_id):
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM user_counters WHERE user_id = ?", (user_id,))
+    if cursor.fetchone() is None:
+        rebuild_counters(conn, user_id, commit=False)
+
+def record_expense(conn, user_id, amount_cents, expense_type):
+    """Count a new expense. Runs in the caller's transaction."""
+    _ensure_counters(conn, user_id)
+    conn.execute('''
+    UPDATE user_counters
+    SET expense_count = expense_count + 1,
+        needs_cents = needs_cents + ?,
+        wants_cents = wants_cents + ?
+    WHERE user_id = ?
+    ''', (
+        amount_cents if expense_type == "Needs" else 0,
+        amount_cents if expense_type == "Wants" else 0,
+        user_id,
+    ))
+
+def record_goal_completed(conn, user_id):
+    """Count a goal that just reached its target. Runs in the caller's transaction."""
+    _ensure_counters(conn, user_id)
+    conn.execute(
+        "UPDATE user_counters SET completed_goals = completed_goals + 1 WHERE user_id = ?",
+        (user_id,)
+    )
+
+def record_balance(conn, user_id, balance_cents):
+    """Raise the balance high-water mark if needed. Runs in the caller's transaction."""
+    _ensure_counters(conn, user_id)
+    conn.execute('''
+    UPDATE user_counters
+    SET balance_high_water_cents = MAX(balance_high_water_cents, ?)
+    WHERE user_id = ?
+    ''', (balance_cents, user_id))
+
+def record_reward(conn, user_id, count=1):
+    """Count newly earned rewards. Runs in the caller's transaction."""
+    _ensure_counters(conn, user_id)
+    conn.execute(
+        "UPDATE user_counters SET reward_count = reward_count + ? WHERE user_id = ?",
+        (count, user_id)
+    )
+
+def week_start(date):
+    """ISO date of the Monday starting the week a datetime falls in."""
+    return (date - timedelta(days=date.weekday())).date().isoformat()
+
+def record_deposit(conn, user_id, date):
+    """Extend the weekly savings streak for a deposit made at date. Runs in the caller's transaction."""
+    _ensure_counters(conn, user_id)
+    week = week_start(date)
+    previous_week = week_start(date - timedelta(weeks=1))
+    conn.execute('''
+    UPDATE user_counters
+    SET savings_streak_weeks = CASE
+            WHEN last_savings_week = ? THEN savings_streak_weeks
+            WHEN last_savings_week = ? THEN savings_streak_weeks + 1
+            ELSE 1
+        END,
+        last_savings_week = ?
+    WHERE user_id = ? AND (last_savings_week IS NULL OR last_savings_week <= ?)
+    ''', (week, previous_week, week, user_id, week))
+
+def get_counters(conn, user_id):
+    """Get a user's counters plus FinPet level as a dict, seeding them on first use."""
+    cursor = conn.cursor()
+    query = f'''
+    SELECT {", ".join("c." + name for name in COUNTERS)}, COALESCE(p.level, 1) AS level
+    FROM user_counters c
+    LEFT JOIN finpet p ON p.user_id = c.user_id
+    WHERE c.user_id = ?
+    '''
+    cursor.execute(query, (user_id,))
+    row = cursor.fetchone()
+    if row is None:
+        # Seeded at registration and on startup; a user added since (e.g. by consolidate) is seeded under the writer lock
+        if storage.in_write():
+            rebuild_counters(conn, user_id, commit=False)
+        else:
+            _seed_user_counters(conn, user_id)
+        cursor.execute(query, (user_id,))
+        row = cursor.fetchone()
+    columns = [desc[0] for desc in cursor.description]
+    return dict(zip(columns, row))
+
+# ------------------------
+# Rule evaluation
+# ------------------------
+
+def metric_value(counters, metric):
+    if metric in METRICS:
+        return METRICS[metric](counters)
+    return counters[metric]
+
+def evaluate(counters, rules=RULES):
+    """Return the rules whose threshold the counters meet."""
+    return [rule for rule in rules if metric_value(counters, rule.metric) >= rule.threshold]
+
+def get_achievements(conn, user_id):
+    """Get the display-only achievements a user has earned."""
+    return [rule for rule in evaluate(get_counters(conn, user_id)) if not rule.reward]
+
+def award_rewards(conn, user_id, metrics=None, commit=True):
+    """
+    Store every reward rule the user now meets and hasn't earned yet.
+
+    metrics optionally limits evaluation to rules on those metrics. Returns the
+    newly earned rules; the caller grants their bonus XP.
+    """
+    counters = get_counters(conn, user_id)
+    rules = [rule for rule in RULES if rule.reward and (metrics is None or rule.metric in metrics)]
+    earned = []
+    cursor = conn.cursor()
+    date = datetime.now().isoformat()
+    for rule in evaluate(counters, rules):
+        cursor.execute(
+            "INSERT OR IGNORE INTO rewards (user_id, name, description, icon, date) VALUES (?, ?, ?, ?, ?)",
+            (user_id, rule.name, rule.description, rule.icon, date)
+        )
+        if cursor.rowcount:
+            earned.append(rule)
+    if earned:
+        record_reward(conn, user_id, len(earned))
+    if commit:
+        conn.commit()
+    return earned
+
+# ------------------------
+# XP progression
+# ------------------------
+
+# Level 1 needs 75 XP and every level needs int(1.3x) the previous one,
+# truncated at each step exactly as FinPets have always levelled. The
+# thresholds and their running totals are tabulated once; a grant of any size
+# is resolved with one bisect, so grants split across calls land in the same place.
+XP_BASE = 75
+XP_GROWTH = 1.3
+
+# Thresholds grow 1.3x per level, so no reachable XP total gets near this
+MAX_LEVEL = 200
+
+def _xp_table(max_level):
+    totals = [0, 0]  # totals[level] = XP from level 1 to the start of level
+    threshold = XP_BASE
+    for _ in range(max_level):
+        totals.append(totals[-1] + threshold)
+        threshold = int(threshold * XP_GROWTH)
+    return totals
+
+_XP_TOTALS = _xp_table(MAX_LEVEL)
+
+def xp_to_reach(level):
+    """Total XP needed to go from level 1 to the start of a level."""
+    return _XP_TOTALS[level]
+
+def level_threshold(level):
+    """XP needed to go from the start of a level to the next one."""
+    return xp_to_reach(level + 1) - xp_to_reach(level)
+
+def level_for_total_xp(total_xp):
+    """The level reached with a lifetime XP total."""
+    return min(max(bisect.bisect_right(_XP_TOTALS, total_xp) - 1, 1), MAX_LEVEL)
+
+def apply_xp(level, xp, gained):
+    """Apply an XP grant of any size. Returns (level, xp into that level, next_level_xp)."""
+    total_xp = xp_to_reach(level) + max(xp + gained, 0)
+    new_level = max(level_for_total_xp(total_xp), 1)
+    return new_level, total_xp - xp_to_reach(new_level), level_threshold(new_level)
+
+def normalize_finpets(conn):
+    """Rewrite every FinPet's level, xp and next_level_xp on the current curve. Returns the rows changed."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT user_id, level, xp, next_level_xp FROM finpet")
+    updates = []
+    for user_id, level, xp, next_level_xp in cursor.fetchall():
+        normalized = apply_xp(level, xp, 0)
+        if normalized != (level, xp, next_level_xp):
+            updates.append(normalized + (user_id,))
+    conn.executemany("UPDATE finpet SET level = ?, xp = ?, next_level_xp = ? WHERE user_id = ?", updates)
+    conn.commit()
+    return len(updates)
+
+# ------------------------
+# Command line interface
+# ------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the per-user achievement counters.")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--db", default=database.get_db_path(), help="SQLite database file")
+    args = parser.parse_args(argv)
+
+    conn = database.connect(args.db)
+    try:
+        print(f"Rebuilt counters for {rebuild_counters(conn)} users")
+        print(f"Moved {normalize_finpets(conn)} FinPets onto the XP curve")
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+import argparse
+import sys
+from datetime import date as date_type, datetime
+
+import numpy as np
+
+import achievements
+import database
+import goals
+import ledger
+import money
+import outbox
+import storage
+
+# Automatic deposit allocation. A user's rule says how much of each deposit
+# goes to savings goals and how it is split between the open ones; the split
+# is applied to every goal, the ledger, the balance and the FinPet outbox in
+# the caller's single transaction.
+
+STRATEGIES = ("priority", "percentage", "deadline")
+STRATEGY_LABELS = {
+    "priority": "Fill goals in priority order",
+    "percentage": "Fixed percentage per goal",
+    "deadline": "Weighted by deadline",
+}
+
+# Goals without a deadline are weighted as if due this many days out
+DEFAULT_HORIZON_DAYS = 365
+
+# FinPet XP per goal funded, matching manual contributions
+PROGRESS_XP = 3
+COMPLETION_XP = 25
+
+# Users allocated per transaction by the batch job
+ALLOCATION_BATCH_SIZE = 200
+
+# ------------------------
+# Rules
+# ------------------------
+
+def get_rule(conn, user_id):
+    """Get a user's allocation rule as a dict; disabled defaults if they never set one."""
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT strategy, deposit_pct, enabled, last_deposit_id FROM allocation_rules WHERE user_id = ?",
+        (user_id,)
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return {"strategy": "priority", "deposit_pct": 100, "enabled": False, "last_deposit_id": 0}
+    rule = dict(row)
+    rule["enabled"] = bool(rule["enabled"])
+    return rule
+
+def set_rule(conn, user_id, strategy, deposit_pct, enabled):
+    """Save a user's allocation rule. Deposits made before it is enabled are left alone."""
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown allocation strategy: {strategy}")
+    if not 0 <= deposit_pct <= 100:
+        raise ValueError(f"deposit_pct must be between 0 and 100, got {deposit_pct}")
+    conn.execute('''
+    INSERT INTO allocation_rules (user_id, strategy, deposit_pct, enabled, last_deposit_id)
+    VALUES (:user_id, :strategy, :deposit_pct, :enabled,
+            (SELECT COALESCE(MAX(id), 0) FROM fund_transactions WHERE user_id = :user_id))
+    ON CONFLICT (user_id) DO UPDATE SET
+        strategy = excluded.strategy,
+        deposit_pct = excluded.deposit_pct,
+        last_deposit_id = CASE WHEN enabled THEN last_deposit_id ELSE excluded.last_deposit_id END,
+        enabled = excluded.enabled
+    ''', {"user_id": user_id, "strategy": strategy, "deposit_pct": int(deposit_pct), "enabled": int(enabled)})
+    conn.commit()
+
+def set_goal_allocation(conn, user_id, goal_id, priority=0, allocation_pct=0, deadline=None):
+    """Set how a goal takes part in allocation: its priority (1 first), percentage share and deadline."""
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE goals SET priority = ?, allocation_pct = ?, deadline = ? WHERE id = ? AND user_id = ?",
+        (int(priority), int(allocation_pct), deadline.isoformat() if deadline else None, goal_id, user_id)
+    )
+    conn.commit()
+    return cursor.rowcount > 0
+
+def get_open_goals(conn, user_id):
+    """A user's unfinished goals with their allocation settings."""
+    cursor = conn.cursor()
+    cursor.execute('''
+    SELECT id, name, target_cents - current_cents AS remaining_cents, priority, allocation_pct, deadline
+    FROM goals
+    WHERE user_id = ? AND current_cents < target_cents
+    ORDER BY id
+    ''', (user_id,))
+    return [dict(row) for row in cursor.fetchall()]
+
+# ------------------------
+# Planning
+# ------------------------
+
+def _split(pool, weights, caps):
+    """Split pool cents by weight without exceeding caps, handing capped overflow to the others."""
+    weights = np.asarray(weights, dtype=np.float64)
+    caps = np.asarray(caps, dtype=np.int64)
+    shares = np.zeros(len(caps), dtype=np.int64)
+    active = (weights > 0) & (caps > 0)
+    while pool > 0 and active.any():
+        exact = np.where(active, pool * weights / weights[active].sum(), 0.0)
+        portion = np.floor(exact).astype(np.int64)
+        # Largest remainders get the cents lost to flooring
+        leftover = pool - int(portion.sum())
+        if leftover > 0:
+            order = np.argsort(np.where(active, portion - exact, np.inf), kind="stable")
+            portion[order[:leftover]] += 1
+        portion = np.minimum(portion, caps - shares)
+        shares += portion
+        pool -= int(portion.sum())
+        active &= shares < caps
+    return shares
+
+def plan(amount_cents, open_goals, strategy, today=None):
+    """
+    Split a deposit's allocatable amount across open goals. Returns [(goal_id, cents)].
+
+    No goal gets more than it still needs; whatever no goal can take stays in the balance.
+    """
+    if amount_cents <= 0 or not open_goals:
+        return []
+    caps = [goal["remaining_cents"] for goal in open_goals]
+
+    if strategy == "priority":
+        # Lowest priority number first; unprioritized goals (0) go last, oldest first
+        order = sorted(range(len(open_goals)), key=lambda i: (open_goals[i]["priority"] <= 0, open_goals[i]["priority"], open_goals[i]["id"]))
+        shares = [0] * len(open_goals)
+        pool = amount_cents
+        for i in order:
+            shares[i] = min(pool, caps[i])
+            pool -= shares[i]
+    elif strategy == "percentage":
+        percentages = np.array([goal["allocation_pct"] for goal in open_goals], dtype=np.int64)
+        pool = amount_cents * min(int(percentages.sum()), 100) // 100
+        shares = _split(pool, percentages, caps)
+    elif strategy == "deadline":
+        today = today or date_type.today()
+        days_left = np.array([
+            (date_type.fromisoformat(goal["deadline"][:10]) - today).days if goal["deadline"] else DEFAULT_HORIZON_DAYS
+            for goal in open_goals
+        ], dtype=np.float64)
+        # Weight by the daily saving each goal needs to finish on time
+        shares = _split(amount_cents, np.array(caps, dtype=np.float64) / np.maximum(days_left, 1), caps)
+    else:
+        raise ValueError(f"Unknown allocation strategy: {strategy}")
+
+    return [(goal["id"], int(share)) for goal, share in zip(open_goals, shares) if share > 0]
+
+# ------------------------
+# Applying
+# ------------------------
+
+def apply(conn, user_id, allocations, date=None):
+    """
+    Move allocated cents from the balance into goals. Runs in the caller's transaction.
+
+    Records each goal update, contribution and ledger movement, refreshes the
+    balance once and queues one XP grant plus a reward per completed goal.
+    Returns [(goal_id, cents, completed_now)].
+    """
+    allocations = [(goal_id, int(cents)) for goal_id, cents in allocations if cents > 0]
+    if not allocations:
+        return []
+    date = date or datetime.now()
+    cursor = conn.cursor()
+    placeholders = ", ".join("?" * len(allocations))
+    cursor.execute(
+        f"SELECT id, name, target_cents, current_cents, completed FROM goals WHERE user_id = ? AND id IN ({placeholders})",
+        [user_id] + [goal_id for goal_id, _ in allocations]
+    )
+    found = {row["id"]: dict(row) for row in cursor.fetchall()}
+
+    results = []
+    updates = []
+    xp = 0
+    for goal_id, cents in allocations:
+        goal = found.get(goal_id)
+        if goal is None:
+            continue
+        new_amount = goal["current_cents"] + cents
+        completed = new_amount >= goal["target_cents"]
+        completed_now = completed and not goal["completed"]
+        updates.append((new_amount, int(completed or goal["completed"]), goal_id))
+        goals.record_contribution(conn, user_id, goal_id, cents, date)
+        ledger.record_movement(conn, user_id, -cents, "goal_contribution", goal_id, date, commit=False)
+        if completed_now:
+            achievements.record_goal_completed(conn, user_id)
+            outbox.enqueue_reward(
+                conn, user_id,
+                f"Goal Achieved: {goal['name']}",
+                f"Completed savings goal: {goal['name']} ({money.format_money(goal['target_cents'])})",
+                "🏆"
+            )
+        xp += COMPLETION_XP if completed else PROGRESS_XP
+        results.append((goal_id, cents, completed_now))
+
+    cursor.executemany("UPDATE goals SET current_cents = ?, completed = ? WHERE id = ?", updates)
+    achievements.record_balance(conn, user_id, ledger.refresh_funds(conn, user_id))
+    if xp:
+        outbox.enqueue_xp(conn, user_id, xp)
+    return results
+
+def allocate_deposit(conn, user_id, deposit_id, amount_cents, today=None):
+    """Allocate a just-recorded deposit by the user's rule, if enabled. Runs in the caller's transaction."""
+    rule = get_rule(conn, user_id)
+    if not rule["enabled"]:
+        return []
+    pool = min(amount_cents * rule["deposit_pct"] // 100, max(ledger.get_balance(conn, user_id), 0))
+    allocations = plan(pool, get_open_goals(conn, user_id), rule["strategy"], today)
+    results = apply(conn, user_id, allocations)
+    conn.execute(
+        "UPDATE allocation_rules SET last_deposit_id = MAX(last_deposit_id, ?) WHERE user_id = ?",
+        (deposit_id, user_id)
+    )
+    return results
+
+@storage.serialized_write
+def allocate_pending(conn, batch_size=ALLOCATION_BATCH_SIZE, today=None):
+    """
+    Allocate every deposit not yet allocated, for all users with an enabled rule.
+
+    Each user's pending deposits are pooled into one allocation, capped at their
+    current balance. Commits once per batch of users. Returns (users, cents allocated).
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+    SELECT r.user_id, r.strategy, r.deposit_pct, SUM(f.amount_cents) AS pending_cents, MAX(f.id) AS last_id
+    FROM allocation_rules r
+    JOIN fund_transactions f ON f.user_id = r.user_id AND f.id > r.last_deposit_id
+    WHERE r.enabled AND f.amount_cents > 0
+    GROUP BY r.user_id
+    ''')
+    pending = cursor.fetchall()
+    users = allocated = 0
+    for start in range(0, len(pending), batch_size):
+        for user_id, strategy, deposit_pct, pending_cents, last_id in pending[start:start + batch_size]:
+            pool = min(pending_cents * deposit_pct // 100, max(ledger.get_balance(conn, user_id), 0))
+            results = apply(conn, user_id, plan(pool, get_open_goals(conn, user_id), strategy, today))
+            conn.execute("UPDATE allocation_rules SET last_deposit_id = ? WHERE user_id = ?", (last_id, user_id))
+            users += 1
+            allocated += sum(cents for _, cents, _ in results)
+        conn.commit()
+    outbox.notify()
+    return users, allocated
+
+# ------------------------
+# Command line interface
+# ------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Allocate pending deposits to savings goals for every user.")
+    parser.add_argument("command", choices=["run"])
+    parser.add_argument("--db", default=database.get_db_path(), help="SQLite database file")
+    parser.add_argument("--batch-size", type=int, default=ALLOCATION_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    conn = database.connect(args.db)
+    try:
+        users, cents = allocate_pending(conn, args.batch_size)
+        print(f"Allocated {money.format_money(cents)} for {users} users")
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+import argparse
+import math
+import sys
+
+import numpy as np
+import pandas as pd
+
+import archive
+import database
+
+# Unusual-expense detection. Each user keeps running statistics of the log
+# amount they spend per category (count, mean and sum of squared deviations,
+# updated with Welford's method), so a new expense is scored in O(1) against
+# everything they spent before without rescanning history. Amounts are
+# compared on a log scale because spending is right-skewed: $50 after a run of
+# $5 purchases is as unusual as $500 after a run of $50 ones.
+
+# Scores need this many earlier expenses in the category
+MIN_SAMPLES = 5
+
+# Expenses this many standard deviations above the category's typical amount are flagged
+ANOMALY_Z = 3.0
+
+# Spread never counts as tighter than this (about +/-10%), so fixed-price
+# categories don't flag small changes
+MIN_LOG_STD = 0.1
+
+# ------------------------
+# Statistics
+# ------------------------
+
+def _log_amount(amount_cents):
+    return math.log(amount_cents) if amount_cents > 0 else None
+
+def record(conn, user_id, category, amount_cents):
+    """Fold an expense into the user's category statistics. Runs in the caller's transaction."""
+    x = _log_amount(amount_cents)
+    if x is None:
+        return
+    # SET expressions all see the old row, so this is one Welford step
+    conn.execute('''
+    INSERT INTO category_stats (user_id, category, count, mean, m2)
+    VALUES (:user_id, :category, 1, :x, 0.0)
+    ON CONFLICT (user_id, category) DO UPDATE SET
+        count = count + 1,
+        mean = mean + (:x - mean) / (count + 1),
+        m2 = m2 + (:x - mean) * (:x - (mean + (:x - mean) / (count + 1)))
+    ''', {"user_id": user_id, "category": category or "", "x": x})
+
+def get_stats(conn, user_id, category):
+    """(count, mean, m2) of a user's log amounts in a category, or None."""
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT count, mean, m2 FROM category_stats WHERE user_id = ? AND category = ?",
+        (user_id, category or "")
+    )
+    row = cursor.fetchone()
+    return tuple(row) if row else None
+
+def score(conn, user_id, category, amount_cents):
+    """
+    Score an amount against the user's earlier spending in a category.
+
+    Returns a dict with z (standard deviations above the typical log amount),
+    typical_cents and flagged, or None while the category has fewer than
+    MIN_SAMPLES expenses.
+    """
+    stats = get_stats(conn, user_id, category)
+    x = _log_amount(amount_cents)
+    if stats is None or x is None or stats[0] < MIN_SAMPLES:
+        return None
+    count, mean, m2 = stats
+    std = max(math.sqrt(m2 / (count - 1)), MIN_LOG_STD)
+    z = (x - mean) / std
+    return {
+        "z": z,
+        "typical_cents": round(math.exp(mean)),
+        "ratio": amount_cents / math.exp(mean),
+        "flagged": z >= ANOMALY_Z,
+    }
+
+def backfill(conn):
+    """Rebuild every user's category statistics from their expenses, archived ones included. Returns the rows written."""
+    archive.load_temp(conn)
+    df = pd.read_sql_query('''
+    SELECT user_id, COALESCE(category, '') AS category, amount_cents FROM expenses WHERE amount_cents > 0
+    UNION ALL
+    SELECT user_id, COALESCE(category, '') AS category, amount_cents FROM temp.archived_expenses WHERE amount_cents > 0
+    ''', conn)
+    archive.drop_temp(conn)
+    conn.execute("DELETE FROM category_stats")
+    if df.empty:
+        conn.commit()
+        return 0
+    df["x"] = np.log(df["amount_cents"].to_numpy(dtype=np.float64))
+    grouped = df.groupby(["user_id", "category"])["x"]
+    stats = grouped.agg(["count", "mean"])
+    # Sum of squared deviations, what the incremental updates accumulate
+    stats["m2"] = grouped.var(ddof=0) * stats["count"]
+    conn.executemany(
+        "INSERT INTO category_stats (user_id, category, count, mean, m2) VALUES (?, ?, ?, ?, ?)",
+        [(int(user_id), category, int(count), float(mean), float(m2))
+         for (user_id, category), count, mean, m2 in zip(stats.index, stats["count"], stats["mean"], stats["m2"])]
+    )
+    conn.commit()
+    return len(stats)
+
+# ------------------------
+# Command line interface
+# ------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain per-category spending statistics for anomaly detection.")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--db", default=database.get_db_path(), help="SQLite database file")
+    args = parser.parse_args(argv)
+
+    conn = database.connect(args.db)
+    try:
+        print(f"Seeded statistics for {backfill(conn)} user categories")
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,7 @@
 import streamlit as st
 import os
-import sqlite3
+import database
+import money
 
 # Set page config; must be the first Streamlit command
 st.set_page_config(
@@ -19,73 +20,8 @@ def load_css():
 load_css()
 
 # --- SQLite Database Initialization ---
-def initialize_db():
-    conn = sqlite3.connect("database.db", check_same_thread=False)
-    cursor = conn.cursor()
-    
-    # Enable foreign keys
-    cursor.execute("PRAGMA foreign_keys = ON")
-    
-    # Create all tables
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL,
-        zen_mode INTEGER DEFAULT 0,
-        wants_budget REAL DEFAULT 100.0
-    )""")
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS expenses (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        description TEXT NOT NULL,
-        amount REAL NOT NULL,
-        date TEXT NOT NULL,
-        category TEXT,
-        type TEXT,
-        FOREIGN KEY (user_id) REFERENCES users(id)
-    )""")
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS funds (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        balance REAL DEFAULT 0,
-        FOREIGN KEY (user_id) REFERENCES users(id)
-    )""")
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS goals (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        name TEXT NOT NULL,
-        target_amount REAL NOT NULL,
-        current_amount REAL DEFAULT 0,
-        date_created TEXT,
-        completed INTEGER DEFAULT 0,
-        FOREIGN KEY (user_id) REFERENCES users(id)
-    )""")
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS finpet (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        level INTEGER DEFAULT 1,
-        xp INTEGER DEFAULT 0,
-        next_level_xp INTEGER DEFAULT 75,
-        name TEXT DEFAULT 'Penny',
-        last_fed TEXT,
-        rewards TEXT DEFAULT '[]',
-        FOREIGN KEY (user_id) REFERENCES users(id)
-    )""")
-
-    conn.commit()
-    return conn
-
-# Initialize database
-db_conn = initialize_db()
+# Creates the canonical schema on first use
+database.get_db()
 
 # --- Session State Initialization ---
 session_vars = {
@@ -107,45 +43,12 @@ def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
 def register(username, password):
-    try:
-        cursor = db_conn.cursor()
-        hashed_pw = hash_password(password)
-        
-        # Insert user
-        cursor.execute("""
-            INSERT INTO users (username, password)
-            VALUES (?, ?)
-        """, (username, hashed_pw))
-        
-        # Initialize funds
-        cursor.execute("""
-            INSERT INTO funds (user_id, balance)
-            VALUES ((SELECT id FROM users WHERE username = ?), 0)
-        """, (username,))
-        
-        # Initialize FinPet
-        cursor.execute("""
-            INSERT INTO finpet (user_id, name)
-            VALUES ((SELECT id FROM users WHERE username = ?), 'Penny')
-        """, (username,))
-        
-        db_conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        return False
+    return database.create_user(username, hash_password(password))
 
 def login(username, password):
-    cursor = db_conn.cursor()
-    hashed_pw = hash_password(password)
-    
-    cursor.execute("""
-        SELECT id, zen_mode FROM users 
-        WHERE username = ? AND password = ?
-    """, (username, hashed_pw))
-    
-    user = cursor.fetchone()
-    if user:
-        st.session_state.zen_mode = bool(user[1])
+    user = database.get_user_credentials(username)
+    if user and user[1] == hash_password(password):
+        st.session_state.zen_mode = bool(user[2])
         return True
     return False
 
@@ -306,10 +209,10 @@ else:
     
     with col2:
         st.info("Click on any of the navigation links above to access different features.")
-        st.metric(label="Current Balance", value=f"${utils.get_current_balance():.2f}")
+        st.metric(label="Current Balance", value=money.format_money(utils.get_current_balance()))
         st.metric(
             label="This Week's Expenses", 
-            value=f"${utils.get_weekly_expenses():.2f}",
+            value=money.format_money(utils.get_weekly_expenses()),
             delta=f"{utils.get_expense_trend():.1f}%"
         )
         st.button("Go to Home Dashboard →", on_click=lambda: st.switch_page("pages/01_Home.py"))
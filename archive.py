@@ -0,0 +1,461 @@
+import argparse
+import json
+import os
+import sys
+import threading
+from datetime import date as date_type
+
+import numpy as np
+import pandas as pd
+
+import database
+import money
+import recurring
+import storage
+
+# Cold expense archive. Expenses from closed months past the hot window are
+# moved out of SQLite into a per-user directory of append-only column files:
+# fixed-width little-endian arrays plus a UTF-8 blob of descriptions, all
+# memory-mapped when read, and a manifest recording how many rows are valid.
+# Hot queries then only see recent expenses, while long-range readers (the
+# columnar store, the history page, exports) map the archive without copying
+# it. Archived descriptions stay searchable through archived_expenses_fts, a
+# contentless index filled in the same transaction that deletes the rows.
+# Archiving is a batch job: `python archive.py run`.
+#
+# Rebuilds that recount full history (budget periods, achievement counters,
+# category statistics) join the archives through a TEMP table (load_temp);
+# the Zen Mode impact windows and the ledger page read the mapped columns.
+# Views that only ever look back within the hot window stay on SQLite
+# alone: recurring detection, duplicate checks, the simulation's 90-day
+# history, recent expenses and expenses between dates, and the current
+# budget periods.
+
+# Months kept in SQLite before the current one; longer than recurring's
+# lookback, so yearly series still see their earlier charges
+ARCHIVE_AFTER_MONTHS = recurring.LOOKBACK_DAYS // 30 + 1
+
+# Rows decoded at a time by readers that walk a whole archive
+READ_BATCH_SIZE = 5000
+
+# (archive directory, rows) -> decoded frame (see get_frame); oldest dropped first
+_frames = {}
+_frames_lock = threading.Lock()
+MAX_CACHED_FRAMES = 16
+
+# Column file -> dtype; description_end is each row's end offset in the description blob
+COLUMNS = {
+    "id": "<i8",
+    "micros": "<i8",
+    "cents": "<i8",
+    "category": "<i2",
+    "type": "<i1",
+    "description_end": "<i8",
+}
+DESCRIPTIONS_FILE = "description.utf8"
+MANIFEST_FILE = "manifest.json"
+# Manifest for rows appended but not yet deleted from SQLite (see archive_user)
+PENDING_FILE = "manifest.pending.json"
+
+# Code stored for a missing category or type
+MISSING = -1
+
+def encode_labels(values, labels):
+    """Encode values as integer codes into labels, extending it with unseen ones; None is MISSING."""
+    lookup = {label: code for code, label in enumerate(labels)}
+    codes = np.empty(len(values), dtype=np.int64)
+    for i, value in enumerate(values):
+        if value is None or value != value:
+            codes[i] = MISSING
+            continue
+        code = lookup.get(value)
+        if code is None:
+            code = lookup[value] = len(labels)
+            labels.append(value)
+        codes[i] = code
+    return codes
+
+# ------------------------
+# Files
+# ------------------------
+
+def archive_root(conn):
+    """Directory holding the archives for conn's database file: pfm.db -> pfm_archive."""
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA database_list")
+    path = next(row[2] for row in cursor.fetchall() if row[1] == "main")
+    return f"{os.path.splitext(path)[0]}_archive"
+
+def _user_dir(conn, user_id):
+    return os.path.join(archive_root(conn), str(user_id))
+
+def _read_manifest(directory, name=MANIFEST_FILE):
+    try:
+        with open(os.path.join(directory, name)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _write_manifest(directory, manifest, name=MANIFEST_FILE):
+    # Replaced in one step, so readers see the old row count or the new one
+    path = os.path.join(directory, name)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+def _committed(conn, pending):
+    # The rows a pending manifest adds are deleted from expenses in one transaction
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM expenses WHERE id = ?", (pending["last"][1],))
+    return cursor.fetchone() is None
+
+def _current_manifest(conn, directory):
+    """The manifest readers should use: a pending one counts once its delete has committed."""
+    pending = _read_manifest(directory, PENDING_FILE)
+    if pending is not None and _committed(conn, pending):
+        return pending
+    return _read_manifest(directory)
+
+def _settle(conn, directory):
+    """Publish a pending manifest whose delete committed, or drop one whose delete didn't."""
+    pending = _read_manifest(directory, PENDING_FILE)
+    if pending is None:
+        return
+    if _committed(conn, pending):
+        os.replace(os.path.join(directory, PENDING_FILE), os.path.join(directory, MANIFEST_FILE))
+    else:
+        # Its rows are still in SQLite; the next append overwrites them
+        os.remove(os.path.join(directory, PENDING_FILE))
+
+def _map(directory, name, dtype, count):
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(os.path.join(directory, name), dtype=dtype, mode="r", shape=(count,))
+
+def open_archive(conn, user_id):
+    """
+    Map a user's archive read-only, or None if they have none.
+
+    Returns a dict of COLUMNS memmaps, "descriptions" (uint8 memmap of the
+    blob), "labels" ({"category": [...], "type": [...]}, indexed by code),
+    "rows", "through" (the first day after the archived months), "ordered"
+    (rows are in (date, id) order; None if the manifest predates the flag)
+    and "directory".
+    """
+    directory = _user_dir(conn, user_id)
+    manifest = _current_manifest(conn, directory)
+    if manifest is None:
+        return None
+    rows = manifest["rows"]
+    archive = {column: _map(directory, column, dtype, rows) for column, dtype in COLUMNS.items()}
+    archive["descriptions"] = _map(directory, DESCRIPTIONS_FILE, np.uint8, manifest["description_bytes"])
+    archive.update(rows=rows, labels=manifest["labels"], through=manifest["through"],
+                   ordered=manifest.get("ordered"), directory=directory)
+    return archive
+
+def archived_users(conn):
+    """Ids of the users with an archive."""
+    root = archive_root(conn)
+    if not os.path.isdir(root):
+        return []
+    return sorted(int(name) for name in os.listdir(root)
+                  if name.isdigit() and any(os.path.exists(os.path.join(root, name, manifest))
+                                            for manifest in (MANIFEST_FILE, PENDING_FILE)))
+
+def _labels(archive, column):
+    # MISSING (-1) picks the trailing None
+    return np.array(archive["labels"][column] + [None], dtype=object)
+
+def decode(archive, positions):
+    """
+    The archived expenses at positions (a slice or an index array) as a
+    DataFrame shaped like rows of the expenses table, in the order given.
+    Only those rows are read from the mapped files.
+    """
+    if isinstance(positions, slice):
+        positions = np.arange(archive["rows"])[positions]
+    positions = np.asarray(positions, dtype=np.int64)
+    ends = np.asarray(archive["description_end"][positions])
+    starts = np.where(positions > 0, np.asarray(archive["description_end"][np.maximum(positions - 1, 0)]), 0)
+    blob = archive["descriptions"]
+    return pd.DataFrame({
+        "id": np.asarray(archive["id"][positions]),
+        "description": [bytes(blob[start:end]).decode() for start, end in zip(starts, ends)],
+        "amount_cents": np.asarray(archive["cents"][positions]),
+        "date": pd.to_datetime(np.asarray(archive["micros"][positions]), unit="us"),
+        # Object dtype keeps a missing label None rather than NaN
+        "category": pd.Series(_labels(archive, "category")[np.asarray(archive["category"][positions])], dtype=object),
+        "type": pd.Series(_labels(archive, "type")[np.asarray(archive["type"][positions])], dtype=object),
+    })
+
+def _in_order(micros, ids):
+    steps = np.diff(micros)
+    return bool(np.all((steps > 0) | ((steps == 0) & (np.diff(ids) > 0))))
+
+def _order(archive):
+    """Positions in (date, id) order, or None when the rows are stored that way."""
+    micros, ids = np.asarray(archive["micros"]), np.asarray(archive["id"])
+    ordered = archive["ordered"]
+    if ordered is None:
+        ordered = _in_order(micros, ids)
+    return None if ordered else np.lexsort((ids, micros))
+
+def iter_frames(archive, batch_size=READ_BATCH_SIZE):
+    """Yield an archive's expenses oldest first as DataFrames of up to batch_size rows (see decode)."""
+    order = _order(archive)
+    for start in range(0, archive["rows"], batch_size):
+        window = slice(start, start + batch_size)
+        yield decode(archive, window if order is None else order[window])
+
+def to_frame(archive):
+    """An archive's expenses as a DataFrame shaped like rows of the expenses table, oldest first."""
+    order = _order(archive)
+    return decode(archive, slice(None) if order is None else order)
+
+def get_frame(conn, user_id):
+    """
+    to_frame of a user's archive, or None if they have none. Cached until the
+    archive grows; the frame is shared, so callers must not modify it.
+    """
+    archive = open_archive(conn, user_id)
+    if archive is None:
+        return None
+    key = (archive["directory"], archive["rows"])
+    with _frames_lock:
+        frame = _frames.get(key)
+    if frame is not None:
+        return frame
+    frame = to_frame(archive)
+    with _frames_lock:
+        _frames[key] = frame
+        while len(_frames) > MAX_CACHED_FRAMES:
+            del _frames[next(iter(_frames))]
+    return frame
+
+def positions_of(archive, expense_ids):
+    """Positions in the archive of the given expense ids; ids it doesn't hold are left out."""
+    ids = np.asarray(archive["id"])
+    order = np.argsort(ids, kind="stable")
+    expense_ids = np.asarray(expense_ids, dtype=np.int64)
+    found = np.minimum(np.searchsorted(ids[order], expense_ids), max(len(ids) - 1, 0))
+    positions = order[found] if len(ids) else found
+    return positions[ids[positions] == expense_ids] if len(ids) else positions[:0]
+
+def owner_token(user_id):
+    """The token archived_expenses_fts stores in its owner column for a user."""
+    return f"u{user_id}"
+
+def _index(conn, user_id, expense_ids, descriptions):
+    conn.executemany(
+        "INSERT INTO archived_expenses_fts (rowid, description, owner) VALUES (?, ?, ?)",
+        ((int(expense_id), description, owner_token(user_id)) for expense_id, description in zip(expense_ids, descriptions))
+    )
+
+def reindex(conn, batch_size=READ_BATCH_SIZE):
+    """Rebuild archived_expenses_fts from the archive files, without committing. Returns the rows indexed."""
+    conn.execute("INSERT INTO archived_expenses_fts (archived_expenses_fts) VALUES ('delete-all')")
+    indexed = 0
+    for user_id in archived_users(conn):
+        archive = open_archive(conn, user_id)
+        if archive is None:
+            continue
+        for start in range(0, archive["rows"], batch_size):
+            rows = decode(archive, slice(start, start + batch_size))
+            _index(conn, user_id, rows["id"], rows["description"])
+            indexed += len(rows)
+    return indexed
+
+def _micros(iso_dates):
+    return np.array(iso_dates, dtype="datetime64[us]").astype(np.int64)
+
+def sums_between(archive, bounds, expense_type=None):
+    """
+    Archived spending in cents for each [start, end) pair of ISO dates in
+    bounds, optionally only expenses of one type. Returns an int64 array.
+    """
+    micros = np.asarray(archive["micros"])
+    cents = np.asarray(archive["cents"])
+    if expense_type is not None:
+        labels = archive["labels"]["type"]
+        keep = np.asarray(archive["type"]) == (labels.index(expense_type) if expense_type in labels else MISSING - 1)
+        micros, cents = micros[keep], cents[keep]
+    order = np.argsort(micros, kind="stable")
+    micros = micros[order]
+    totals = np.concatenate(([0], np.cumsum(cents[order])))
+    starts = _micros([start for start, _ in bounds])
+    ends = _micros([end for _, end in bounds])
+    return totals[np.searchsorted(micros, ends)] - totals[np.searchsorted(micros, starts)]
+
+def load_temp(conn, user_ids=None, batch_size=READ_BATCH_SIZE):
+    """
+    Fill a TEMP archived_expenses table (user_id, amount_cents, date, category,
+    type) from the archives of user_ids, or of every user, so a rebuild can
+    join it next to expenses. Dates are ISO strings like the expenses table's.
+    Call drop_temp when done. Returns the rows loaded.
+    """
+    conn.execute("DROP TABLE IF EXISTS temp.archived_expenses")
+    conn.execute(
+        "CREATE TEMP TABLE archived_expenses (user_id INTEGER, amount_cents INTEGER, date TEXT, category TEXT, type TEXT)"
+    )
+    loaded = 0
+    for user_id in archived_users(conn) if user_ids is None else user_ids:
+        archive = open_archive(conn, user_id)
+        if archive is None:
+            continue
+        categories, types = _labels(archive, "category"), _labels(archive, "type")
+        for start in range(0, archive["rows"], batch_size):
+            window = slice(start, start + batch_size)
+            dates = np.datetime_as_string(np.asarray(archive["micros"][window]).astype("datetime64[us]"))
+            conn.executemany(
+                "INSERT INTO temp.archived_expenses (user_id, amount_cents, date, category, type) VALUES (?, ?, ?, ?, ?)",
+                zip([user_id] * len(dates), np.asarray(archive["cents"][window]).tolist(), dates.tolist(),
+                    categories[np.asarray(archive["category"][window])], types[np.asarray(archive["type"][window])])
+            )
+            loaded += len(dates)
+    return loaded
+
+def drop_temp(conn):
+    """Drop the table load_temp filled."""
+    conn.execute("DROP TABLE IF EXISTS temp.archived_expenses")
+
+# ------------------------
+# Archiving
+# ------------------------
+
+def cutoff(today=None, months=ARCHIVE_AFTER_MONTHS):
+    """First day of the oldest month kept in SQLite; everything before it is archived."""
+    today = today or date_type.today()
+    month_index = today.year * 12 + today.month - 1 - months
+    return date_type(month_index // 12, month_index % 12 + 1, 1)
+
+def _append(directory, manifest, df, through):
+    """Append expenses to a user's column files and return the new manifest."""
+    os.makedirs(directory, exist_ok=True)
+    labels = {column: list(manifest["labels"][column]) for column in ("category", "type")}
+    encoded = [description.encode() for description in df["description"]]
+    lengths = np.fromiter((len(description) for description in encoded), dtype=np.int64, count=len(encoded))
+    arrays = {
+        "id": df["id"].to_numpy(),
+        "micros": df["date"].to_numpy("datetime64[us]").astype(np.int64),
+        "cents": df["amount_cents"].to_numpy(),
+        "category": encode_labels(df["category"].tolist(), labels["category"]),
+        "type": encode_labels(df["type"].tolist(), labels["type"]),
+        "description_end": manifest["description_bytes"] + np.cumsum(lengths),
+    }
+    files = {column: (column, manifest["rows"] * np.dtype(dtype).itemsize) for column, dtype in COLUMNS.items()}
+    files[DESCRIPTIONS_FILE] = (DESCRIPTIONS_FILE, manifest["description_bytes"])
+    payloads = {column: arrays[column].astype(COLUMNS[column]).tobytes() for column in COLUMNS}
+    payloads[DESCRIPTIONS_FILE] = b"".join(encoded)
+    for key, (name, valid_bytes) in files.items():
+        with open(os.path.join(directory, name), "ab") as f:
+            # Drop anything an interrupted run wrote past the manifest
+            f.truncate(valid_bytes)
+            f.write(payloads[key])
+            f.flush()
+            os.fsync(f.fileno())
+    # Each run appends rows in (date, id) order; they stay ordered if the first comes after the archive's last
+    ordered = manifest.get("ordered")
+    if ordered is None:
+        existing = {column: _map(directory, column, COLUMNS[column], manifest["rows"]) for column in ("micros", "id")}
+        ordered = _in_order(np.asarray(existing["micros"]), np.asarray(existing["id"]))
+        last = (int(existing["micros"][-1]), int(existing["id"][-1])) if manifest["rows"] else None
+    else:
+        last = tuple(manifest["last"]) if manifest["rows"] else None
+    first = (int(arrays["micros"][0]), int(arrays["id"][0]))
+    return {
+        "rows": manifest["rows"] + len(df),
+        "description_bytes": int(manifest["description_bytes"] + lengths.sum()),
+        "labels": labels,
+        "through": max(manifest["through"] or "", through.isoformat()),
+        "ordered": bool(ordered and (last is None or first > last)),
+        "last": [int(arrays["micros"][-1]), int(arrays["id"][-1])],
+    }
+
+@storage.serialized_write
+def archive_user(conn, user_id, before):
+    """
+    Move a user's expenses dated before the given day into their archive. Commits.
+
+    The rows are appended to the column files under a pending manifest, then
+    deleted from SQLite (their descriptions moving into archived_expenses_fts)
+    in one transaction, and only then is the manifest published. Readers
+    count a pending manifest once its delete has committed, so a crash at any
+    point leaves each expense in exactly one place. Returns the expenses moved.
+    """
+    directory = _user_dir(conn, user_id)
+    if os.path.isdir(directory):
+        _settle(conn, directory)
+    df = pd.read_sql_query(
+        "SELECT id, description, amount_cents, date, category, type FROM expenses WHERE user_id = ? AND date < ? ORDER BY date, id",
+        conn, params=(user_id, before.isoformat())
+    )
+    if df.empty:
+        return 0
+    manifest = _read_manifest(directory) or {
+        "rows": 0, "description_bytes": 0, "labels": {"category": [], "type": []}, "through": None,
+    }
+    df["date"] = pd.to_datetime(df["date"], format="ISO8601")
+    # Archives written before the handshake may already hold some of the rows
+    archived = _map(directory, "id", COLUMNS["id"], manifest["rows"])
+    new = df[~np.isin(df["id"].to_numpy(), archived)]
+    if not new.empty:
+        _write_manifest(directory, _append(directory, manifest, new, before), PENDING_FILE)
+    _index(conn, user_id, df["id"], df["description"])
+    conn.executemany("DELETE FROM expenses WHERE id = ?", ((int(expense_id),) for expense_id in df["id"]))
+    conn.commit()
+    if not new.empty:
+        _settle(conn, directory)
+    return len(df)
+
+@storage.serialized_write
+def run(conn, today=None, months=ARCHIVE_AFTER_MONTHS):
+    """Archive every user's expenses from months before the cutoff, one transaction per user. Returns (users, expenses)."""
+    before = cutoff(today, months)
+    # Finish whatever an interrupted run left pending
+    for user_id in archived_users(conn):
+        _settle(conn, _user_dir(conn, user_id))
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT user_id FROM expenses WHERE date < ?", (before.isoformat(),))
+    user_ids = [row[0] for row in cursor.fetchall()]
+    moved = 0
+    for user_id in user_ids:
+        moved += archive_user(conn, user_id, before)
+    return len(user_ids), moved
+
+# ------------------------
+# Command line interface
+# ------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move old expenses into per-user memory-mapped archives.")
+    parser.add_argument("command", choices=["run", "show"])
+    parser.add_argument("--db", default=database.get_db_path(), help="SQLite database file")
+    parser.add_argument("--months", type=int, default=ARCHIVE_AFTER_MONTHS, help="months kept in SQLite (run)")
+    parser.add_argument("--user", help="username to summarize (show)")
+    args = parser.parse_args(argv)
+
+    conn = database.connect(args.db)
+    try:
+        if args.command == "run":
+            users, moved = run(conn, months=args.months)
+            print(f"Archived {moved} expenses for {users} users from before {cutoff(months=args.months)}")
+            return 0
+        if not args.user:
+            parser.error("show needs --user")
+        archive = open_archive(conn, database.get_user_id(args.user, conn))
+        if archive is None:
+            print("No archived expenses")
+            return 0
+        # Read straight from the mapped columns
+        years = np.asarray(archive["micros"]).astype("datetime64[us]").astype("datetime64[Y]").astype(np.int64) + 1970
+        for year in np.unique(years):
+            print(f"{year}: {money.format_money(int(np.asarray(archive['cents'])[years == year].sum()))}")
+        print(f"{archive['rows']} archived expenses through {archive['through']}")
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import argparse
+import base64
+import mimetypes
+import sys
+import threading
+import time
+from pathlib import Path
+
+# FinPet media goes out through Streamlit's static file server
+# (server.enableStaticServing in .streamlit/config.toml): the page only sends a
+# short <img> URL and the browser caches the GIF across reruns. If static
+# serving is turned off, images are inlined as data URIs from a process-wide
+# cache keyed by file mtime, so each file is read and encoded once.
+
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+STATIC_URL_PREFIX = "app/static"
+
+PET_DISPLAY_SIZE = 250
+
+# Pre-resized variants written next to the originals by `python assets.py build`,
+# named like gif1_250.gif. Images are only ever scaled down.
+VARIANT_SIZES = (PET_DISPLAY_SIZE,)
+
+# (minimum level, image under static/, label); below the first level the pet is an egg
+PET_STAGES = [
+    (10, "images/gif1.gif", "Baby FinPet"),
+    (20, "images/gif2.gif", "Teen FinPet"),
+    (30, "images/gif3.gif", "Master FinPet"),
+]
+
+_encoded = {}
+_encoded_lock = threading.Lock()
+
+# ------------------------
+# Lookup
+# ------------------------
+
+def pet_stage(level):
+    """Return (image path under static/, label) for a FinPet level, or None while it's an egg."""
+    stage = None
+    for min_level, image, label in PET_STAGES:
+        if level >= min_level:
+            stage = (image, label)
+    return stage
+
+def variant_name(image, size):
+    path = Path(image)
+    return str(path.with_name(f"{path.stem}_{size}{path.suffix}"))
+
+def resolve(image, size=None):
+    """Path under static/ to serve for an image, preferring a pre-resized variant."""
+    if size is not None and (STATIC_DIR / variant_name(image, size)).exists():
+        return variant_name(image, size)
+    return image
+
+def exists(image):
+    return (STATIC_DIR / image).is_file()
+
+# ------------------------
+# Serving
+# ------------------------
+
+def static_serving_enabled():
+    try:
+        import streamlit as st
+        return bool(st.get_option("server.enableStaticServing"))
+    except Exception:
+        return False
+
+def static_url(image):
+    """URL of a file served by Streamlit's static file server, versioned by mtime."""
+    mtime = int((STATIC_DIR / image).stat().st_mtime)
+    return f"{STATIC_URL_PREFIX}/{Path(image).as_posix()}?v={mtime}"
+
+def data_uri(image):
+    """Base64 data URI for a file, encoded once per process and file version."""
+    path = STATIC_DIR / image
+    stat = path.stat()
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _encoded_lock:
+        cached = _encoded.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+    mime = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    uri = f"data:{mime};base64,{base64.b64encode(path.read_bytes()).decode()}"
+    with _encoded_lock:
+        _encoded[path] = (key, uri)
+    return uri
+
+def image_src(image, size=None):
+    """The src to put in an <img> tag for a file under static/."""
+    image = resolve(image, size)
+    if static_serving_enabled():
+        return static_url(image)
+    return data_uri(image)
+
+def image_html(image, size=PET_DISPLAY_SIZE, alt="FinPet"):
+    """Centered <img> markup for a file under static/."""
+    return f"""
+    <div style="display: flex; justify-content: center; align-items: center; height: 300px;">
+        <img src="{image_src(image, size)}" alt="{alt}" width="{size}" height="{size}">
+    </div>
+    """
+
+# ------------------------
+# Build step
+# ------------------------
+
+def build_variants(sizes=VARIANT_SIZES, log=print):
+    """Write downscaled copies of the FinPet GIFs. Returns the paths written."""
+    # Pillow is only needed at build time
+    from PIL import Image, ImageSequence
+
+    written = []
+    for _, image, _ in PET_STAGES:
+        source = STATIC_DIR / image
+        for size in sizes:
+            target = STATIC_DIR / variant_name(image, size)
+            with Image.open(source) as im:
+                if max(im.size) <= size:
+                    log(f"{image}: {im.size[0]}x{im.size[1]} already fits {size}px, no variant needed")
+                    if target.exists():
+                        target.unlink()
+                    continue
+                if target.exists() and target.stat().st_mtime >= source.stat().st_mtime:
+                    continue
+                frames = []
+                for frame in ImageSequence.Iterator(im):
+                    frame = frame.copy()
+                    frame.thumbnail((size, size))
+                    frames.append(frame)
+                frames[0].save(
+                    target, save_all=True, append_images=frames[1:], optimize=True,
+                    loop=im.info.get("loop", 0), duration=im.info.get("duration", 100),
+                    disposal=2,
+                )
+            log(f"{image}: wrote {target.relative_to(STATIC_DIR)}")
+            written.append(target)
+    return written
+
+# ------------------------
+# Command line interface
+# ------------------------
+
+def benchmark(iterations=100):
+    """Compare per-render payload size and time for each way of sending the FinPet GIFs."""
+    for _, image, _ in PET_STAGES:
+        image = resolve(image, PET_DISPLAY_SIZE)
+        path = STATIC_DIR / image
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            uncached = base64.b64encode(path.read_bytes()).decode()
+        uncached_ms = (time.perf_counter() - start) * 1000 / iterations
+
+        _encoded.pop(path, None)
+        data_uri(image)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            cached = data_uri(image)
+        cached_ms = (time.perf_counter() - start) * 1000 / iterations
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            url = static_url(image)
+        url_ms = (time.perf_counter() - start) * 1000 / iterations
+
+        print(f"{image}: inline {len(uncached):,} B in {uncached_ms:.3f} ms"
+              f" | cached inline {len(cached):,} B in {cached_ms:.3f} ms"
+              f" | static URL {len(url)} B in {url_ms:.3f} ms")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and measure the FinPet static assets.")
+    parser.add_argument("command", choices=["build", "bench"])
+    parser.add_argument("--size", type=int, action="append", help="Variant size in pixels (repeatable)")
+    parser.add_argument("--iterations", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        written = build_variants(tuple(args.size) if args.size else VARIANT_SIZES)
+        print(f"Wrote {len(written)} variants")
+    else:
+        benchmark(args.iterations)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
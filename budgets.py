@@ -0,0 +1,364 @@
+import argparse
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import archive
+import database
+
+# Spending budgets over explicit calendar periods. Every budget keeps one
+# spent counter per period in budget_periods, bumped in the same transaction as
+# the expense, so "how much is left this period" is a primary key lookup and
+# period history is a range scan of a handful of rows.
+
+PERIODS = ("week", "month")
+PERIOD_LABELS = {"week": "weekly", "month": "monthly"}
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# The budget seeded from users.wants_budget_cents and shown on the Weekly Wants page
+WANTS_BUDGET = "Wants"
+
+# Share of an envelope's available money spent before it shows as a warning
+ENVELOPE_WARNING_RATIO = 0.8
+
+# First day of the period containing {date}, for a budgets row in scope.
+# strftime('%w') counts from Sunday, week_start from Monday.
+_PERIOD_START_SQL = '''
+CASE period
+    WHEN 'month' THEN date({date}, 'start of month')
+    ELSE date({date}, '-' || ((CAST(strftime('%w', {date}) AS INTEGER) + 13 - week_start) % 7) || ' days')
+END
+'''
+
+# Expenses a budget applies to; NULL filters match everything
+_MATCH_SQL = '''
+(b.expense_type IS NULL OR b.expense_type = {type})
+AND (b.category IS NULL OR b.category = {category})
+'''
+
+# ------------------------
+# Calendar
+# ------------------------
+
+def _as_date(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+def period_start(when, period="week", week_start=0):
+    """First day of the period containing a date or datetime."""
+    day = _as_date(when)
+    if period == "month":
+        return day.replace(day=1)
+    return day - timedelta(days=(day.weekday() - week_start) % 7)
+
+def next_period_start(start, period="week"):
+    """First day of the period after the one starting at start."""
+    if period == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=7)
+
+def previous_period_start(start, period="week"):
+    """First day of the period before the one starting at start."""
+    if period == "month":
+        return (start - timedelta(days=1)).replace(day=1)
+    return start - timedelta(days=7)
+
+# ------------------------
+# Budgets
+# ------------------------
+
+def get_budget(conn, budget_id, today=None):
+    """
+    Get a budget with its current period's spending as a dict.
+
+    Adds period_start, period_end (exclusive) and remaining_cents. One indexed lookup.
+    """
+    today = today or datetime.now()
+    cursor = conn.cursor()
+    cursor.execute(f'''
+    SELECT b.*, COALESCE(p.spent_cents, 0) AS spent_cents
+    FROM budgets b
+    LEFT JOIN budget_periods p
+           ON p.budget_id = b.id AND p.period_start = {_PERIOD_START_SQL.format(date=":today")}
+    WHERE b.id = :budget_id
+    ''', {"today": today.isoformat(), "budget_id": budget_id})
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    budget = dict(row)
+    start = period_start(today, budget["period"], budget["week_start"])
+    budget["period_start"] = start
+    budget["period_end"] = next_period_start(start, budget["period"])
+    budget["remaining_cents"] = budget["limit_cents"] - budget["spent_cents"]
+    return budget
+
+def get_wants_budget_id(conn, user_id):
+    """The id of the user's Wants budget, or None if it hasn't been created. Read-only."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM budgets WHERE user_id = ? AND name = ?", (user_id, WANTS_BUDGET))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def ensure_wants_budget(conn, user_id):
+    """Return the id of the user's Wants budget, creating it from users.wants_budget_cents on first use."""
+    budget_id = get_wants_budget_id(conn, user_id)
+    if budget_id is not None:
+        return budget_id
+    cursor = conn.cursor()
+    cursor.execute('''
+    INSERT INTO budgets (user_id, name, expense_type, limit_cents)
+    SELECT id, ?, 'Wants', COALESCE(wants_budget_cents, 10000) FROM users WHERE id = ?
+    ''', (WANTS_BUDGET, user_id))
+    budget_id = cursor.lastrowid
+    rebuild(conn, budget_id=budget_id)
+    return budget_id
+
+def seed_wants_budgets(conn):
+    """Create the Wants budget of every user who doesn't have one yet. Returns the budgets created."""
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT id FROM users WHERE id NOT IN (SELECT user_id FROM budgets WHERE name = ?)",
+        (WANTS_BUDGET,)
+    )
+    user_ids = [row[0] for row in cursor.fetchall()]
+    for user_id in user_ids:
+        ensure_wants_budget(conn, user_id)
+    return len(user_ids)
+
+def create_envelope(conn, user_id, category, limit_cents, period="month", rollover=True, week_start=0, today=None):
+    """Create a category envelope starting in the current period. Returns its id, or None if one exists."""
+    if period not in PERIODS:
+        raise ValueError(f"Unknown budget period: {period}")
+    starts_on = period_start(today or datetime.now(), period, week_start)
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''
+        INSERT INTO budgets (user_id, name, category, period, week_start, limit_cents, rollover, starts_on)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, category, category, period, week_start, int(limit_cents), int(rollover), starts_on.isoformat()))
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        return None
+    budget_id = cursor.lastrowid
+    rebuild(conn, budget_id=budget_id)
+    return budget_id
+
+def delete_budget(conn, user_id, budget_id):
+    """Delete one of a user's budgets and its period counters."""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM budget_periods WHERE budget_id IN (SELECT id FROM budgets WHERE id = ? AND user_id = ?)", (budget_id, user_id))
+    cursor.execute("DELETE FROM budgets WHERE id = ? AND user_id = ?", (budget_id, user_id))
+    conn.commit()
+    return cursor.rowcount > 0
+
+def _rebase(conn, budget_id, today=None):
+    """Fold a rollover budget's carried balance into carry_cents as of the current period."""
+    envelopes = _evaluate(conn, "id = :budget_id", {"budget_id": budget_id}, today)
+    if envelopes.empty or not envelopes["rollover"].iloc[0]:
+        return
+    conn.execute(
+        "UPDATE budgets SET carry_cents = ?, starts_on = ? WHERE id = ?",
+        (int(envelopes["carried_cents"].iloc[0]), envelopes["period_start"].iloc[0].isoformat(), budget_id)
+    )
+
+def set_limit(conn, budget_id, limit_cents, today=None):
+    """Change a budget's per-period limit in cents, from the current period on."""
+    _rebase(conn, budget_id, today)
+    cursor = conn.cursor()
+    cursor.execute("UPDATE budgets SET limit_cents = ? WHERE id = ?", (int(limit_cents), budget_id))
+    conn.commit()
+    return cursor.rowcount > 0
+
+def set_period(conn, budget_id, period, week_start=0, today=None):
+    """Change a budget's period (and week start day), recounting its history into the new periods."""
+    if period not in PERIODS:
+        raise ValueError(f"Unknown budget period: {period}")
+    if not 0 <= week_start <= 6:
+        raise ValueError(f"week_start must be 0 (Monday) to 6 (Sunday), got {week_start}")
+    _rebase(conn, budget_id, today)
+    cursor = conn.cursor()
+    cursor.execute('''
+    UPDATE budgets
+    SET period = ?, week_start = ?, starts_on = CASE WHEN rollover THEN ? ELSE starts_on END
+    WHERE id = ?
+    ''', (period, week_start, period_start(today or datetime.now(), period, week_start).isoformat(), budget_id))
+    if cursor.rowcount == 0:
+        conn.commit()
+        return False
+    rebuild(conn, budget_id=budget_id)
+    return True
+
+# ------------------------
+# Period counters
+# ------------------------
+
+def record_expense(conn, user_id, amount_cents, date, category, expense_type):
+    """Add an expense to every matching budget's counter for its period. Runs in the caller's transaction."""
+    conn.execute(f'''
+    INSERT INTO budget_periods (budget_id, period_start, spent_cents)
+    SELECT b.id, {_PERIOD_START_SQL.format(date=":date")}, :amount
+    FROM budgets b
+    WHERE b.user_id = :user_id AND {_MATCH_SQL.format(type=":type", category=":category")}
+    ON CONFLICT (budget_id, period_start) DO UPDATE SET spent_cents = spent_cents + excluded.spent_cents
+    ''', {
+        "date": date.isoformat(),
+        "amount": int(amount_cents),
+        "user_id": user_id,
+        "type": expense_type,
+        "category": category,
+    })
+
+def rebuild(conn, user_id=None, budget_id=None):
+    """
+    Recount period counters from expenses, archived ones included, for one
+    budget, one user's budgets, or all. Returns rows written.
+    """
+    where, params = "", []
+    cursor = conn.cursor()
+    if budget_id is not None:
+        where, params = "WHERE b.id = ?", [budget_id]
+        cursor.execute("SELECT user_id FROM budgets WHERE id = ?", (budget_id,))
+        archived_users = [row[0] for row in cursor.fetchall()]
+    elif user_id is not None:
+        where, params = "WHERE b.user_id = ?", [user_id]
+        archived_users = [user_id]
+    else:
+        archived_users = None
+    cursor.execute(
+        f"DELETE FROM budget_periods WHERE budget_id IN (SELECT b.id FROM budgets b {where})",
+        params
+    )
+    cursor.execute(f'''
+    INSERT INTO budget_periods (budget_id, period_start, spent_cents)
+    SELECT b.id, {_PERIOD_START_SQL.format(date="e.date")} AS start, SUM(e.amount_cents)
+    FROM budgets b
+    JOIN expenses e ON e.user_id = b.user_id AND {_MATCH_SQL.format(type="e.type", category="e.category")}
+    {where}
+    GROUP BY b.id, start
+    ''', params)
+    written = cursor.rowcount
+    archive.load_temp(conn, archived_users)
+    # Archived periods can overlap the hot ones at the cutoff month's edge
+    cursor.execute(f'''
+    INSERT INTO budget_periods (budget_id, period_start, spent_cents)
+    SELECT b.id, {_PERIOD_START_SQL.format(date="a.date")} AS start, SUM(a.amount_cents)
+    FROM budgets b
+    JOIN temp.archived_expenses a ON a.user_id = b.user_id AND {_MATCH_SQL.format(type="a.type", category="a.category")}
+    {where}
+    GROUP BY b.id, start
+    ON CONFLICT (budget_id, period_start) DO UPDATE SET spent_cents = spent_cents + excluded.spent_cents
+    ''', params)
+    written += cursor.rowcount
+    archive.drop_temp(conn)
+    conn.commit()
+    return written
+
+def get_history(conn, budget_id, periods=4, today=None):
+    """Spending for a budget's last few periods, oldest first, as (period_start, spent_cents) pairs."""
+    budget = get_budget(conn, budget_id, today)
+    if budget is None:
+        return []
+    starts = [budget["period_start"]]
+    for _ in range(periods - 1):
+        starts.append(previous_period_start(starts[-1], budget["period"]))
+    starts.reverse()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT period_start, spent_cents FROM budget_periods WHERE budget_id = ? AND period_start >= ?",
+        (budget_id, starts[0].isoformat())
+    )
+    spent = dict(cursor.fetchall())
+    return [(start, spent.get(start.isoformat(), 0)) for start in starts]
+
+# ------------------------
+# Envelopes
+# ------------------------
+
+# Budget rows with this period's spending and the spending since starts_on
+_ENVELOPE_QUERY = '''
+SELECT b.id, b.name, b.category, b.period, b.limit_cents, b.rollover, b.carry_cents,
+       b.current_start AS period_start,
+       COALESCE(b.starts_on, b.current_start) AS starts_on,
+       COALESCE(SUM(p.spent_cents) FILTER (WHERE p.period_start = b.current_start), 0) AS spent_cents,
+       COALESCE(SUM(p.spent_cents) FILTER (WHERE p.period_start < b.current_start), 0) AS spent_before_cents
+FROM (
+    SELECT *, {current_start} AS current_start FROM budgets WHERE {where}
+) b
+LEFT JOIN budget_periods p
+       ON p.budget_id = b.id
+      AND p.period_start >= MIN(COALESCE(b.starts_on, b.current_start), b.current_start)
+      AND p.period_start <= b.current_start
+GROUP BY b.id
+ORDER BY b.name
+'''
+
+def _evaluate(conn, where, params, today=None):
+    today = today or datetime.now()
+    query = _ENVELOPE_QUERY.format(current_start=_PERIOD_START_SQL.format(date=":today"), where=where)
+    df = pd.read_sql_query(query, conn, params=dict(params, today=today.isoformat()))
+    if df.empty:
+        return df
+
+    # Whole periods between starts_on and the current period, for every envelope at once
+    start = pd.to_datetime(df["starts_on"])
+    current = pd.to_datetime(df["period_start"])
+    weeks = (current - start).dt.days // 7
+    months = (current.dt.year - start.dt.year) * 12 + (current.dt.month - start.dt.month)
+    elapsed = np.where(df["period"] == "month", months, weeks).clip(min=0)
+
+    limit = df["limit_cents"].to_numpy(dtype=np.int64)
+    spent = df["spent_cents"].to_numpy(dtype=np.int64)
+    carried = np.where(
+        df["rollover"].astype(bool),
+        df["carry_cents"].to_numpy(dtype=np.int64) + limit * elapsed - df["spent_before_cents"].to_numpy(dtype=np.int64),
+        0,
+    )
+    available = limit + carried
+    df["rollover"] = df["rollover"].astype(bool)
+    df["carried_cents"] = carried
+    df["available_cents"] = available
+    df["remaining_cents"] = available - spent
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df["used"] = np.where(available > 0, spent / available, np.where(spent > 0, np.inf, 0.0))
+    df["status"] = np.select(
+        [df["remaining_cents"] < 0, df["used"] >= ENVELOPE_WARNING_RATIO],
+        ["over", "warning"],
+        "ok",
+    )
+    df["period_start"] = current.dt.date
+    return df.drop(columns=["carry_cents", "spent_before_cents", "starts_on"])
+
+def evaluate_envelopes(conn, user_id, today=None):
+    """
+    Evaluate all of a user's envelopes for the current period in one query.
+
+    Returns a DataFrame with one row per envelope: limit, carried, available,
+    spent and remaining cents, the share used and a status of ok/warning/over.
+    """
+    return _evaluate(conn, "user_id = :user_id AND category IS NOT NULL", {"user_id": user_id}, today)
+
+# ------------------------
+# Command line interface
+# ------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the per-period budget counters.")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--db", default=database.get_db_path(), help="SQLite database file")
+    args = parser.parse_args(argv)
+
+    conn = database.connect(args.db)
+    try:
+        print(f"Rebuilt {rebuild(conn)} budget periods")
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
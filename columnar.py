@@ -0,0 +1,279 @@
+import argparse
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import archive
+import database
+
+# Columnar per-user expense store for the dashboard analytics. A user's
+# expenses are kept as parallel NumPy arrays: int64 seconds since the epoch,
+# int64 cents, and small integer codes into per-user category and type
+# vocabularies. A store is built from SQLite on the user's first read, then
+# appended to as expenses are added, and the weekly, trend and category
+# helpers in utils reduce it with masks and bincounts instead of building a
+# DataFrame of dicts on every call. About 20 bytes per expense. Archived
+# expenses (see archive.py) are reduced straight from their memory-mapped
+# files and take no store memory. Each store is keyed on the user's expense
+# counter and oldest expense date, so writes from other processes, the CLIs
+# and archive runs are picked up on the next read.
+
+# Rows allocated when a store is built beyond its expenses, doubled when full
+INITIAL_CAPACITY = 256
+
+# Arrays in a store, with their dtypes
+COLUMNS = {
+    "seconds": np.int64,
+    "cents": np.int64,
+    "category": np.int16,
+    "type": np.int8,
+}
+
+# Code stored for a missing category or type
+MISSING = archive.MISSING
+
+_EPOCH = datetime(1970, 1, 1)
+
+# user_id -> store dict (see build); oldest dropped first
+_stores = {}
+_stores_lock = threading.Lock()
+MAX_CACHED_STORES = 256
+
+def to_seconds(date):
+    """Seconds since the epoch for a naive datetime, as stored in the seconds column."""
+    return int((date - _EPOCH).total_seconds())
+
+def _empty(capacity):
+    return {column: np.empty(capacity, dtype=dtype) for column, dtype in COLUMNS.items()}
+
+def _data_key(conn, user_id):
+    # Every app insert bumps the counter, and archiving raises the oldest date; both are index lookups
+    cursor = conn.cursor()
+    cursor.execute('''
+    SELECT (SELECT expense_count FROM user_counters WHERE user_id = :user_id),
+           (SELECT MIN(date) FROM expenses WHERE user_id = :user_id)
+    ''', {"user_id": user_id})
+    return tuple(cursor.fetchone())
+
+def build(conn, user_id, now=None):
+    """
+    Load a user's expenses into a new store.
+
+    A store is a dict of COLUMNS arrays with spare capacity, "size" (rows in
+    use), "labels" ({"category": [...], "type": [...]}, indexed by code),
+    "last_id", the newest expense id loaded, "key", the data key it was
+    built from (see _data_key), and "archive", the user's archived expenses
+    as mapped arrays in the same layout, or None.
+    """
+    # Taken before the rows: a write landing in between only costs one more rebuild
+    key = _data_key(conn, user_id)
+    df = pd.read_sql_query(
+        "SELECT id, date, amount_cents, category, type FROM expenses WHERE user_id = ? ORDER BY id",
+        conn, params=(user_id,)
+    )
+    size = len(df)
+    store = _empty(max(INITIAL_CAPACITY, 2 * size))
+    store.update(size=size, labels={"category": [], "type": []}, last_id=int(df["id"].max()) if size else 0, key=key, archive=None)
+    cold = archive.open_archive(conn, user_id)
+    if cold is not None and cold["rows"]:
+        # Archive codes stay valid: the store's vocabularies start from the archive's
+        store["labels"] = {column: list(cold["labels"][column]) for column in ("category", "type")}
+        store["archive"] = {
+            "micros": cold["micros"],
+            "cents": cold["cents"],
+            "category": cold["category"],
+            "type": cold["type"],
+        }
+    if size:
+        # Unparseable dates count as now, as get_user_expenses treats them
+        dates = pd.to_datetime(df["date"], format="ISO8601", errors="coerce").fillna(pd.Timestamp(now or datetime.now()))
+        store["seconds"][:size] = dates.to_numpy("datetime64[s]").astype(np.int64)
+        store["cents"][:size] = df["amount_cents"].to_numpy(dtype=np.int64)
+        for column in ("category", "type"):
+            store[column][:size] = archive.encode_labels(df[column].tolist(), store["labels"][column])
+    return store
+
+def get_store(conn, user_id):
+    """A user's store, rebuilt when their expenses changed outside append()."""
+    key = _data_key(conn, user_id)
+    with _stores_lock:
+        store = _stores.get(user_id)
+        if store is not None and store["key"] == key:
+            return store
+    store = build(conn, user_id)
+    with _stores_lock:
+        _stores.pop(user_id, None)
+        _stores[user_id] = store
+        while len(_stores) > MAX_CACHED_STORES:
+            del _stores[next(iter(_stores))]
+    return store
+
+def append(user_id, expense_id, date, amount_cents, category, expense_type):
+    """Add a committed expense to the user's store, if it has been built."""
+    with _stores_lock:
+        store = _stores.get(user_id)
+        if store is None or expense_id <= store["last_id"]:
+            return
+        size = store["size"]
+        if size == len(store["cents"]):
+            # Readers keep their views of the old arrays
+            grown = _empty(2 * size)
+            for column in COLUMNS:
+                grown[column][:size] = store[column][:size]
+            store.update(grown)
+        store["seconds"][size] = to_seconds(date)
+        store["cents"][size] = int(amount_cents)
+        store["category"][size] = archive.encode_labels([category], store["labels"]["category"])[0]
+        store["type"][size] = archive.encode_labels([expense_type], store["labels"]["type"])[0]
+        store["size"] = size + 1
+        store["last_id"] = expense_id
+        # Mirrors the counter bump and oldest date of the write being appended
+        count, first_date = store["key"]
+        store["key"] = ((count or 0) + 1, min(first_date or date.isoformat(), date.isoformat()))
+
+def clear(user_id=None):
+    """Drop one user's store, or all of them, so the next read rebuilds it."""
+    with _stores_lock:
+        if user_id is None:
+            _stores.clear()
+        else:
+            _stores.pop(user_id, None)
+
+def columns(store):
+    """The store's arrays cut to the rows in use, taken under the lock."""
+    with _stores_lock:
+        size = store["size"]
+        return {column: store[column][:size] for column in COLUMNS}
+
+def _parts(store):
+    """The archived columns, if any, then the in-memory ones."""
+    hot = columns(store)
+    return [hot] if store["archive"] is None else [store["archive"], hot]
+
+def _seconds(data):
+    # Archived dates are microseconds; the division is a temporary, not kept
+    return data["seconds"] if "seconds" in data else data["micros"] // 1_000_000
+
+def nbytes(store):
+    """Bytes held by the store's in-memory arrays, including spare capacity; the archive is mapped, not held."""
+    return sum(store[column].nbytes for column in COLUMNS)
+
+# ------------------------
+# Reductions
+# ------------------------
+
+def total_between(store, start, end):
+    """Cents spent with start <= date <= end."""
+    low, high = to_seconds(start), to_seconds(end)
+    total = 0
+    for data in _parts(store):
+        seconds = _seconds(data)
+        total += int(data["cents"][(seconds >= low) & (seconds <= high)].sum())
+    return total
+
+def daily_totals(store, first_day, days, end=None):
+    """Cents spent on each of days calendar days from first_day, up to end if given."""
+    origin = to_seconds(datetime.combine(first_day, datetime.min.time()))
+    totals = np.zeros(days, dtype=np.float64)
+    for data in _parts(store):
+        seconds = _seconds(data)
+        offsets = (seconds - origin) // 86400
+        mask = (offsets >= 0) & (offsets < days)
+        if end is not None:
+            mask &= seconds <= to_seconds(end)
+        totals += np.bincount(offsets[mask], weights=data["cents"][mask], minlength=days)
+    return totals.round().astype(np.int64)
+
+def totals_by(store, column):
+    """{label: cents} spent per category or type, leaving out expenses without one."""
+    parts = _parts(store)
+    with _stores_lock:
+        labels = list(store["labels"][column])
+    totals = np.zeros(len(labels), dtype=np.float64)
+    for data in parts:
+        codes = data[column]
+        mask = codes != MISSING
+        totals += np.bincount(codes[mask], weights=data["cents"][mask], minlength=len(labels))[:len(labels)]
+    return {label: int(round(totals[code])) for code, label in enumerate(labels)}
+
+# ------------------------
+# Command line interface
+# ------------------------
+
+def benchmark(rows=100_000, repeats=5):
+    """Compare the store with the DataFrame utils used to build, on synthetic expenses."""
+    rng = np.random.default_rng(1)
+    now = datetime.now()
+    categories = np.array(["Food", "Transport", "Entertainment", "Shopping", "Utilities", "Housing", "Other"], dtype=object)
+    dates = [now - timedelta(seconds=int(s)) for s in rng.integers(0, 365 * 86400, rows)]
+    frame = pd.DataFrame({
+        "id": np.arange(1, rows + 1),
+        "user_id": 1,
+        "description": [f"expense {i}" for i in rng.integers(0, 5000, rows)],
+        "amount_cents": rng.integers(100, 20000, rows),
+        "date": dates,
+        "category": categories[rng.integers(0, len(categories), rows)],
+        "type": np.array(["Needs", "Wants"], dtype=object)[rng.integers(0, 2, rows)],
+    })
+    store = _empty(rows)
+    store.update(size=rows, labels={"category": [], "type": []}, last_id=rows, key=(rows, None), archive=None)
+    store["seconds"][:] = [to_seconds(date) for date in dates]
+    store["cents"][:] = frame["amount_cents"]
+    for column in ("category", "type"):
+        store[column][:] = archive.encode_labels(frame[column].tolist(), store["labels"][column])
+
+    def best(func):
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return min(timings) * 1000
+
+    week_ago = now - timedelta(days=7)
+    frame_ms = best(lambda: (
+        frame[(frame["date"] >= week_ago) & (frame["date"] <= now)]["amount_cents"].sum(),
+        frame.groupby("category")["amount_cents"].sum(),
+        frame.groupby("type")["amount_cents"].sum(),
+    ))
+    store_ms = best(lambda: (total_between(store, week_ago, now), totals_by(store, "category"), totals_by(store, "type")))
+    return {
+        "frame_bytes": int(frame.memory_usage(deep=True).sum()),
+        "store_bytes": nbytes(store),
+        "frame_ms": frame_ms,
+        "store_ms": store_ms,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or benchmark the columnar expense store.")
+    parser.add_argument("command", choices=["show", "bench"])
+    parser.add_argument("--db", default=database.get_db_path(), help="SQLite database file")
+    parser.add_argument("--user", help="username to load (show)")
+    parser.add_argument("--rows", type=int, default=100_000, help="synthetic expenses (bench)")
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        result = benchmark(args.rows)
+        print(f"{args.rows} expenses: DataFrame {result['frame_bytes'] / 1e6:.1f} MB, store {result['store_bytes'] / 1e6:.1f} MB")
+        print(f"Week total and category/type sums: DataFrame {result['frame_ms']:.1f} ms, store {result['store_ms']:.1f} ms")
+        return 0
+    if not args.user:
+        parser.error("show needs --user")
+    conn = database.connect(args.db)
+    try:
+        started = time.perf_counter()
+        store = build(conn, database.get_user_id(args.user, conn))
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(f"Loaded {store['size']} expenses in {elapsed_ms:.1f} ms, {nbytes(store) / 1e3:.1f} kB")
+        for label, cents in sorted(totals_by(store, "category").items(), key=lambda item: -item[1]):
+            print(f"  {label}: {cents}")
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,328 @@
+import argparse
+import os
+import sys
+
+import achievements
+import anomalies
+import budgets
+import database
+import duplicates
+import goals
+import ledger
+import money
+import recurring
+
+# One-off migration of the legacy database files into the canonical database.
+# Earlier versions of the app wrote to three files: database.db (app.py/auth.py,
+# keyed by users.id), finance_tracker.db (database.py and the FinPet/Weekly Wants
+# pages, keyed by username) and finance.db (utils.py, keyed by username).
+# Sources are listed in priority order: where they disagree on a single-row
+# setting (funds balance, FinPet name) the first source wins.
+LEGACY_SOURCES = ["finance.db", "finance_tracker.db", "database.db"]
+
+# Rows copied per INSERT ... SELECT; each batch is its own transaction
+COPY_BATCH_SIZE = 5000
+
+# Canonical column -> legacy column copied per table. Legacy money columns are REAL dollars.
+# A legacy row is identified by its source file and rowid, never by its content: two
+# identical coffees on one day are two expenses, and each legacy row is copied exactly
+# once however often the migration is rerun. Every legacy module wrote to one file only,
+# so sources do not overlap; duplicates.scan flags any expenses that still look alike.
+COPY_TABLES = {
+    "expenses": {
+        "columns": {
+            "description": "description",
+            "amount_cents": "amount",
+            "date": "date",
+            "category": "category",
+            "type": "type",
+        },
+    },
+    "fund_transactions": {
+        "columns": {"amount_cents": "amount", "description": "description", "date": "date"},
+    },
+    "goals": {
+        "columns": {
+            "name": "name",
+            "target_cents": "target_amount",
+            "current_cents": "current_amount",
+            "date_created": "date_created",
+            "completed": "completed",
+        },
+    },
+}
+
+# ------------------------
+# Source inspection
+# ------------------------
+
+def _columns(conn, schema, table_name):
+    cursor = conn.cursor()
+    cursor.execute(f"PRAGMA {schema}.table_info({table_name})")
+    return [row[1] for row in cursor.fetchall()]
+
+def _source_expr(column, legacy_column, alias="t"):
+    """SQL expression reading a legacy column, converting REAL dollars to integer cents."""
+    if column.endswith("_cents"):
+        return f"CAST(ROUND({alias}.{legacy_column} * 100) AS INTEGER)"
+    return f"{alias}.{legacy_column}"
+
+def _owner_expr(conn, table_name, alias="t"):
+    """SQL expression giving the legacy owner's username for rows of a source table, or None."""
+    columns = _columns(conn, "src", table_name)
+    if "username" in columns:
+        return f"{alias}.username"
+    if "user_id" in columns and "username" in _columns(conn, "src", "users"):
+        return f"(SELECT su.username FROM src.users su WHERE su.id = {alias}.user_id)"
+    return None
+
+# ------------------------
+# Copy steps
+# ------------------------
+
+def copy_users(conn):
+    cursor = conn.cursor()
+    if not {"username", "password"} <= set(_columns(conn, "src", "users")):
+        return 0
+    columns = {"username": "username", "password": "password"}
+    legacy_columns = _columns(conn, "src", "users")
+    if "zen_mode" in legacy_columns:
+        columns["zen_mode"] = "zen_mode"
+    if "wants_budget" in legacy_columns:
+        columns["wants_budget_cents"] = "wants_budget"
+    select = ", ".join(_source_expr(column, legacy, "u") for column, legacy in columns.items())
+    cursor.execute(f'''
+    INSERT OR IGNORE INTO users ({", ".join(columns)})
+    SELECT {select} FROM src.users u
+    ''')
+    count = cursor.rowcount
+    # Every user gets exactly one funds row and one FinPet
+    cursor.execute("INSERT OR IGNORE INTO funds (user_id, balance_cents) SELECT id, 0 FROM users")
+    cursor.execute("INSERT OR IGNORE INTO finpet (user_id) SELECT id FROM users")
+    conn.commit()
+    return count
+
+def copy_table(conn, source, table_name, batch_size=COPY_BATCH_SIZE):
+    """Copy a per-user table in rowid ranges, skipping legacy rows copied by an earlier run."""
+    spec = COPY_TABLES[table_name]
+    owner = _owner_expr(conn, table_name)
+    source_columns = _columns(conn, "src", table_name)
+    columns = {c: legacy for c, legacy in spec["columns"].items() if legacy in source_columns}
+    if owner is None or not columns:
+        return 0
+    select = ", ".join(_source_expr(c, legacy) for c, legacy in columns.items())
+    # Same rows for the copy and the bookkeeping insert, which share a transaction
+    pending = f'''
+        FROM src.{table_name} t
+        JOIN users u ON u.username = {owner}
+        WHERE t.rowid >= ? AND t.rowid < ?
+          AND NOT EXISTS (
+              SELECT 1 FROM legacy_rows l
+              WHERE l.source = ? AND l.table_name = ? AND l.legacy_id = t.rowid
+          )
+        ORDER BY t.rowid
+    '''
+
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT MIN(rowid), MAX(rowid) FROM src.{table_name}")
+    low, high = cursor.fetchone()
+    if low is None:
+        return 0
+
+    copied = 0
+    for start in range(low, high + 1, batch_size):
+        params = (start, start + batch_size, source, table_name)
+        cursor.execute(f'INSERT INTO {table_name} (user_id, {", ".join(columns)}) SELECT u.id, {select} {pending}', params)
+        copied += cursor.rowcount
+        cursor.execute(
+            f"INSERT INTO legacy_rows (source, table_name, legacy_id) SELECT ?, ?, t.rowid {pending}",
+            (source, table_name) + params,
+        )
+        conn.commit()
+    return copied
+
+def copy_funds(conn, seen):
+    """Take each user's balance from the highest-priority source that has one."""
+    owner = _owner_expr(conn, "funds", "f")
+    if owner is None:
+        return 0
+    cursor = conn.cursor()
+    cursor.execute(f'''
+    SELECT u.id, {_source_expr("balance_cents", "balance", "f")}
+    FROM src.funds f
+    JOIN users u ON u.username = {owner}
+    ''')
+    rows = [(balance, user_id) for user_id, balance in cursor.fetchall() if user_id not in seen]
+    cursor.executemany("UPDATE funds SET balance_cents = ? WHERE user_id = ?", rows)
+    seen.update(user_id for _, user_id in rows)
+    conn.commit()
+    return len(rows)
+
+def copy_finpet(conn):
+    """Keep the most advanced FinPet (level, then XP) a user has in any source."""
+    owner = _owner_expr(conn, "finpet", "p")
+    if owner is None:
+        return 0
+    cursor = conn.cursor()
+    cursor.execute(f'''
+    UPDATE finpet
+    SET (level, xp, next_level_xp, name, last_fed) = (
+        SELECT p.level, p.xp, p.next_level_xp, p.name, p.last_fed
+        FROM src.finpet p
+        JOIN users u ON u.username = {owner}
+        WHERE u.id = finpet.user_id
+        ORDER BY p.level DESC, p.xp DESC
+        LIMIT 1
+    )
+    WHERE EXISTS (
+        SELECT 1 FROM src.finpet p
+        JOIN users u ON u.username = {owner}
+        WHERE u.id = finpet.user_id
+          AND (p.level > finpet.level OR (p.level = finpet.level AND p.xp > finpet.xp))
+    )
+    ''')
+    count = cursor.rowcount
+    conn.commit()
+    return count
+
+def copy_rewards(conn):
+    """Expand the legacy finpet.rewards JSON arrays into the rewards table."""
+    owner = _owner_expr(conn, "finpet", "p")
+    if owner is None or "rewards" not in _columns(conn, "src", "finpet"):
+        return 0
+    cursor = conn.cursor()
+    cursor.execute(f'''
+    INSERT OR IGNORE INTO rewards (user_id, name, description, icon, date)
+    SELECT u.id,
+           json_extract(r.value, '$.name'),
+           json_extract(r.value, '$.description'),
+           COALESCE(json_extract(r.value, '$.icon'), '🎁'),
+           COALESCE(json_extract(r.value, '$.date'), p.last_fed, strftime('%Y-%m-%dT%H:%M:%S', 'now'))
+    FROM src.finpet p
+    JOIN users u ON u.username = {owner},
+         json_each(CASE WHEN json_valid(p.rewards) THEN p.rewards ELSE '[]' END) r
+    WHERE json_extract(r.value, '$.name') IS NOT NULL
+    ORDER BY u.id, r.key
+    ''')
+    count = cursor.rowcount
+    conn.commit()
+    return count
+
+def copy_outbox(conn):
+    """Carry over side effects that were queued but not yet applied."""
+    owner = _owner_expr(conn, "outbox", "o")
+    if owner is None:
+        return 0
+    cursor = conn.cursor()
+    cursor.execute(f'''
+    INSERT INTO outbox (user_id, kind, payload, created_at)
+    SELECT u.id, o.kind, o.payload, o.created_at
+    FROM src.outbox o
+    JOIN users u ON u.username = {owner}
+    ORDER BY o.id
+    ''')
+    count = cursor.rowcount
+    conn.commit()
+    return count
+
+def consolidate(conn, sources, batch_size=COPY_BATCH_SIZE, log=print):
+    """Merge legacy database files into the open canonical database."""
+    funded = set()
+    for path in sources:
+        if not os.path.exists(path):
+            log(f"{path}: not found, skipped")
+            continue
+        conn.execute("ATTACH DATABASE ? AS src", (path,))
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT name FROM src.sqlite_master WHERE type = 'table'")
+            tables = {row[0] for row in cursor.fetchall()}
+            if "users" not in tables:
+                log(f"{path}: no users table, skipped")
+                continue
+            counts = {"users": copy_users(conn)}
+            for table_name in COPY_TABLES:
+                if table_name in tables:
+                    counts[table_name] = copy_table(conn, os.path.basename(path), table_name, batch_size)
+            if "funds" in tables:
+                counts["funds"] = copy_funds(conn, funded)
+            if "finpet" in tables:
+                counts["finpet"] = copy_finpet(conn)
+                counts["rewards"] = copy_rewards(conn)
+            if "outbox" in tables:
+                counts["outbox"] = copy_outbox(conn)
+            log(f"{path}: " + ", ".join(f"{name}={count}" for name, count in counts.items()))
+        finally:
+            conn.commit()
+            conn.execute("DETACH DATABASE src")
+
+    # Balances are derived from the ledger from here on
+    seeded = ledger.backfill_movements(conn)
+    ledger.take_snapshots(conn)
+    log(f"ledger: seeded {seeded} users")
+    log(f"achievements: rebuilt counters for {achievements.rebuild_counters(conn)} users")
+    log(f"budgets: rebuilt {budgets.rebuild(conn)} budget periods")
+    log(f"goals: backfilled {goals.backfill_contributions(conn)} contributions")
+    log(f"anomalies: seeded statistics for {anomalies.backfill(conn)} user categories")
+    log(f"duplicates: hashed {duplicates.backfill(conn)} expenses, flagged {len(duplicates.scan(conn))} duplicates")
+    scanned, series = recurring.detect(conn)
+    log(f"recurring: scanned {scanned} users, detected {series} series")
+
+# ------------------------
+# Integrity checks
+# ------------------------
+
+def check_integrity(conn, tolerance=ledger.DRIFT_TOLERANCE):
+    """Return a list of problems found in the consolidated database (empty if none)."""
+    problems = []
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA integrity_check")
+    result = cursor.fetchone()[0]
+    if result != "ok":
+        problems.append(f"integrity_check: {result}")
+    cursor.execute("PRAGMA foreign_key_check")
+    for table_name, rowid, parent, _ in cursor.fetchall():
+        problems.append(f"foreign key: {table_name} row {rowid} has no {parent} parent")
+
+    # Every user has exactly one funds row and one FinPet
+    for table_name in ("funds", "finpet"):
+        cursor.execute(f'''
+        SELECT COUNT(*) FROM users u
+        WHERE NOT EXISTS (SELECT 1 FROM {table_name} t WHERE t.user_id = u.id)
+        ''')
+        missing = cursor.fetchone()[0]
+        if missing:
+            problems.append(f"{missing} users without a {table_name} row")
+
+    # Ledger replays to the stored balance for every user
+    report = ledger.reconcile(conn, tolerance)
+    for user_id, row in report[report["drift"]].iterrows():
+        problems.append(
+            f"user {user_id}: ledger {money.format_money(row['ledger_balance'])}"
+            f" != stored {money.format_money(row['stored_balance'])}"
+        )
+    return problems
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge the legacy database files into the canonical database.")
+    parser.add_argument("sources", nargs="*", default=LEGACY_SOURCES, help="Legacy database files, highest priority first")
+    parser.add_argument("--db", default=database.get_db_path(), help="Canonical SQLite database file")
+    parser.add_argument("--batch-size", type=int, default=COPY_BATCH_SIZE)
+    parser.add_argument("--check-only", action="store_true", help="Only run the integrity checks")
+    args = parser.parse_args(argv)
+
+    conn = database.connect(args.db)
+    try:
+        if not args.check_only:
+            consolidate(conn, [os.path.abspath(path) for path in args.sources], args.batch_size)
+        problems = check_integrity(conn)
+    finally:
+        conn.close()
+
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    print(f"{len(problems)} integrity problems")
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,265 +1,476 @@
-import os
 import sqlite3
-import streamlit as st
-from datetime import datetime
-import json
 import threading
+import storage
 
-# Thread-local storage for database connections
-thread_local = threading.local()
+# Single data-access entry point. Every page, helper module and CLI opens the
+# canonical database through get_db(); consolidate.py merges the legacy
+# database.db / finance_tracker.db / finance.db files into it.
 
-# Remove global variables since we're using thread_local storage
-_conn = None  # This is just to avoid errors in places where _conn might still be referenced
+# Schema is created once per database file per process
+_initialized = set()
+_init_lock = threading.Lock()
+
+# username -> users.id; usernames never change once registered
+_user_ids = {}
+
+# Per-thread {db_path: connection} for get_db(); closed when the thread's locals are dropped
+_connections = threading.local()
+storage.register_connections(lambda: list(_connections.__dict__.get("by_path", {}).values()))
 
 def get_db_path():
     """Get SQLite database path."""
-    return "finance_tracker.db"
+    return "pfm.db"
 
-def initialize_db():
-    """Initialize the SQLite database connection and create required tables if they don't exist."""
-    try:
-        # Connect to SQLite database with check_same_thread=False for Streamlit's threaded environment
-        db_path = get_db_path()
-        conn = sqlite3.connect(db_path, check_same_thread=False)
-        # Configure row_factory to access rows as dictionaries
-        conn.row_factory = sqlite3.Row
-        
-        # Create tables if they don't exist
-        cursor = conn.cursor()
-        
-        # Users table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            username TEXT PRIMARY KEY,
-            password TEXT NOT NULL,
-            zen_mode INTEGER DEFAULT 0,
-            wants_budget REAL DEFAULT 100.0
-        )
-        ''')
-        
-        # Funds table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS funds (
-            username TEXT PRIMARY KEY,
-            balance REAL DEFAULT 0,
-            FOREIGN KEY (username) REFERENCES users(username)
-        )
-        ''')
-        
-        # Expenses table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS expenses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL,
-            description TEXT NOT NULL,
-            amount REAL NOT NULL,
-            date TEXT NOT NULL,
-            category TEXT,
-            type TEXT,
-            FOREIGN KEY (username) REFERENCES users(username)
-        )
-        ''')
-        
-        # Goals table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS goals (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL,
-            name TEXT NOT NULL,
-            target_amount REAL NOT NULL,
-            current_amount REAL DEFAULT 0,
-            date_created TEXT,
-            completed INTEGER DEFAULT 0,
-            FOREIGN KEY (username) REFERENCES users(username)
-        )
+# Every per-user table is keyed by the integer users.id surrogate key, and every
+# money column holds integer cents (see money.py)
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        zen_mode INTEGER DEFAULT 0,
+        wants_budget_cents INTEGER DEFAULT 10000
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS funds (
+        user_id INTEGER PRIMARY KEY,
+        balance_cents INTEGER DEFAULT 0,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS expenses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        description TEXT NOT NULL,
+        amount_cents INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        category TEXT,
+        type TEXT,
+        content_hash INTEGER,
+        duplicate_of INTEGER,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_expenses_user_date ON expenses (user_id, date, id)",
+    # Finds a resubmitted expense with one lookup (see duplicates.py)
+    "CREATE INDEX IF NOT EXISTS idx_expenses_user_hash ON expenses (user_id, content_hash)",
+    # Covers wants-spending range sums without touching the table (see zen.py)
+    "CREATE INDEX IF NOT EXISTS idx_expenses_user_type_date ON expenses (user_id, type, date, amount_cents)",
+    # Full-text index over descriptions, kept in step by the triggers below (see search.py)
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5(
+        description, content='expenses', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS expenses_fts_insert AFTER INSERT ON expenses BEGIN
+        INSERT INTO expenses_fts (rowid, description) VALUES (new.id, new.description);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS expenses_fts_delete AFTER DELETE ON expenses BEGIN
+        INSERT INTO expenses_fts (expenses_fts, rowid, description) VALUES ('delete', old.id, old.description);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS expenses_fts_update AFTER UPDATE OF description ON expenses BEGIN
+        INSERT INTO expenses_fts (expenses_fts, rowid, description) VALUES ('delete', old.id, old.description);
+        INSERT INTO expenses_fts (rowid, description) VALUES (new.id, new.description);
+    END
+    ''',
+    # Archived expenses' descriptions (see archive.py). Contentless, so only the index is stored;
+    # owner holds a "u<user id>" token that scopes a MATCH to one user
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS archived_expenses_fts USING fts5(
+        description, owner, content='', tokenize='unicode61 remove_diacritics 2'
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS fund_transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        amount_cents INTEGER NOT NULL,
+        description TEXT,
+        date TEXT NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_fund_transactions_user_date ON fund_transactions (user_id, date, id)",
+    '''
+    CREATE TABLE IF NOT EXISTS goals (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        target_cents INTEGER NOT NULL,
+        current_cents INTEGER DEFAULT 0,
+        date_created TEXT,
+        completed INTEGER DEFAULT 0,
+        priority INTEGER NOT NULL DEFAULT 0,
+        allocation_pct INTEGER NOT NULL DEFAULT 0,
+        deadline TEXT,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_goals_user ON goals (user_id)",
+    # Running log-amount statistics per user and category (see anomalies.py)
+    '''
+    CREATE TABLE IF NOT EXISTS category_stats (
+        user_id INTEGER NOT NULL,
+        category TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        mean REAL NOT NULL,
+        m2 REAL NOT NULL,
+        PRIMARY KEY (user_id, category)
+    ) WITHOUT ROWID
+    ''',
+    # Expenses that repeat on a schedule, found by recurring.py
+    '''
+    CREATE TABLE IF NOT EXISTS recurring_series (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        key TEXT NOT NULL,
+        description TEXT NOT NULL,
+        category TEXT,
+        type TEXT,
+        period TEXT NOT NULL,
+        amount_cents INTEGER NOT NULL,
+        anchor_day INTEGER NOT NULL,
+        occurrences INTEGER NOT NULL,
+        last_date TEXT NOT NULL,
+        next_date TEXT NOT NULL,
+        active INTEGER NOT NULL DEFAULT 1,
+        auto_create INTEGER NOT NULL DEFAULT 0,
+        UNIQUE (user_id, key),
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''',
+    # Newest expense each user's series were detected from
+    '''
+    CREATE TABLE IF NOT EXISTS recurring_scan (
+        user_id INTEGER PRIMARY KEY,
+        last_expense_id INTEGER NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''',
+    # Every Zen Mode activation and deactivation (see zen.py)
+    '''
+    CREATE TABLE IF NOT EXISTS zen_mode_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        active INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_zen_mode_events_user_date ON zen_mode_events (user_id, date)",
+    # How each user's deposits are split across their goals (see allocation.py)
+    '''
+    CREATE TABLE IF NOT EXISTS allocation_rules (
+        user_id INTEGER PRIMARY KEY,
+        strategy TEXT NOT NULL DEFAULT 'priority',
+        deposit_pct INTEGER NOT NULL DEFAULT 100,
+        enabled INTEGER NOT NULL DEFAULT 0,
+        last_deposit_id INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''',
+    # Every change to a goal's progress; projections are computed from it (see goals.py)
+    '''
+    CREATE TABLE IF NOT EXISTS goal_contributions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        goal_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        amount_cents INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        FOREIGN KEY (goal_id) REFERENCES goals(id),
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_goal_contributions_goal_date ON goal_contributions (goal_id, date)",
+    "CREATE INDEX IF NOT EXISTS idx_goal_contributions_user ON goal_contributions (user_id, id)",
+    '''
+    CREATE TABLE IF NOT EXISTS finpet (
+        user_id INTEGER PRIMARY KEY,
+        level INTEGER DEFAULT 1,
+        xp INTEGER DEFAULT 0,
+        next_level_xp INTEGER DEFAULT 75,
+        name TEXT DEFAULT 'Penny',
+        last_fed TEXT,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''',
+    # One row per earned reward; the unique key makes every reward a one-time award
+    '''
+    CREATE TABLE IF NOT EXISTS rewards (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        description TEXT,
+        icon TEXT DEFAULT '🎁',
+        date TEXT NOT NULL,
+        UNIQUE (user_id, name),
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_rewards_user_date ON rewards (user_id, date, id)",
+    # Running totals the achievement rules are evaluated against (see achievements.py)
+    '''
+    CREATE TABLE IF NOT EXISTS user_counters (
+        user_id INTEGER PRIMARY KEY,
+        expense_count INTEGER NOT NULL DEFAULT 0,
+        needs_cents INTEGER NOT NULL DEFAULT 0,
+        wants_cents INTEGER NOT NULL DEFAULT 0,
+        completed_goals INTEGER NOT NULL DEFAULT 0,
+        balance_high_water_cents INTEGER NOT NULL DEFAULT 0,
+        reward_count INTEGER NOT NULL DEFAULT 0,
+        savings_streak_weeks INTEGER NOT NULL DEFAULT 0,
+        last_savings_week TEXT,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''',
+    # Leaderboard rankings are top-N walks of these indexes (see leaderboard.py)
+    "CREATE INDEX IF NOT EXISTS idx_finpet_rank ON finpet (level DESC, xp DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_user_counters_rewards ON user_counters (reward_count DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_user_counters_streak ON user_counters (savings_streak_weeks DESC, last_savings_week)",
+    # Spending budgets; an expense counts toward every budget whose type and
+    # category filters match it (NULL matches anything). Budgets with a category
+    # are envelopes. With rollover, carry_cents is the balance carried into the
+    # period starting on starts_on. See budgets.py.
+    '''
+    CREATE TABLE IF NOT EXISTS budgets (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        expense_type TEXT,
+        category TEXT,
+        period TEXT NOT NULL DEFAULT 'week',
+        week_start INTEGER NOT NULL DEFAULT 0,
+        limit_cents INTEGER NOT NULL,
+        rollover INTEGER NOT NULL DEFAULT 0,
+        carry_cents INTEGER NOT NULL DEFAULT 0,
+        starts_on TEXT,
+        UNIQUE (user_id, name),
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''',
+    # Spent counter per budget per calendar period, keyed by the period's first day
+    '''
+    CREATE TABLE IF NOT EXISTS budget_periods (
+        budget_id INTEGER NOT NULL,
+        period_start TEXT NOT NULL,
+        spent_cents INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (budget_id, period_start),
+        FOREIGN KEY (budget_id) REFERENCES budgets(id)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS money_movements (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        amount_cents INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        ref_id INTEGER,
+        date TEXT NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_money_movements_user ON money_movements (user_id, id)",
+    "CREATE INDEX IF NOT EXISTS idx_money_movements_user_kind ON money_movements (user_id, kind, date, id)",
+    '''
+    CREATE TABLE IF NOT EXISTS balance_snapshots (
+        user_id INTEGER PRIMARY KEY,
+        balance_cents INTEGER NOT NULL,
+        last_movement_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL DEFAULT '{}',
+        created_at TEXT NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''',
+    # Legacy rows already copied in, by source file and legacy rowid (see consolidate.py)
+    '''
+    CREATE TABLE IF NOT EXISTS legacy_rows (
+        source TEXT NOT NULL,
+        table_name TEXT NOT NULL,
+        legacy_id INTEGER NOT NULL,
+        PRIMARY KEY (source, table_name, legacy_id)
+    ) WITHOUT ROWID
+    ''',
+]
+
+def migrate_finpet_rewards(conn):
+    """Move rewards out of the old finpet.rewards JSON column into the rewards table."""
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(finpet)")
+    if "rewards" not in [row[1] for row in cursor.fetchall()]:
+        return 0
+    cursor.execute('''
+    INSERT OR IGNORE INTO rewards (user_id, name, description, icon, date)
+    SELECT f.user_id,
+           json_extract(r.value, '$.name'),
+           json_extract(r.value, '$.description'),
+           COALESCE(json_extract(r.value, '$.icon'), '🎁'),
+           COALESCE(json_extract(r.value, '$.date'), f.last_fed, strftime('%Y-%m-%dT%H:%M:%S', 'now'))
+    FROM finpet f, json_each(CASE WHEN json_valid(f.rewards) THEN f.rewards ELSE '[]' END) r
+    WHERE json_extract(r.value, '$.name') IS NOT NULL
+    ORDER BY f.user_id, r.key
+    ''')
+    migrated = cursor.rowcount
+    cursor.execute("ALTER TABLE finpet DROP COLUMN rewards")
+    return migrated
+
+# Columns added to tables after they first shipped
+ADDED_COLUMNS = {
+    "user_counters": {
+        "reward_count": "INTEGER NOT NULL DEFAULT 0",
+        "savings_streak_weeks": "INTEGER NOT NULL DEFAULT 0",
+        "last_savings_week": "TEXT",
+    },
+    "budgets": {
+        "rollover": "INTEGER NOT NULL DEFAULT 0",
+        "carry_cents": "INTEGER NOT NULL DEFAULT 0",
+        "starts_on": "TEXT",
+    },
+    "goals": {
+        "priority": "INTEGER NOT NULL DEFAULT 0",
+        "allocation_pct": "INTEGER NOT NULL DEFAULT 0",
+        "deadline": "TEXT",
+    },
+    "expenses": {
+        "content_hash": "INTEGER",
+        "duplicate_of": "INTEGER",
+    },
+}
+
+def add_missing_columns(conn, table_name):
+    """Add any ADDED_COLUMNS missing from an existing table. Returns the columns added."""
+    cursor = conn.cursor()
+    cursor.execute(f"PRAGMA table_info({table_name})")
+    existing = [row[1] for row in cursor.fetchall()]
+    if not existing:
+        return []
+    columns = ADDED_COLUMNS[table_name]
+    added = [column for column in columns if column not in existing]
+    for column in added:
+        cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {column} {columns[column]}")
+    return added
+
+def migrate_user_counters(conn):
+    """Add the leaderboard columns to an existing user_counters table. Returns the columns added."""
+    added = add_missing_columns(conn, "user_counters")
+    if "reward_count" in added:
+        conn.execute('''
+        UPDATE user_counters
+        SET reward_count = (SELECT COUNT(*) FROM rewards r WHERE r.user_id = user_counters.user_id)
         ''')
-        
-        # FinPet table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS finpet (
-            username TEXT PRIMARY KEY,
-            level INTEGER DEFAULT 1,
-            xp INTEGER DEFAULT 0,
-            next_level_xp INTEGER DEFAULT 75,
-            name TEXT DEFAULT 'Penny',
-            last_fed TEXT,
-            rewards TEXT DEFAULT '[]',
-            FOREIGN KEY (username) REFERENCES users(username)
+    # Savings streaks start from the next deposit; `python achievements.py rebuild` backfills them
+    return added
+
+def initialize_db(conn):
+    """Create the canonical tables and indexes if they don't exist, migrating older layouts."""
+    cursor = conn.cursor()
+    # Runs first so the indexes in SCHEMA find their columns
+    migrate_user_counters(conn)
+    add_missing_columns(conn, "budgets")
+    add_missing_columns(conn, "goals")
+    add_missing_columns(conn, "expenses")
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'expenses_fts'")
+    search_indexed = cursor.fetchone() is not None
+    for statement in SCHEMA:
+        cursor.execute(statement)
+    if not search_indexed:
+        # Index the expenses that predate the search table
+        cursor.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+    migrate_finpet_rewards(conn)
+    # Users whose counters row or Wants budget is missing, e.g. copied in by consolidate
+    import achievements
+    import budgets
+    achievements.seed_counters(conn)
+    budgets.seed_wants_budgets(conn)
+    conn.commit()
+
+def connect(db_path):
+    """Open a configured connection to a database file in the canonical schema."""
+    conn = storage.connect(db_path, row_factory=sqlite3.Row, foreign_keys=True)
+    if db_path not in _initialized:
+        with _init_lock:
+            if db_path not in _initialized:
+                initialize_db(conn)
+                _initialized.add(db_path)
+    return conn
+
+def get_db():
+    """Get this thread's connection to the application database, opened on first use."""
+    connections = _connections.__dict__.setdefault("by_path", {})
+    db_path = get_db_path()
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = connections[db_path] = connect(db_path)
+    elif conn.in_transaction and not storage.in_write():
+        # A write on this thread failed before committing; don't let its partial work ride along
+        conn.rollback()
+    return conn
+
+# ------------------------
+# Users
+# ------------------------
+
+def get_user_id(username, conn=None):
+    """Resolve a username to its integer id. Raises ValueError for unknown users."""
+    user_id = _user_ids.get(username)
+    if user_id is not None:
+        return user_id
+    if conn is None:
+        conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f"Unknown user: {username}")
+    _user_ids[username] = row[0]
+    return row[0]
+
+@storage.serialized_write
+def create_user(username, password_hash):
+    """Register a user with an empty funds row, FinPet, counters and Wants budget. Returns False if the username is taken."""
+    conn = get_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "INSERT INTO users (username, password) VALUES (?, ?)",
+            (username, password_hash)
         )
-        ''')
-        
-        # Check if 'rewards' column exists in finpet table, and add it if it doesn't
-        try:
-            cursor.execute("SELECT rewards FROM finpet LIMIT 1")
-        except sqlite3.OperationalError:
-            # Column doesn't exist, add it
-            cursor.execute("ALTER TABLE finpet ADD COLUMN rewards TEXT DEFAULT '[]'")
-            
-        conn.commit()
-        
-        # Store connection in thread_local
-        thread_local.conn = conn
-        
-        # Set current time in session state for consistency across the app
-        if "current_time" not in st.session_state:
-            st.session_state.current_time = datetime.now()
-        
-        return True
-    except Exception as e:
-        st.error(f"Database connection error: {e}")
+    except sqlite3.IntegrityError:
+        conn.rollback()
         return False
+    user_id = cursor.lastrowid
+    cursor.execute("INSERT INTO funds (user_id, balance_cents) VALUES (?, 0)", (user_id,))
+    cursor.execute("INSERT INTO finpet (user_id, name) VALUES (?, 'Penny')", (user_id,))
+    cursor.execute("INSERT INTO user_counters (user_id) VALUES (?)", (user_id,))
+    # Seeded here so page renders only read it (see budgets.py)
+    cursor.execute('''
+    INSERT INTO budgets (user_id, name, expense_type, limit_cents)
+    SELECT id, 'Wants', 'Wants', COALESCE(wants_budget_cents, 10000) FROM users WHERE id = ?
+    ''', (user_id,))
+    conn.commit()
+    _user_ids[username] = user_id
+    return True
 
-def get_db():
-    """Get the SQLite database instance with a document-like interface for compatibility."""
-    # Check if we have a connection in thread_local storage
-    if not hasattr(thread_local, 'conn'):
-        # If not, initialize the database
-        initialize_db()
-    
-    # Create a class that provides a document-style interface using SQLite
-    class Collection:
-        def __init__(self, conn, table_name):
-            self.conn = conn
-            self.table_name = table_name
-            self._conn = conn  # For compatibility with other modules
-            self._sort_field = None
-            self._sort_direction = None
-            self._projection = None
-        
-        def find_one(self, query):
-            cursor = self.conn.cursor()
-            
-            # Handle id query
-            if 'id' in query:
-                cursor.execute(f"SELECT * FROM {self.table_name} WHERE id = ?", (query['id'],))
-                result = cursor.fetchone()
-                if result:
-                    # Convert sqlite3.Row to dictionary
-                    return dict(result)
-                return None
-            
-            # Handle username query (most common case)
-            if 'username' in query:
-                cursor.execute(f"SELECT * FROM {self.table_name} WHERE username = ?", (query['username'],))
-                result = cursor.fetchone()
-                if result:
-                    return dict(result)
-                return None
-            
-            return None
-        
-        def insert_one(self, document):
-            cursor = self.conn.cursor()
-            # Extract keys and values
-            keys = list(document.keys())
-            values = list(document.values())
-            placeholders = ', '.join(['?' for _ in keys])
-            columns = ', '.join(keys)
-            
-            # Insert the document
-            cursor.execute(f"INSERT INTO {self.table_name} ({columns}) VALUES ({placeholders})", values)
-            self.conn.commit()
-            # Get last inserted id
-            last_id = cursor.lastrowid
-            return {"id": last_id}
-        
-        def update_one(self, query, update):
-            cursor = self.conn.cursor()
-            # Handle the $set operator (most common case)
-            if '$set' in update:
-                set_values = update['$set']
-                set_clause = ', '.join([f"{key} = ?" for key in set_values.keys()])
-                values = list(set_values.values())
-                
-                # Handle username query (most common case)
-                if 'username' in query:
-                    values.append(query['username'])
-                    cursor.execute(f"UPDATE {self.table_name} SET {set_clause} WHERE username = ?", values)
-                    self.conn.commit()
-                    return True
-                
-                # Handle id query
-                if 'id' in query:
-                    values.append(query['id'])
-                    cursor.execute(f"UPDATE {self.table_name} SET {set_clause} WHERE id = ?", values)
-                    self.conn.commit()
-                    return True
-            return False
-        
-        def find(self, query=None, projection=None):
-            cursor = self.conn.cursor()
-            self._projection = projection
-            # Build the SQL query
-            fields = "*"
-            if projection:
-                projection_fields = [field for field, include in projection.items() if include]
-                if projection_fields:
-                    fields = ", ".join(projection_fields)
-            sql_query = f"SELECT {fields} FROM {self.table_name}"
-            params = []
-            # Build WHERE clause
-            where_clauses = []
-            if query:
-                # Handle basic username query
-                if 'username' in query:
-                    where_clauses.append("username = ?")
-                    params.append(query['username'])
-                # Handle $gte and $lte operators for date ranges or numeric fields
-                for key, value in query.items():
-                    if isinstance(value, dict):
-                        for op, op_value in value.items():
-                            if op == '$gte':
-                                where_clauses.append(f"{key} >= ?")
-                                params.append(op_value)
-                            elif op == '$lte':
-                                where_clauses.append(f"{key} <= ?")
-                                params.append(op_value)
-                # Handle direct value matches for other fields
-                for key, value in query.items():
-                    if key != 'username' and not isinstance(value, dict):
-                        where_clauses.append(f"{key} = ?")
-                        params.append(value)
-            if where_clauses:
-                sql_query += " WHERE " + " AND ".join(where_clauses)
-            # Add ORDER BY clause if sort is specified
-            if self._sort_field:
-                direction = "DESC" if self._sort_direction == -1 else "ASC"
-                sql_query += f" ORDER BY {self._sort_field} {direction}"
-            # Execute the query
-            cursor.execute(sql_query, params)
-            results = cursor.fetchall()
-            column_names = [description[0] for description in cursor.description]
-            result_list = [dict(zip(column_names, row)) for row in results]
-            # Reset sort and projection settings
-            self._sort_field = None
-            self._sort_direction = None
-            self._projection = None
-            return result_list
-        
-        def sort(self, *args, **kwargs):
-            """
-            Set sorting parameters for the query.
-            Supports both positional and keyword arguments:
-            - sort("field", 1) or sort("field", -1)
-            - sort(field="field", direction=1) or sort(field="field", direction=-1)
-            """
-            if args and len(args) >= 2:
-                self._sort_field = args[0]
-                self._sort_direction = args[1]
-            elif kwargs:
-                self._sort_field = kwargs.get('field')
-                self._sort_direction = kwargs.get('direction')
-            return self
-    
-    # Create a proxy object that provides a simple document-like interface over SQLite
-    class DBProxy:
-        def __init__(self, conn):
-            self.conn = conn
-            self._collections = {}
-        
-        def __getattr__(self, name):
-            if name not in self._collections:
-                self._collections[name] = Collection(self.conn, name)
-            return self._collections[name]
-    
-    return DBProxy(thread_local.conn)
+def get_user_credentials(username):
+    """Get (id, password_hash, zen_mode) for a username, or None."""
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, password, zen_mode FROM users WHERE username = ?", (username,))
+    row = cursor.fetchone()
+    return tuple(row) if row else None
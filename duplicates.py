@@ -0,0 +1,159 @@
+import argparse
+import hashlib
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+import database
+import money
+import suggestions
+
+# Duplicate expense detection. A rerun or a double-click can submit the same
+# expense twice within seconds. Every expense stores a content hash of its
+# user, normalized description, amount and time bucket, indexed with the user
+# id, so a resubmission is found with one index lookup before it is inserted.
+# A batch scan flags the duplicates already in the table.
+
+# Expenses this close together with the same description and amount are duplicates
+DUPLICATE_WINDOW_SECONDS = 120
+
+# Rows hashed per transaction by backfill
+BACKFILL_BATCH_SIZE = 5000
+
+_EPOCH = datetime(1970, 1, 1)
+
+def _bucket(date):
+    return int((date - _EPOCH).total_seconds()) // DUPLICATE_WINDOW_SECONDS
+
+def _hash(user_id, description, amount_cents, bucket):
+    content = f"{user_id}\x1f{suggestions.normalize(description)}\x1f{int(amount_cents)}\x1f{bucket}"
+    # 64 bits fit an SQLite INTEGER; a collision only costs a comparison below
+    return int.from_bytes(hashlib.blake2b(content.encode(), digest_size=8).digest(), "big", signed=True)
+
+def content_hash(user_id, description, amount_cents, date):
+    """Hash identifying an expense's content within its DUPLICATE_WINDOW_SECONDS bucket."""
+    return _hash(user_id, description, amount_cents, _bucket(date))
+
+def find_duplicate(conn, user_id, description, amount_cents, date):
+    """
+    An existing expense the given one would duplicate, or None.
+
+    Looks up this bucket's hash and the one before it, so two submissions a
+    few seconds apart match even when a bucket boundary falls between them.
+    """
+    bucket = _bucket(date)
+    cursor = conn.cursor()
+    cursor.execute('''
+    SELECT id, description, amount_cents, date, category, type
+    FROM expenses
+    WHERE user_id = ? AND content_hash IN (?, ?)
+    ORDER BY id
+    ''', (user_id, _hash(user_id, description, amount_cents, bucket), _hash(user_id, description, amount_cents, bucket - 1)))
+    key = suggestions.normalize(description)
+    for row in cursor.fetchall():
+        seconds_apart = abs((datetime.fromisoformat(row["date"]) - date).total_seconds())
+        if (seconds_apart <= DUPLICATE_WINDOW_SECONDS and row["amount_cents"] == int(amount_cents)
+                and suggestions.normalize(row["description"]) == key):
+            return dict(row)
+    return None
+
+def backfill(conn, batch_size=BACKFILL_BATCH_SIZE):
+    """Hash expenses stored before content hashes existed. Returns the rows hashed."""
+    cursor = conn.cursor()
+    hashed = 0
+    while True:
+        cursor.execute('''
+        SELECT id, user_id, description, amount_cents, date
+        FROM expenses
+        WHERE content_hash IS NULL
+        LIMIT ?
+        ''', (batch_size,))
+        rows = cursor.fetchall()
+        if not rows:
+            return hashed
+        conn.executemany(
+            "UPDATE expenses SET content_hash = ? WHERE id = ?",
+            [(content_hash(row["user_id"], row["description"], row["amount_cents"], datetime.fromisoformat(row["date"])), row["id"])
+             for row in rows]
+        )
+        conn.commit()
+        hashed += len(rows)
+
+# ------------------------
+# Batch scan
+# ------------------------
+
+def scan(conn, user_id=None):
+    """
+    Flag existing duplicates, setting duplicate_of to the first expense of each run.
+
+    A run is expenses with the same user, description and amount, each within
+    DUPLICATE_WINDOW_SECONDS of the one before. Returns a DataFrame of the
+    newly flagged expenses.
+    """
+    query = "SELECT id, user_id, description, amount_cents, date, duplicate_of FROM expenses"
+    params = []
+    if user_id is not None:
+        query += " WHERE user_id = ?"
+        params.append(user_id)
+    df = pd.read_sql_query(query, conn, params=params)
+    if df.empty:
+        return df
+    df["key"] = df["description"].map(suggestions.normalize)
+    df["date"] = pd.to_datetime(df["date"], format="ISO8601")
+    df = df.sort_values(["user_id", "key", "amount_cents", "date", "id"])
+    group = ["user_id", "key", "amount_cents"]
+    gap = df.groupby(group, sort=False)["date"].diff().dt.total_seconds()
+    # A new run starts at each group's first expense and after every longer gap
+    df["run"] = (gap.isna() | (gap > DUPLICATE_WINDOW_SECONDS)).cumsum()
+    df["first_id"] = df.groupby("run")["id"].transform("first")
+    flagged = df[(df["id"] != df["first_id"]) & df["duplicate_of"].isna()]
+    conn.executemany(
+        "UPDATE expenses SET duplicate_of = ? WHERE id = ?",
+        zip(flagged["first_id"].astype(int).tolist(), flagged["id"].astype(int).tolist())
+    )
+    conn.commit()
+    return flagged.assign(duplicate_of=flagged["first_id"])[
+        ["id", "user_id", "description", "amount_cents", "date", "duplicate_of"]
+    ].reset_index(drop=True)
+
+def get_flagged(conn, user_id):
+    """A user's expenses flagged as duplicates, newest first."""
+    cursor = conn.cursor()
+    cursor.execute('''
+    SELECT id, description, amount_cents, date, category, type, duplicate_of
+    FROM expenses
+    WHERE user_id = ? AND duplicate_of IS NOT NULL
+    ORDER BY date DESC
+    ''', (user_id,))
+    return [dict(row) for row in cursor.fetchall()]
+
+# ------------------------
+# Command line interface
+# ------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hash expenses and flag duplicate submissions.")
+    parser.add_argument("command", choices=["backfill", "scan"])
+    parser.add_argument("--db", default=database.get_db_path(), help="SQLite database file")
+    parser.add_argument("--user", help="only scan this username (scan)")
+    args = parser.parse_args(argv)
+
+    conn = database.connect(args.db)
+    try:
+        if args.command == "backfill":
+            print(f"Hashed {backfill(conn)} expenses")
+            return 0
+        user_id = database.get_user_id(args.user, conn) if args.user else None
+        flagged = scan(conn, user_id)
+        for row in flagged.itertuples():
+            print(f"#{row.id} duplicates #{row.duplicate_of}: {row.date:%Y-%m-%d %H:%M} "
+                  f"{money.format_money(row.amount_cents)} {row.description}")
+        print(f"Flagged {len(flagged)} duplicate expenses")
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
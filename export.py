@@ -0,0 +1,132 @@
+import argparse
+import csv
+import io
+import json
+import sys
+import tempfile
+
+import archive
+import database
+
+# Rows pulled from SQLite per round trip; keeps memory flat for any history length
+EXPORT_BATCH_SIZE = 500
+
+# Spill the in-memory download buffer to disk once it passes this size
+SPOOL_MAX_BYTES = 1024 * 1024
+
+# Amounts are exported as integer cents, exactly as stored
+EXPORT_TABLES = {
+    "expenses": ["id", "description", "amount_cents", "date", "category", "type"],
+    "fund_transactions": ["id", "description", "amount_cents", "date"],
+}
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+
+# ------------------------
+# Cursor streaming
+# ------------------------
+
+def iter_rows(conn, table_name, user_id, batch_size=EXPORT_BATCH_SIZE):
+    """Yield a user's rows from an export table as tuples, fetching in fixed-size batches."""
+    if table_name not in EXPORT_TABLES:
+        raise ValueError(f"Unsupported export table: {table_name}")
+    if table_name == "expenses":
+        # Archived expenses (see archive.py) are older than everything left in the table
+        cold = archive.open_archive(conn, user_id)
+        if cold is not None:
+            for archived in archive.iter_frames(cold, batch_size):
+                archived["date"] = [date.isoformat() for date in archived["date"]]
+                yield from archived[EXPORT_TABLES[table_name]].astype(object).itertuples(index=False, name=None)
+    columns = ", ".join(EXPORT_TABLES[table_name])
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT {columns} FROM {table_name} WHERE user_id = ? ORDER BY date, id",
+        (user_id,)
+    )
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        for row in batch:
+            yield tuple(row)
+
+# ------------------------
+# Serializers
+# ------------------------
+
+def iter_csv(rows, columns):
+    """Serialize rows to CSV text chunks, one chunk per row plus the header."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate(0)
+        writer.writerow(row)
+        yield buffer.getvalue()
+
+def iter_jsonl(rows, columns):
+    """Serialize rows to JSON Lines text chunks."""
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row))) + "\n"
+
+def iter_export(conn, table_name, user_id, fmt="csv", batch_size=EXPORT_BATCH_SIZE):
+    """Stream a user's table as text chunks in the requested format."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    columns = EXPORT_TABLES.get(table_name, [])
+    rows = iter_rows(conn, table_name, user_id, batch_size)
+    if fmt == "csv":
+        return iter_csv(rows, columns)
+    return iter_jsonl(rows, columns)
+
+def write_export(conn, table_name, user_id, out, fmt="csv", batch_size=EXPORT_BATCH_SIZE):
+    """Write a streamed export to a text file object. Returns the number of chunks written."""
+    count = 0
+    for chunk in iter_export(conn, table_name, user_id, fmt, batch_size):
+        out.write(chunk)
+        count += 1
+    return count
+
+def export_file(conn, table_name, user_id, fmt="csv"):
+    """Build an export as a spooled binary file, suitable for st.download_button."""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, mode="w+b")
+    text = io.TextIOWrapper(spool, encoding="utf-8", newline="")
+    write_export(conn, table_name, user_id, text, fmt)
+    text.flush()
+    text.detach()
+    spool.seek(0)
+    return spool
+
+# ------------------------
+# Command line interface
+# ------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a user's expenses or deposits.")
+    parser.add_argument("username", help="User whose data is exported")
+    parser.add_argument("--table", choices=sorted(EXPORT_TABLES), default="expenses")
+    parser.add_argument("--format", dest="fmt", choices=sorted(EXPORT_FORMATS), default="csv")
+    parser.add_argument("--db", default=database.get_db_path(), help="SQLite database file")
+    parser.add_argument("--output", "-o", help="Output file (defaults to stdout)")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    conn = database.connect(args.db)
+    try:
+        user_id = database.get_user_id(args.username, conn)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8", newline="") as out:
+                write_export(conn, args.table, user_id, out, args.fmt, args.batch_size)
+        else:
+            write_export(conn, args.table, user_id, sys.stdout, args.fmt, args.batch_size)
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import argparse
+import sys
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import database
+
+# Savings goal projections. Every change to a goal's progress is recorded in
+# goal_contributions; completion dates for all of a user's goals are projected
+# in one pass from the recent contribution rate and cached until the user's
+# next contribution.
+
+# Contributions older than this don't count toward the saving rate
+RATE_WINDOW_DAYS = 90
+
+# Goals younger than the window are measured over their age, but never less than this
+MIN_RATE_DAYS = 7
+
+# user_id -> (cache key, projections DataFrame); least recently used dropped first
+_projections = {}
+_projections_lock = threading.Lock()
+MAX_CACHED_PROJECTIONS = 256
+
+# ------------------------
+# Contributions
+# ------------------------
+
+def record_contribution(conn, user_id, goal_id, amount_cents, date=None):
+    """Log a change to a goal's progress. Runs in the caller's transaction."""
+    date = date or datetime.now()
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO goal_contributions (goal_id, user_id, amount_cents, date) VALUES (?, ?, ?, ?)",
+        (goal_id, user_id, int(amount_cents), date.isoformat())
+    )
+    return cursor.lastrowid
+
+def get_contributions(conn, goal_id, limit=None):
+    """Get a goal's contributions, newest first."""
+    query = "SELECT id, amount_cents, date FROM goal_contributions WHERE goal_id = ? ORDER BY date DESC, id DESC"
+    params = [goal_id]
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    return [dict(row) for row in cursor.fetchall()]
+
+def backfill_contributions(conn):
+    """Recover contribution history from goal_contribution ledger movements for goals that have none."""
+    cursor = conn.cursor()
+    cursor.execute('''
+    INSERT INTO goal_contributions (goal_id, user_id, amount_cents, date)
+    SELECT m.ref_id, m.user_id, -m.amount_cents, m.date
+    FROM money_movements m
+    JOIN goals g ON g.id = m.ref_id AND g.user_id = m.user_id
+    WHERE m.kind = 'goal_contribution'
+      AND NOT EXISTS (SELECT 1 FROM goal_contributions c WHERE c.goal_id = m.ref_id)
+    ORDER BY m.id
+    ''')
+    conn.commit()
+    return cursor.rowcount
+
+# ------------------------
+# Projections
+# ------------------------
+
+_PROJECTION_QUERY = '''
+SELECT g.id, g.name, g.target_cents, g.current_cents, g.completed, g.date_created,
+       COALESCE(SUM(c.amount_cents), 0) AS recent_cents,
+       COUNT(c.id) AS recent_contributions
+FROM goals g
+LEFT JOIN goal_contributions c ON c.goal_id = g.id AND c.date >= :since
+WHERE g.user_id = :user_id
+GROUP BY g.id
+ORDER BY g.id
+'''
+
+def _cache_key(conn, user_id, today):
+    cursor = conn.cursor()
+    cursor.execute('''
+    SELECT (SELECT MAX(id) FROM goal_contributions WHERE user_id = :user_id),
+           (SELECT MAX(id) FROM goals WHERE user_id = :user_id),
+           (SELECT COUNT(*) FROM goals WHERE user_id = :user_id)
+    ''', {"user_id": user_id})
+    return tuple(cursor.fetchone()) + (today.date(),)
+
+def compute_projections(conn, user_id, today=None):
+    """
+    Project completion dates for all of a user's goals in one vectorized pass.
+
+    Returns a DataFrame with one row per goal: remaining_cents, the daily saving
+    rate over the recent window, and projected_date (NaT when the goal is done
+    or there is no recent saving to project from).
+    """
+    today = today or datetime.now()
+    since = today - timedelta(days=RATE_WINDOW_DAYS)
+    df = pd.read_sql_query(_PROJECTION_QUERY, conn, params={"since": since.isoformat(), "user_id": user_id})
+    if df.empty:
+        return df
+
+    created = pd.to_datetime(df["date_created"], format="ISO8601", errors="coerce").fillna(since)
+    age_days = (pd.Timestamp(today) - created).dt.total_seconds().to_numpy() / 86400
+    window_days = np.clip(age_days, MIN_RATE_DAYS, RATE_WINDOW_DAYS)
+
+    remaining = np.maximum(df["target_cents"].to_numpy(dtype=np.int64) - df["current_cents"].to_numpy(dtype=np.int64), 0)
+    rate = df["recent_cents"].to_numpy(dtype=np.float64) / window_days
+    open_goals = (remaining > 0) & (rate > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days_left = np.where(open_goals, np.ceil(remaining / rate), np.nan)
+
+    df["remaining_cents"] = remaining
+    df["daily_rate_cents"] = rate
+    df["days_left"] = days_left
+    df["projected_date"] = pd.Timestamp(today).normalize() + pd.to_timedelta(days_left, unit="D")
+    df["completed"] = df["completed"].astype(bool) | (remaining == 0)
+    return df.drop(columns=["date_created"])
+
+def get_projections(conn, user_id, today=None):
+    """Cached compute_projections; recomputed after the user's next contribution or goal change, or the next day."""
+    today = today or datetime.now()
+    key = _cache_key(conn, user_id, today)
+    with _projections_lock:
+        cached = _projections.pop(user_id, None)
+        if cached is not None and cached[0] == key:
+            # Reinserted as the most recently used
+            _projections[user_id] = cached
+            return cached[1]
+    projections = compute_projections(conn, user_id, today)
+    with _projections_lock:
+        _projections.pop(user_id, None)
+        _projections[user_id] = (key, projections)
+        while len(_projections) > MAX_CACHED_PROJECTIONS:
+            del _projections[next(iter(_projections))]
+    return projections
+
+# ------------------------
+# Command line interface
+# ------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain goal contribution history.")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--db", default=database.get_db_path(), help="SQLite database file")
+    args = parser.parse_args(argv)
+
+    conn = database.connect(args.db)
+    try:
+        print(f"Backfilled {backfill_contributions(conn)} goal contributions")
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import achievements
+import database
+
+# Cross-user rankings. Each board is a top-N walk of an index over one row per
+# user (finpet, user_counters), so rendering never touches expenses or the
+# ledger and costs the same at 100 users or 100k.
+
+LEADERBOARD_SIZE = 10
+
+# Savings streaks count consecutive weeks with a deposit; a streak is still live
+# if the user deposited this week or last week.
+BOARDS = {
+    "level": {
+        "title": "Top FinPets",
+        "value": "Level",
+        "query": '''
+        SELECT u.username, p.name AS pet_name, p.level AS value, p.xp
+        FROM finpet p INDEXED BY idx_finpet_rank
+        JOIN users u ON u.id = p.user_id
+        ORDER BY p.level DESC, p.xp DESC, p.user_id
+        LIMIT :limit
+        ''',
+        "rank": '''
+        SELECT COUNT(*) FROM finpet
+        WHERE level > :level OR (level = :level AND (xp > :xp OR (xp = :xp AND user_id < :user_id)))
+        ''',
+        "own": "SELECT level, xp FROM finpet WHERE user_id = :user_id",
+    },
+    "streak": {
+        "title": "Longest Savings Streaks",
+        "value": "Weeks",
+        "query": '''
+        SELECT u.username, p.name AS pet_name, c.savings_streak_weeks AS value
+        FROM user_counters c INDEXED BY idx_user_counters_streak
+        JOIN users u ON u.id = c.user_id
+        LEFT JOIN finpet p ON p.user_id = c.user_id
+        WHERE c.savings_streak_weeks > 0 AND c.last_savings_week >= :live_since
+        ORDER BY c.savings_streak_weeks DESC, c.user_id
+        LIMIT :limit
+        ''',
+        "rank": '''
+        SELECT COUNT(*) FROM user_counters
+        WHERE last_savings_week >= :live_since
+          AND (savings_streak_weeks > :value OR (savings_streak_weeks = :value AND user_id < :user_id))
+        ''',
+        "own": '''
+        SELECT savings_streak_weeks FROM user_counters
+        WHERE user_id = :user_id AND savings_streak_weeks > 0 AND last_savings_week >= :live_since
+        ''',
+    },
+    "rewards": {
+        "title": "Most Rewards Collected",
+        "value": "Rewards",
+        "query": '''
+        SELECT u.username, p.name AS pet_name, c.reward_count AS value
+        FROM user_counters c INDEXED BY idx_user_counters_rewards
+        JOIN users u ON u.id = c.user_id
+        LEFT JOIN finpet p ON p.user_id = c.user_id
+        WHERE c.reward_count > 0
+        ORDER BY c.reward_count DESC, c.user_id
+        LIMIT :limit
+        ''',
+        "rank": '''
+        SELECT COUNT(*) FROM user_counters
+        WHERE reward_count > :value OR (reward_count = :value AND user_id < :user_id)
+        ''',
+        "own": "SELECT reward_count FROM user_counters WHERE user_id = :user_id AND reward_count > 0",
+    },
+}
+
+def _params(today=None, **params):
+    today = today or datetime.now()
+    params["live_since"] = achievements.week_start(today - timedelta(weeks=1))
+    return params
+
+def top(conn, board, limit=LEADERBOARD_SIZE, today=None):
+    """Get the top entries of a board as dicts with rank, username, pet_name and value."""
+    if board not in BOARDS:
+        raise ValueError(f"Unknown leaderboard: {board}")
+    cursor = conn.cursor()
+    cursor.execute(BOARDS[board]["query"], _params(today, limit=limit))
+    return [dict(row, rank=rank) for rank, row in enumerate(cursor.fetchall(), start=1)]
+
+def rank_of(conn, board, user_id, today=None):
+    """A user's 1-based rank on a board, or None if they aren't on it."""
+    if board not in BOARDS:
+        raise ValueError(f"Unknown leaderboard: {board}")
+    cursor = conn.cursor()
+    params = _params(today, user_id=user_id)
+    cursor.execute(BOARDS[board]["own"], params)
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    if board == "level":
+        params.update(level=row[0], xp=row[1])
+    else:
+        params["value"] = row[0]
+    cursor.execute(BOARDS[board]["rank"], params)
+    return cursor.fetchone()[0] + 1
+
+# ------------------------
+# Benchmark
+# ------------------------
+
+def populate(conn, users, seed=0):
+    """Fill an empty database with synthetic users, FinPets and counters."""
+    rng = random.Random(seed)
+    today = datetime.now()
+    weeks = [achievements.week_start(today - timedelta(weeks=n)) for n in range(8)]
+    cursor = conn.cursor()
+    cursor.executemany(
+        "INSERT INTO users (id, username, password) VALUES (?, ?, '')",
+        ((i, f"user{i}") for i in range(1, users + 1))
+    )
+    finpets = []
+    for i in range(1, users + 1):
+        level = min(1 + int(rng.expovariate(0.15)), 60)
+        finpets.append((i, level, rng.randrange(achievements.level_threshold(level))))
+    cursor.executemany("INSERT INTO finpet (user_id, level, xp) VALUES (?, ?, ?)", finpets)
+    cursor.executemany(
+        '''
+        INSERT INTO user_counters (user_id, reward_count, savings_streak_weeks, last_savings_week)
+        VALUES (?, ?, ?, ?)
+        ''',
+        ((i, rng.randrange(9), rng.randrange(53), rng.choice(weeks)) for i in range(1, users + 1))
+    )
+    conn.commit()
+
+def benchmark(users=100000, iterations=50):
+    """Time every board's top-N and rank queries over a synthetic database."""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = database.connect(os.path.join(tmp, "leaderboard-bench.db"))
+        try:
+            start = time.perf_counter()
+            populate(conn, users)
+            print(f"Populated {users:,} users in {time.perf_counter() - start:.1f}s")
+            user_ids = [random.randint(1, users) for _ in range(iterations)]
+            for board in BOARDS:
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    top(conn, board)
+                top_ms = (time.perf_counter() - start) * 1000 / iterations
+                start = time.perf_counter()
+                for user_id in user_ids:
+                    rank_of(conn, board, user_id)
+                rank_ms = (time.perf_counter() - start) * 1000 / iterations
+                print(f"{board}: top {LEADERBOARD_SIZE} in {top_ms:.2f} ms, rank lookup in {rank_ms:.2f} ms")
+        finally:
+            conn.close()
+
+# ------------------------
+# Command line interface
+# ------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show or benchmark the FinPet leaderboards.")
+    parser.add_argument("command", choices=["show", "bench"])
+    parser.add_argument("--board", choices=sorted(BOARDS), default="level")
+    parser.add_argument("--limit", type=int, default=LEADERBOARD_SIZE)
+    parser.add_argument("--db", default=database.get_db_path(), help="SQLite database file")
+    parser.add_argument("--users", type=int, default=100000, help="Synthetic users for bench")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        benchmark(args.users, args.iterations)
+        return 0
+
+    conn = database.connect(args.db)
+    try:
+        for entry in top(conn, args.board, args.limit):
+            print(f"{entry['rank']:>3}. {entry['username']} ({entry['pet_name']}): {entry['value']}")
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,349 @@
+import argparse
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import archive
+import database
+
+LEDGER_PAGE_SIZE = 10
+
+# Expenses, deposits and goal contributions share no id space, so each branch carries a source tag
+# that breaks ties between rows with the same timestamp.
+_EXPENSE_BRANCH = """
+    SELECT * FROM (
+        SELECT date, 'E' AS source, id, description, -amount_cents AS amount_cents,
+               'Expense' AS transaction_type, type
+        FROM expenses
+        WHERE user_id = :user_id AND (date, 'E', id) < (:date, :source, :id)
+        ORDER BY date DESC, id DESC
+        LIMIT :limit
+    )
+"""
+
+_DEPOSIT_BRANCH = """
+    SELECT * FROM (
+        SELECT date, 'D' AS source, id, description, amount_cents,
+               'Deposit' AS transaction_type, 'Income' AS type
+        FROM fund_transactions
+        WHERE user_id = :user_id AND (date, 'D', id) < (:date, :source, :id)
+        ORDER BY date DESC, id DESC
+        LIMIT :limit
+    )
+"""
+
+# Goal contributions and balance adjustments only exist as ledger movements
+_MOVEMENT_BRANCH = """
+    SELECT * FROM (
+        SELECT m.date, 'A' AS source, m.id,
+               CASE m.kind
+                   WHEN 'goal_contribution' THEN 'Goal: ' || COALESCE(g.name, 'deleted goal')
+                   ELSE 'Balance adjustment'
+               END AS description,
+               m.amount_cents,
+               CASE m.kind WHEN 'goal_contribution' THEN 'Goal Contribution' ELSE 'Adjustment' END
+                   AS transaction_type,
+               'Savings' AS type
+        FROM money_movements m
+        LEFT JOIN goals g ON g.id = m.ref_id AND m.kind = 'goal_contribution'
+        WHERE m.user_id = :user_id AND m.kind IN ('goal_contribution', 'adjustment')
+          AND (m.date, 'A', m.id) < (:date, :source, :id)
+        ORDER BY m.date DESC, m.id DESC
+        LIMIT :limit
+    )
+"""
+
+# Running balance: the newest row on the page carries the anchor balance and each
+# older row subtracts the movements that came after it.
+_PAGE_QUERY = """
+    WITH movements AS ({branches})
+    SELECT date, source, id, description, amount_cents, transaction_type, type,
+           :anchor - COALESCE(SUM(amount_cents) OVER (
+               ORDER BY date DESC, source DESC, id DESC
+               ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+           ), 0) AS balance_cents
+    FROM movements
+    ORDER BY date DESC, source DESC, id DESC
+    LIMIT :limit
+"""
+
+# Sentinel cursor that sorts after every ISO date string
+_START_CURSOR = ("\uffff", "\uffff", 0)
+
+def get_ledger_page(conn, user_id, opening_balance, cursor=None, page_size=LEDGER_PAGE_SIZE):
+    """
+    Get one page of a user's expenses, deposits and goal contributions, newest first,
+    with a running balance. Amounts and balances are integer cents.
+
+    opening_balance is the balance after the newest movement on the requested page;
+    pass the current balance for the first page. Returns (rows, next_cursor), where
+    next_cursor is None on the last page and otherwise is passed back together with
+    its balance to fetch the following page.
+    """
+    date, source, row_id = cursor["position"] if cursor else _START_CURSOR
+    anchor = cursor["balance"] if cursor else opening_balance
+    params = {
+        "user_id": user_id,
+        "date": date,
+        "source": source,
+        "id": row_id,
+        # One extra row tells us whether another page follows
+        "limit": page_size + 1,
+        "anchor": anchor,
+    }
+    query = _PAGE_QUERY.format(
+        branches=" UNION ALL ".join([_EXPENSE_BRANCH, _DEPOSIT_BRANCH, _MOVEMENT_BRANCH])
+    )
+    db_cursor = conn.cursor()
+    db_cursor.execute(query, params)
+    columns = [desc[0] for desc in db_cursor.description]
+    rows = [dict(zip(columns, row)) for row in db_cursor.fetchall()]
+
+    # Archived expenses (see archive.py) are only needed once the page reaches back past the archive's end
+    cold = archive.open_archive(conn, user_id)
+    if cold is not None and cold["rows"] and not (len(rows) > page_size and rows[page_size]["date"] >= cold["through"]):
+        rows = _merge_archived(rows, cold, (date, source, row_id), page_size + 1)
+        balance = anchor
+        for row in rows:
+            row["balance_cents"] = balance
+            balance -= row["amount_cents"]
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = {
+            "position": (last["date"], last["source"], last["id"]),
+            "balance": last["balance_cents"] - last["amount_cents"],
+        }
+    return rows, next_cursor
+
+def _merge_archived(rows, cold, position, limit):
+    """The newest limit rows of rows and the archived expenses before position, newest first."""
+    micros = np.asarray(cold["micros"])
+    ids = np.asarray(cold["id"])
+    candidates = np.arange(len(micros))
+    if position != _START_CURSOR:
+        date, source, row_id = position
+        cursor_micros = np.datetime64(date, "us").astype(np.int64)
+        # (date, 'E', id) < position, compared on the mapped columns
+        before = micros < cursor_micros
+        if source > "E":
+            before |= micros == cursor_micros
+        elif source == "E":
+            before |= (micros == cursor_micros) & (ids < row_id)
+        candidates = np.flatnonzero(before)
+    newest = candidates[np.lexsort((-ids[candidates], -micros[candidates]))[:limit]]
+    for expense in archive.decode(cold, newest).itertuples(index=False):
+        rows.append({
+            "date": expense.date.isoformat(),
+            "source": "E",
+            "id": int(expense.id),
+            "description": expense.description,
+            "amount_cents": -int(expense.amount_cents),
+            "transaction_type": "Expense",
+            "type": expense.type,
+        })
+    rows.sort(key=lambda row: (row["date"], row["source"], row["id"]), reverse=True)
+    return rows[:limit]
+
+# ------------------------
+# Append-only money movements
+# ------------------------
+
+# Take a fresh per-user snapshot once this many movements pile up after the last one
+SNAPSHOT_INTERVAL = 100
+
+# Balances are integer cents, so any difference at all is a real discrepancy
+DRIFT_TOLERANCE = 0
+
+MOVEMENT_KINDS = ("expense", "deposit", "goal_contribution", "adjustment")
+
+def record_movement(conn, user_id, amount_cents, kind, ref_id=None, date=None, commit=True):
+    """Append a signed money movement in cents for a user. Rows are never updated or deleted."""
+    if kind not in MOVEMENT_KINDS:
+        raise ValueError(f"Unknown movement kind: {kind}")
+    if date is None:
+        date = datetime.now()
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO money_movements (user_id, amount_cents, kind, ref_id, date) VALUES (?, ?, ?, ?, ?)",
+        (user_id, int(amount_cents), kind, ref_id, date.isoformat())
+    )
+    if commit:
+        conn.commit()
+    return cursor.lastrowid
+
+def _snapshot(conn, user_id, balance, last_movement_id):
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT OR REPLACE INTO balance_snapshots (user_id, balance_cents, last_movement_id, date) VALUES (?, ?, ?, ?)",
+        (user_id, balance, last_movement_id, datetime.now().isoformat())
+    )
+
+def _balance(conn, user_id):
+    """(balance, movements since the snapshot, newest movement id) for a user."""
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT balance_cents, last_movement_id FROM balance_snapshots WHERE user_id = ?",
+        (user_id,)
+    )
+    row = cursor.fetchone()
+    base_balance, last_id = (row[0], row[1]) if row else (0, 0)
+
+    cursor.execute('''
+    SELECT COALESCE(SUM(amount_cents), 0), COUNT(*), MAX(id)
+    FROM money_movements
+    WHERE user_id = ? AND id > ?
+    ''', (user_id, last_id))
+    delta, count, max_id = cursor.fetchone()
+    return base_balance + delta, count, max_id
+
+def get_balance(conn, user_id):
+    """Get a user's balance in cents as the latest snapshot plus the movements recorded after it. Read-only."""
+    return _balance(conn, user_id)[0]
+
+def refresh_funds(conn, user_id):
+    """
+    Store the ledger balance in funds.balance_cents without committing. Returns the balance.
+
+    Called inside the writer's transaction, so a snapshot taken here once
+    SNAPSHOT_INTERVAL movements pile up commits together with them.
+    """
+    balance, count, max_id = _balance(conn, user_id)
+    if count >= SNAPSHOT_INTERVAL:
+        _snapshot(conn, user_id, balance, max_id)
+    # funds.balance_cents is kept as a derived copy; reconcile() verifies it
+    conn.execute("UPDATE funds SET balance_cents = ? WHERE user_id = ?", (balance, user_id))
+    return balance
+
+def take_snapshots(conn):
+    """Snapshot every user's balance in one pass. Returns the number of users snapshotted."""
+    cursor = conn.cursor()
+    cursor.execute('''
+    INSERT OR REPLACE INTO balance_snapshots (user_id, balance_cents, last_movement_id, date)
+    SELECT m.user_id,
+           COALESCE(s.balance_cents, 0) + SUM(m.amount_cents),
+           MAX(m.id),
+           ?
+    FROM money_movements m
+    LEFT JOIN balance_snapshots s ON s.user_id = m.user_id
+    WHERE m.id > COALESCE(s.last_movement_id, 0)
+    GROUP BY m.user_id
+    ''', (datetime.now().isoformat(),))
+    conn.commit()
+    return cursor.rowcount
+
+def backfill_movements(conn):
+    """
+    Seed the ledger for users who have a funds row but no movements yet.
+
+    Expenses and deposits are replayed in date order; whatever the stored balance
+    holds beyond them (opening funds, untracked goal contributions) becomes one
+    adjustment.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TEMP TABLE IF NOT EXISTS backfill_users AS
+    SELECT user_id FROM funds
+    WHERE user_id NOT IN (SELECT DISTINCT user_id FROM money_movements)
+    ''')
+    cursor.execute('''
+    INSERT INTO money_movements (user_id, amount_cents, kind, ref_id, date)
+    SELECT user_id, amount_cents, kind, id, date FROM (
+        SELECT user_id, -amount_cents AS amount_cents, 'expense' AS kind, id, date FROM expenses
+        UNION ALL
+        SELECT user_id, amount_cents, 'deposit', id, date FROM fund_transactions
+    )
+    WHERE user_id IN (SELECT user_id FROM backfill_users)
+    ORDER BY date
+    ''')
+    # Dated with the user's oldest movement so it reads as an opening balance
+    cursor.execute('''
+    INSERT INTO money_movements (user_id, amount_cents, kind, ref_id, date)
+    SELECT f.user_id,
+           f.balance_cents - COALESCE(SUM(m.amount_cents), 0),
+           'adjustment', NULL, COALESCE(MIN(m.date), ?)
+    FROM funds f
+    LEFT JOIN money_movements m ON m.user_id = f.user_id
+    WHERE f.user_id IN (SELECT user_id FROM backfill_users)
+    GROUP BY f.user_id, f.balance_cents
+    ''', (datetime.now().isoformat(),))
+    cursor.execute("SELECT COUNT(*) FROM backfill_users")
+    count = cursor.fetchone()[0]
+    cursor.execute("DROP TABLE backfill_users")
+    conn.commit()
+    return count
+
+def reconcile(conn, tolerance=DRIFT_TOLERANCE):
+    """
+    Recompute every user's balance from the full ledger and compare it with the
+    stored funds.balance_cents and with the snapshot-based balance.
+
+    Returns a DataFrame with one row per user, balances in cents and a boolean 'drift' column.
+    """
+    movements = pd.read_sql_query(
+        "SELECT user_id, id, amount_cents AS amount FROM money_movements", conn, dtype={"amount": "int64"}
+    )
+    snapshots = pd.read_sql_query(
+        "SELECT user_id, balance_cents AS snapshot_base, last_movement_id FROM balance_snapshots", conn
+    )
+    stored = pd.read_sql_query("SELECT user_id, balance_cents AS stored_balance FROM funds", conn)
+
+    # Full-history total and post-snapshot delta per user in a single groupby
+    movements = movements.merge(snapshots[["user_id", "last_movement_id"]], on="user_id", how="left")
+    after_snapshot = movements["id"] > movements["last_movement_id"].fillna(0)
+    movements["snapshot_delta"] = movements["amount"].where(after_snapshot, 0)
+    totals = movements.groupby("user_id")[["amount", "snapshot_delta"]].sum()
+    totals = totals.rename(columns={"amount": "ledger_balance"})
+
+    result = stored.set_index("user_id").join(totals, how="outer")
+    result = result.join(snapshots.set_index("user_id")["snapshot_base"])
+    result = result.fillna(0).astype("int64")
+    result["snapshot_balance"] = result["snapshot_base"] + result["snapshot_delta"]
+    result["stored_drift"] = result["stored_balance"] - result["ledger_balance"]
+    result["snapshot_drift"] = result["snapshot_balance"] - result["ledger_balance"]
+    result["drift"] = (
+        (result["stored_drift"].abs() > tolerance) | (result["snapshot_drift"].abs() > tolerance)
+    )
+    return result.drop(columns=["snapshot_base", "snapshot_delta"]).reset_index()
+
+# ------------------------
+# Command line interface
+# ------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the append-only balance ledger.")
+    parser.add_argument("command", choices=["backfill", "snapshot", "reconcile"])
+    parser.add_argument("--db", default=database.get_db_path(), help="SQLite database file")
+    parser.add_argument("--fix", action="store_true", help="Reset drifting funds.balance_cents values to the ledger balance")
+    args = parser.parse_args(argv)
+
+    conn = database.connect(args.db)
+    try:
+        if args.command == "backfill":
+            print(f"Backfilled {backfill_movements(conn)} users")
+        elif args.command == "snapshot":
+            print(f"Snapshotted {take_snapshots(conn)} users")
+        else:
+            report = reconcile(conn)
+            drifting = report[report["drift"]]
+            print(f"{len(report)} users checked, {len(drifting)} drifting")
+            if not drifting.empty:
+                print(drifting.to_string(index=False))
+            if args.fix and not drifting.empty:
+                conn.executemany(
+                    "UPDATE funds SET balance_cents = ? WHERE user_id = ?",
+                    drifting[["ledger_balance", "user_id"]].itertuples(index=False, name=None)
+                )
+                take_snapshots(conn)
+                conn.commit()
+            return 1 if not drifting.empty and not args.fix else 0
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
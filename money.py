@@ -0,0 +1,32 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+# Money is stored, summed and compared as integer cents everywhere. Floats only
+# appear at the edges: number_input widgets going in, chart axes coming out.
+
+CENTS_PER_UNIT = 100
+CURRENCY_SYMBOL = "$"
+
+def to_cents(amount):
+    """Convert a currency amount (float, str, Decimal or int dollars) to integer cents, rounding half up."""
+    if amount is None:
+        return 0
+    # str() first so 0.1 becomes Decimal('0.1') rather than its binary expansion
+    cents = Decimal(str(amount)) * CENTS_PER_UNIT
+    return int(cents.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def to_units(cents):
+    """Convert integer cents to a float amount, for widgets and chart axes only."""
+    return int(cents) / CENTS_PER_UNIT
+
+def format_money(cents, sign=False):
+    """Format integer cents for display, e.g. 123456 -> '$1,234.56'."""
+    cents = int(cents)
+    units, remainder = divmod(abs(cents), CENTS_PER_UNIT)
+    prefix = "-" if cents < 0 else ("+" if sign and cents > 0 else "")
+    return f"{prefix}{CURRENCY_SYMBOL}{units:,}.{remainder:02d}"
+
+def cents_column(df, column="amount_cents"):
+    """Add a float display column next to an int64 cents column, named without the suffix."""
+    display_column = column[:-len("_cents")] if column.endswith("_cents") else f"{column}_units"
+    df[display_column] = df[column] / CENTS_PER_UNIT
+    return df
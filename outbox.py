@@ -0,0 +1,143 @@
+import json
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+import database
+import recurring
+import storage
+
+# Gamification side effects (FinPet XP, rewards, savings milestone checks) and
+# recurring-expense scans are written to a durable outbox in the same commit
+# as the money movement and applied later by a background worker, off the
+# page render path. Delivery is at-least-once, but a batch's effects commit
+# together with the deletion of its events, so none is applied twice.
+
+OUTBOX_BATCH_SIZE = 200
+
+# Seconds the worker sleeps when the outbox is empty and nobody calls notify()
+POLL_INTERVAL = 5.0
+
+EVENT_KINDS = ("xp", "reward", "savings_check", "recurring_scan")
+
+logger = logging.getLogger(__name__)
+
+_wakeup = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+def enqueue(conn, user_id, kind, payload=None, commit=False):
+    """Queue a side effect. By default it commits with the caller's transaction."""
+    if kind not in EVENT_KINDS:
+        raise ValueError(f"Unknown outbox event kind: {kind}")
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO outbox (user_id, kind, payload, created_at) VALUES (?, ?, ?, ?)",
+        (user_id, kind, json.dumps(payload or {}), datetime.now().isoformat())
+    )
+    if commit:
+        conn.commit()
+        notify()
+    return cursor.lastrowid
+
+def enqueue_xp(conn, user_id, xp_amount, commit=False):
+    """Queue a FinPet XP grant."""
+    return enqueue(conn, user_id, "xp", {"xp": int(xp_amount)}, commit)
+
+def enqueue_reward(conn, user_id, reward_name, description, icon="🎁", commit=False):
+    """Queue a FinPet reward."""
+    payload = {"name": reward_name, "description": description, "icon": icon}
+    return enqueue(conn, user_id, "reward", payload, commit)
+
+def enqueue_savings_check(conn, user_id, commit=False):
+    """Queue a check of the savings milestones against the user's balance high-water mark."""
+    return enqueue(conn, user_id, "savings_check", None, commit)
+
+def enqueue_recurring_scan(conn, user_id, commit=False):
+    """Queue a recurring-expense scan of the user's new expenses (see recurring.detect)."""
+    return enqueue(conn, user_id, "recurring_scan", None, commit)
+
+@storage.serialized_write
+def process_batch(conn, batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Apply one batch of queued side effects and delete them from the outbox.
+
+    XP events are coalesced into a single grant per user, savings checks into
+    a single check per user and recurring scans into one detect call. The
+    grants and rewards are written without committing, so they commit with
+    the deletion; conn must be this thread's database.get_db() connection,
+    which the utils helpers write through. Returns the number of events consumed.
+    """
+    import utils
+
+    cursor = conn.cursor()
+    cursor.execute('''
+    SELECT o.id, o.user_id, u.username, o.kind, o.payload
+    FROM outbox o
+    JOIN users u ON u.id = o.user_id
+    ORDER BY o.id
+    LIMIT ?
+    ''', (batch_size,))
+    events = cursor.fetchall()
+    if not events:
+        return 0
+
+    # Detection commits on its own and is idempotent (see recurring.detect), so it goes first
+    recurring_scans = {user_id for _, user_id, _, kind, _ in events if kind == "recurring_scan"}
+    if recurring_scans:
+        recurring.detect(conn, sorted(recurring_scans))
+
+    xp_totals = defaultdict(int)
+    savings_checks = set()
+    for _, user_id, username, kind, payload in events:
+        data = json.loads(payload)
+        if kind == "xp":
+            xp_totals[username] += data.get("xp", 0)
+        elif kind == "reward":
+            utils.add_finpet_reward(username, data["name"], data["description"], data.get("icon", "🎁"), commit=False)
+        elif kind == "savings_check":
+            savings_checks.add(username)
+
+    utils.add_finpet_xp_batch(((username, xp) for username, xp in xp_totals.items() if xp > 0), commit=False)
+    for username in savings_checks:
+        utils.check_milestone_rewards(username, ("balance_high_water_cents",), commit=False)
+
+    cursor.execute("DELETE FROM outbox WHERE id <= ?", (events[-1][0],))
+    conn.commit()
+    return len(events)
+
+def drain(conn, batch_size=OUTBOX_BATCH_SIZE):
+    """Process the outbox until it is empty. Returns the number of events consumed."""
+    total = 0
+    while True:
+        count = process_batch(conn, batch_size)
+        if count == 0:
+            return total
+        total += count
+
+def notify():
+    """Wake the worker (starting it if needed) so committed events are applied promptly."""
+    start_worker()
+    _wakeup.set()
+
+def _run_worker():
+    conn = database.get_db()
+    while True:
+        _wakeup.wait(POLL_INTERVAL)
+        _wakeup.clear()
+        try:
+            drain(conn)
+        except Exception:
+            # Events stay queued and are retried on the next wakeup
+            conn.rollback()
+            logger.exception("Outbox worker error")
+
+def start_worker():
+    """Start the process-wide outbox worker thread if it isn't running yet."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run_worker, name="outbox-worker", daemon=True)
+            _worker.start()
+    return _worker
@@ -3,8 +3,8 @@ import pandas as pd
 from datetime import datetime, timedelta
 import altair as alt
 import matplotlib.pyplot as plt
+import money
 import utils
-from database import get_db
 
 st.set_page_config(page_title="Home Dashboard", page_icon="🏠", layout="wide")
 
@@ -13,24 +13,48 @@ if not st.session_state.get("logged_in", False):
     st.warning("Please login to access this page.")
     st.switch_page("app.py")
 
+def use_quick_add_suggestion():
+    """Fill the quick add form from the picked suggestion."""
+    picked = st.session_state.quick_add_suggestion
+    if picked is None:
+        return
+    suggestion = st.session_state.quick_add_suggestions[picked]
+    st.session_state.quick_add_description = suggestion["description"]
+    st.session_state.quick_add_amount = money.to_units(suggestion["amount_cents"])
+    st.session_state.quick_add_suggestion = None
+
+def add_quick_expense(pending, allow_duplicate=False):
+    """Add a quick add expense, holding it for confirmation if it repeats one added moments ago."""
+    expense = utils.add_expense(
+        st.session_state.username, pending["description"], pending["amount_cents"],
+        category=pending["category"], expense_type=pending["type"], allow_duplicate=allow_duplicate
+    )
+    if expense["duplicate"]:
+        st.session_state.quick_add_duplicate = pending
+    st.rerun()
+
 # Title and user greeting
 st.title("🏠 Financial Dashboard")
 st.subheader(f"Welcome back, {st.session_state.username}!")
 
+# Enter recurring expenses that came due since the last visit
+for created in utils.create_due_recurring_expenses(st.session_state.username):
+    st.toast(f"🔁 Added {created['description']} ({money.format_money(created['amount_cents'])}) for {created['date']:%B %d}")
+
 # Display current balance and Zen mode status
 col1, col2, col3 = st.columns(3)
 with col1:
     current_balance = utils.get_current_balance()
     st.metric(
         label="Current Balance", 
-        value=f"${current_balance:.2f}"
+        value=money.format_money(current_balance)
     )
 
 with col2:
     weekly_expenses = utils.get_weekly_expenses()
     st.metric(
         label="This Week's Expenses", 
-        value=f"${weekly_expenses:.2f}",
+        value=money.format_money(weekly_expenses),
         delta=f"{utils.get_expense_trend():.1f}%"
     )
 
@@ -78,30 +102,162 @@ with col1:
         else:
             st.altair_chart(chart, use_container_width=True)
 
+    # Category envelopes, all evaluated in one query (see budgets.py)
+    st.subheader("✉️ Envelopes")
+    envelopes = utils.get_envelopes(st.session_state.username)
+    
+    if envelopes.empty:
+        st.info("No envelopes yet. Give a category its own budget below.")
+    else:
+        status_icons = {"ok": "🟢", "warning": "🟡", "over": "🔴"}
+        envelope_table = pd.DataFrame({
+            "": envelopes["status"].map(status_icons),
+            "Envelope": envelopes["name"],
+            "Period": envelopes["period"].str.title(),
+            "Available": envelopes["available_cents"].map(money.format_money),
+            "Spent": envelopes["spent_cents"].map(money.format_money),
+            "Remaining": envelopes["remaining_cents"].map(money.format_money),
+            "Used": envelopes["used"].clip(upper=1.0),
+        })
+        st.dataframe(
+            envelope_table,
+            hide_index=True,
+            use_container_width=True,
+            column_config={"Used": st.column_config.ProgressColumn("Used", min_value=0.0, max_value=1.0, format="percent")},
+        )
+        over = envelopes[envelopes["status"] == "over"]
+        for _, envelope in over.iterrows():
+            st.error(f"{envelope['name']} is over by {money.format_money(-envelope['remaining_cents'])} this {envelope['period']}")
+    
+    with st.expander("Manage Envelopes"):
+        with st.form("add_envelope_form"):
+            used_categories = set(envelopes["category"]) if not envelopes.empty else set()
+            envelope_category = st.selectbox(
+                "Category", [c for c in utils.EXPENSE_CATEGORIES if c not in used_categories]
+            )
+            envelope_limit = st.number_input("Budget per Period ($)", min_value=0.0, value=100.0, step=10.0)
+            envelope_period = st.radio("Period", ["month", "week"], format_func=str.title, horizontal=True)
+            envelope_rollover = st.checkbox("Roll unspent money (or overspending) into the next period", value=True)
+            if st.form_submit_button("Add Envelope") and envelope_category:
+                if utils.add_envelope(st.session_state.username, envelope_category, money.to_cents(envelope_limit), envelope_period, envelope_rollover):
+                    st.success(f"Created the {envelope_category} envelope")
+                    st.rerun()
+                else:
+                    st.error(f"{envelope_category} already has an envelope.")
+        
+        if not envelopes.empty:
+            with st.form("edit_envelope_form"):
+                envelope_id = st.selectbox(
+                    "Envelope", envelopes["id"].tolist(),
+                    format_func=dict(zip(envelopes["id"], envelopes["name"])).get
+                )
+                new_limit = st.number_input("New Budget per Period ($)", min_value=0.0, value=100.0, step=10.0)
+                update_col, delete_col = st.columns(2)
+                with update_col:
+                    update_envelope = st.form_submit_button("Update Budget")
+                with delete_col:
+                    delete_envelope = st.form_submit_button("Delete Envelope")
+                if update_envelope:
+                    utils.update_envelope_limit(st.session_state.username, envelope_id, money.to_cents(new_limit))
+                    st.rerun()
+                if delete_envelope:
+                    utils.delete_envelope(st.session_state.username, envelope_id)
+                    st.rerun()
+
+    # Recurring expenses detected from the expense history (see recurring.py)
+    st.subheader("🔁 Recurring Expenses")
+    series = utils.get_recurring_expenses(st.session_state.username)
+    
+    if series.empty:
+        st.info("No recurring expenses found yet. Bills and subscriptions show up here after a few regular payments.")
+    else:
+        _, forecast_totals = utils.get_recurring_forecast(st.session_state.username)
+        forecast_col1, forecast_col2 = st.columns(2)
+        with forecast_col1:
+            st.metric("Recurring Needs Next Month", money.format_money(forecast_totals.get("Needs", 0)))
+        with forecast_col2:
+            st.metric("Recurring Wants Next Month", money.format_money(forecast_totals.get("Wants", 0)))
+        
+        recurring_table = pd.DataFrame({
+            "Expense": series["description"],
+            "Every": series["period"].str.title(),
+            "Amount": series["amount_cents"].map(money.format_money),
+            "Next": series["next_date"].map(lambda d: f"{d:%b %d, %Y}"),
+            "Auto-Add": series["auto_create"],
+            "": series["lapsed"].map({True: "Lapsed?", False: ""}),
+        })
+        st.dataframe(recurring_table, hide_index=True, use_container_width=True)
+        
+        with st.form("recurring_auto_create_form"):
+            auto_ids = st.multiselect(
+                "Add these automatically when they're due",
+                series["id"].tolist(),
+                default=series.loc[series["auto_create"], "id"].tolist(),
+                format_func=dict(zip(series["id"], series["description"])).get
+            )
+            if st.form_submit_button("Save"):
+                for series_id, enabled in zip(series["id"], series["auto_create"]):
+                    if (series_id in auto_ids) != enabled:
+                        utils.set_recurring_auto_create(st.session_state.username, int(series_id), series_id in auto_ids)
+                st.rerun()
+
 with col2:
     # Quick add expense
     st.subheader("➕ Quick Add")
+    # Outside the form so suggestions update as the description is typed
+    description = st.text_input("Description", key="quick_add_description")
+    st.session_state.quick_add_suggestions = [
+        suggestion for suggestion in utils.suggest_descriptions(st.session_state.username, description)
+        if suggestion["description"] != description.strip()
+    ]
+    if st.session_state.quick_add_suggestions:
+        st.pills(
+            "Suggestions",
+            range(len(st.session_state.quick_add_suggestions)),
+            format_func=lambda i: st.session_state.quick_add_suggestions[i]["description"],
+            key="quick_add_suggestion",
+            on_change=use_quick_add_suggestion,
+            label_visibility="collapsed"
+        )
     with st.form("quick_add_form"):
-        description = st.text_input("Description")
-        amount = st.number_input("Amount ($)", min_value=0.01, step=0.01)
+        amount = st.number_input("Amount ($)", min_value=0.01, step=0.01, key="quick_add_amount")
         add_button = st.form_submit_button("Add Expense")
         
         if add_button and description and amount > 0:
-            # Predict type and category
-            expense_type = utils.predict_expense_type(description)
-            category = utils.predict_expense_category(description)
+            # Known descriptions reuse their last category and type; new ones are predicted
+            category, expense_type = utils.classify_expense(st.session_state.username, description)
+            submitted = {"description": description, "amount_cents": money.to_cents(amount), "category": category, "type": expense_type}
             
-            # Check Zen mode for wants
+            # Check Zen mode for wants; buttons can't live in a form, so it's confirmed below
             if st.session_state.zen_mode and expense_type == "Wants":
-                st.warning("⚠️ Zen Mode is active. Are you sure you want to add this non-essential expense?")
-                confirm = st.button("Confirm Expense")
-                if confirm:
-                    utils.add_expense(st.session_state.username, description, amount)
-                    st.success(f"Added: {description} (${amount:.2f}) - {category} ({expense_type})")
-                    st.rerun()
+                st.session_state.quick_add_pending = submitted
+                st.rerun()
             else:
-                utils.add_expense(st.session_state.username, description, amount)
-                st.success(f"Added: {description} (${amount:.2f}) - {category} ({expense_type})")
+                add_quick_expense(submitted)
+    
+    if "quick_add_pending" in st.session_state:
+        pending = st.session_state.quick_add_pending
+        st.warning(f"⚠️ Zen Mode is active. Are you sure you want to add {pending['description']} "
+                   f"({money.format_money(pending['amount_cents'])}), a non-essential expense?")
+        confirm_col, cancel_col = st.columns(2)
+        with confirm_col:
+            if st.button("Confirm Expense"):
+                add_quick_expense(st.session_state.pop("quick_add_pending"))
+        with cancel_col:
+            if st.button("Cancel", key="quick_add_cancel"):
+                del st.session_state.quick_add_pending
+                st.rerun()
+    
+    if "quick_add_duplicate" in st.session_state:
+        duplicate = st.session_state.quick_add_duplicate
+        st.info(f"{duplicate['description']} was already added a moment ago, so it wasn't added again.")
+        add_anyway_col, dismiss_col = st.columns(2)
+        with add_anyway_col:
+            if st.button("Add anyway", key="quick_add_anyway"):
+                add_quick_expense(st.session_state.pop("quick_add_duplicate"), allow_duplicate=True)
+        with dismiss_col:
+            if st.button("Don't add it", key="quick_add_dismiss"):
+                del st.session_state.quick_add_duplicate
                 st.rerun()
     
     # Savings advice
@@ -113,15 +269,17 @@ with col2:
     # Goals progress
     st.subheader("🎯 Goals Progress")
     goals = utils.get_user_goals(st.session_state.username)
+    projections = utils.get_goal_projections(st.session_state.username)
     
     if not goals:
         st.info("You don't have any savings goals yet. Create one in the Funds & Goals section!")
     else:
         for goal in goals[:3]:  # Show top 3 goals
-            progress = goal["current_amount"] / goal["target_amount"] * 100
+            progress = goal["current_cents"] / goal["target_cents"] * 100
             st.write(f"**{goal['name']}**")
             st.progress(min(progress/100, 1.0))
-            st.write(f"${goal['current_amount']:.2f} / ${goal['target_amount']:.2f} ({progress:.1f}%)")
+            st.write(f"{money.format_money(goal['current_cents'])} / {money.format_money(goal['target_cents'])} ({progress:.1f}%)")
+            st.caption(utils.format_goal_projection(projections.get(goal["id"])))
         
         if len(goals) > 3:
             st.write(f"... and {len(goals) - 3} more goals")
@@ -136,26 +294,13 @@ with col2:
     st.write(f"XP: {finpet['xp']}/{finpet['next_level_xp']}")
     
     # Display FinPet rewards count
-    rewards = []
-    if 'rewards' in finpet:
-        if isinstance(finpet['rewards'], list):
-            rewards = finpet['rewards']
-        elif isinstance(finpet['rewards'], str):
-            try:
-                import json
-                rewards = json.loads(finpet['rewards'])
-            except:
-                rewards = []
-    
-    st.write(f"**Rewards:** {len(rewards)} collected")
+    st.write(f"**Rewards:** {utils.get_reward_count(st.session_state.username)} collected")
     
     # Display a recent reward if available
-    if rewards:
-        recent_reward = rewards[-1] if isinstance(rewards, list) else None
-        if isinstance(recent_reward, dict):
-            icon = recent_reward.get('icon', '🎁')
-            name = recent_reward.get('name', 'Reward')
-            st.success(f"Most recent: {icon} {name}")
+    recent_rewards = utils.get_finpet_rewards(st.session_state.username, limit=1)
+    if recent_rewards:
+        recent_reward = recent_rewards[0]
+        st.success(f"Most recent: {recent_reward['icon'] or '🎁'} {recent_reward['name']}")
     
     # Enhanced description
     with st.expander("About FinPet"):
@@ -1,9 +1,9 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
+import budgets
+import money
 import utils
-from ml_models import predict_expense_type, predict_expense_category
-from database import get_db
 
 st.set_page_config(page_title="Add Expense", page_icon="➕", layout="wide")
 
@@ -16,25 +16,94 @@ if not st.session_state.get("logged_in", False):
 st.title("➕ Add Expense")
 st.write("Track your spending by adding expenses below.")
 
+# Flag for the expense just added, scored against this user's category history
+unusual_expense = st.session_state.pop("unusual_expense", None)
+if unusual_expense:
+    st.warning(f"🔍 Unusual expense: {unusual_expense}")
+
+def add_submitted_expense(pending, allow_duplicate=False):
+    """Add a submitted expense, holding it for confirmation if it repeats one added moments ago."""
+    expense = utils.add_expense(
+        st.session_state.username,
+        pending["description"],
+        pending["amount_cents"],
+        pending["date"],
+        pending["category"],
+        pending["type"],
+        allow_duplicate=allow_duplicate
+    )
+    if expense["duplicate"]:
+        st.session_state.duplicate_expense = pending
+    else:
+        # Shown after the rerun
+        st.session_state.unusual_expense = utils.describe_anomaly(expense["anomaly"])
+    st.rerun()
+
+# Set when a rerun or double-click resubmitted an expense that was already added
+duplicate_expense = st.session_state.get("duplicate_expense")
+if duplicate_expense:
+    st.warning(
+        f"⏭️ {duplicate_expense['description']} ({money.format_money(duplicate_expense['amount_cents'])}) "
+        "was already added a moment ago, so it wasn't added again."
+    )
+    add_anyway_col, dismiss_col, _ = st.columns([1, 1, 2])
+    with add_anyway_col:
+        if st.button("Add anyway"):
+            del st.session_state.duplicate_expense
+            add_submitted_expense(duplicate_expense, allow_duplicate=True)
+    with dismiss_col:
+        if st.button("Don't add it"):
+            del st.session_state.duplicate_expense
+            st.rerun()
+
+def use_suggestion():
+    """Fill the form from the picked suggestion."""
+    picked = st.session_state.description_suggestion
+    if picked is None:
+        return
+    suggestion = st.session_state.suggestions[picked]
+    st.session_state.expense_description = suggestion["description"]
+    st.session_state.expense_amount = money.to_units(suggestion["amount_cents"])
+    st.session_state.description_suggestion = None
+
+def classify_description(description, category, expense_type):
+    """Manual choices win; the rest comes from the user's history or the ML models."""
+    if category is not None and expense_type is not None:
+        return category, expense_type
+    known_category, known_type = utils.classify_expense(st.session_state.username, description)
+    return category or known_category, expense_type or known_type
+
 # Main form
 col1, col2 = st.columns([2, 1])
 
 with col1:
+    # Outside the form so suggestions update as the description is typed
+    description = st.text_input("Description", placeholder="E.g., Grocery shopping at Walmart", key="expense_description")
+    st.session_state.suggestions = [
+        suggestion for suggestion in utils.suggest_descriptions(st.session_state.username, description)
+        if suggestion["description"] != description.strip()
+    ]
+    if st.session_state.suggestions:
+        st.pills(
+            "Suggestions",
+            range(len(st.session_state.suggestions)),
+            format_func=lambda i: st.session_state.suggestions[i]["description"],
+            key="description_suggestion",
+            on_change=use_suggestion,
+            label_visibility="collapsed"
+        )
+    
+    st.session_state.setdefault("expense_amount", 10.0)
     with st.form("add_expense_form"):
-        description = st.text_input("Description", placeholder="E.g., Grocery shopping at Walmart")
-        amount = st.number_input("Amount ($)", min_value=0.01, value=10.0, step=0.01)
+        amount = st.number_input("Amount ($)", min_value=0.01, step=0.01, key="expense_amount")
         date = st.date_input("Date", value=datetime.now())
         
         # Optional fields - will be predicted if left empty
         st.markdown("### Advanced (Optional)")
-        st.info("Category and expense type will be automatically predicted if left empty.")
+        st.info("Category and expense type will be automatically predicted if left empty, or taken from the last time you entered the same description.")
         
         with st.expander("Manual classification"):
-            categories = ["Food", "Utilities", "Housing", "Transport", 
-                          "Shopping", "Electronics", "Education", "Entertainment", 
-                          "Health", "Personal Care", "Fitness", "Gifts", "Charity", "Other"]
-            
-            category = st.selectbox("Category", ["Auto-detect"] + categories)
+            category = st.selectbox("Category", ["Auto-detect"] + utils.EXPENSE_CATEGORIES)
             expense_type = st.selectbox("Type", ["Auto-detect", "Needs", "Wants"])
             
             # Convert "Auto-detect" to None for processing
@@ -46,36 +115,25 @@ with col1:
         if submit_button:
             if description and amount > 0:
                 # Before adding expense, analyze if it's a "want" and Zen mode is active
-                predicted_type = predict_expense_type(description) if expense_type is None else expense_type
-                predicted_category = predict_expense_category(description) if category is None else category
+                predicted_category, predicted_type = classify_description(description, category, expense_type)
                 
                 # Check if we need to warn about Zen mode
                 needs_zen_confirmation = (st.session_state.zen_mode and predicted_type == "Wants")
                 
+                submitted = {
+                    "description": description,
+                    "amount_cents": money.to_cents(amount),
+                    "date": datetime.combine(date, datetime.now().time()),
+                    "category": predicted_category,
+                    "type": predicted_type
+                }
                 if needs_zen_confirmation:
                     # We'll handle the confirmation outside the form
-                    st.session_state.pending_expense = {
-                        "description": description,
-                        "amount": amount,
-                        "date": datetime.combine(date, datetime.now().time()),
-                        "category": predicted_category,
-                        "type": predicted_type
-                    }
+                    st.session_state.pending_expense = submitted
                     st.rerun()  # Force rerun to show confirmation dialog
                 else:
-                    # Add expense directly
-                    utils.add_expense(
-                        st.session_state.username,
-                        description,
-                        amount,
-                        datetime.combine(date, datetime.now().time()),
-                        predicted_category,
-                        predicted_type
-                    )
-                    st.success(f"Added expense: {description} (${amount:.2f}) - {predicted_category} ({predicted_type})")
-                    
-                    # Clear form by rerunning
-                    st.rerun()
+                    # Add expense directly; the rerun clears the form
+                    add_submitted_expense(submitted)
             else:
                 st.error("Please enter a description and a valid amount.")
 
@@ -87,29 +145,24 @@ if "pending_expense" in st.session_state:
         You're about to add a **'Want'** expense while Zen Mode is active:
         
         **Description:** {st.session_state.pending_expense['description']}  
-        **Amount:** ${st.session_state.pending_expense['amount']:.2f}  
+        **Amount:** {money.format_money(st.session_state.pending_expense['amount_cents'])}  
         **Category:** {st.session_state.pending_expense['category']}
         
         Zen Mode encourages mindful spending by adding a reflection step before non-essential purchases.
         """)
+        pending_anomaly = utils.describe_anomaly(utils.score_expense(
+            st.session_state.username,
+            st.session_state.pending_expense['category'],
+            st.session_state.pending_expense['amount_cents']
+        ))
+        if pending_anomaly:
+            st.info(f"🔍 {pending_anomaly}")
         
         col1, col2, col3 = st.columns([1, 1, 1])
         with col1:
             if st.button("👍 Still want to add it"):
-                # Add the expense
-                utils.add_expense(
-                    st.session_state.username,
-                    st.session_state.pending_expense['description'],
-                    st.session_state.pending_expense['amount'],
-                    st.session_state.pending_expense['date'],
-                    st.session_state.pending_expense['category'],
-                    st.session_state.pending_expense['type']
-                )
-                st.success(f"Added expense: {st.session_state.pending_expense['description']}")
-                
-                # Clear pending expense
-                del st.session_state.pending_expense
-                st.rerun()
+                # Clear pending expense, then add it
+                add_submitted_expense(st.session_state.pop("pending_expense"))
         
         with col2:
             if st.button("🧠 Let me reconsider"):
@@ -118,12 +171,15 @@ if "pending_expense" in st.session_state:
                 st.rerun()
 
 with col2:
+    # Current 'wants' budget period, one counter lookup
+    wants_budget = utils.get_wants_budget_status(st.session_state.username)
+    period_label = budgets.PERIOD_LABELS[wants_budget["period"]]
+    
     # Real-time prediction
     st.subheader("📊 Expense Analysis")
     
     if description:
-        predicted_type = predict_expense_type(description) if expense_type is None else expense_type
-        predicted_category = predict_expense_category(description) if category is None else category
+        predicted_category, predicted_type = classify_description(description, category, expense_type)
         
         st.write("Based on your description, this expense appears to be:")
         
@@ -138,19 +194,17 @@ with col2:
         
         # Budget check
         if predicted_type == "Wants":
-            weekly_wants_budget = utils.get_weekly_wants_budget(st.session_state.username)
-            current_wants_spending = utils.get_weekly_wants_spending(st.session_state.username)
-            
-            remaining_budget = weekly_wants_budget - current_wants_spending
-            if amount > remaining_budget:
-                st.error(f"⚠️ Warning: This expense will exceed your weekly 'wants' budget by ${amount - remaining_budget:.2f}")
+            remaining_budget = wants_budget["remaining_cents"]
+            amount_cents = money.to_cents(amount)
+            if amount_cents > remaining_budget:
+                st.error(f"⚠️ Warning: This expense will exceed your {period_label} 'wants' budget by {money.format_money(amount_cents - remaining_budget)}")
             else:
-                st.success(f"Within budget: ${remaining_budget:.2f} remaining for 'wants' this week")
+                st.success(f"Within budget: {money.format_money(remaining_budget)} remaining for 'wants' this {wants_budget['period']}")
     
     # Budget summary
-    st.subheader("💰 Weekly Budget")
-    weekly_wants_budget = utils.get_weekly_wants_budget(st.session_state.username)
-    current_wants_spending = utils.get_weekly_wants_spending(st.session_state.username)
+    st.subheader(f"💰 {period_label.title()} Budget")
+    weekly_wants_budget = wants_budget["limit_cents"]
+    current_wants_spending = wants_budget["spent_cents"]
     
     # Calculate percentage
     if weekly_wants_budget > 0:
@@ -158,22 +212,23 @@ with col2:
     else:
         percentage = 0
     
-    st.write(f"Weekly 'Wants' Budget: **${weekly_wants_budget:.2f}**")
-    st.write(f"Current Spending: **${current_wants_spending:.2f}** ({percentage:.1f}%)")
+    st.write(f"{period_label.title()} 'Wants' Budget: **{money.format_money(weekly_wants_budget)}**")
+    st.write(f"Current Spending: **{money.format_money(current_wants_spending)}** ({percentage:.1f}%)")
     st.progress(percentage / 100)
     
     # Recent expenses
     st.subheader("📝 Recent Expenses")
-    expenses = utils.get_user_expenses(st.session_state.username)
+    expenses = utils.get_recent_expenses(st.session_state.username, 5)
     
     if expenses:
         # Convert to DataFrame and format
-        df = pd.DataFrame(expenses[-5:])  # Last 5 expenses
+        df = pd.DataFrame(expenses)
         df = df.sort_values(by="date", ascending=False)
         
         # Format for display
         if not df.empty and 'date' in df.columns:
             df['date'] = pd.to_datetime(df['date']).dt.strftime('%m/%d/%Y')
+            df['amount'] = df['amount_cents'].map(money.format_money)
             
             # Display columns we want to show
             display_columns = ['description', 'amount', 'date', 'category', 'type']
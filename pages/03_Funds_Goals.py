@@ -1,8 +1,10 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
+import money
 import utils
-from database import get_db
+import ledger
+import allocation
 
 st.set_page_config(page_title="Funds & Goals", page_icon="💰", layout="wide")
 
@@ -24,7 +26,7 @@ with col1:
     current_balance = utils.get_current_balance()
     st.metric(
         label="Current Balance",
-        value=f"${current_balance:.2f}"
+        value=money.format_money(current_balance)
     )
     
     # Add funds form
@@ -37,12 +39,16 @@ with col1:
             
             if submit_button:
                 if amount > 0:
-                    utils.add_funds(
+                    fund_entry = utils.add_funds(
                         st.session_state.username,
-                        amount,
+                        money.to_cents(amount),
                         description if description else "Deposit"
                     )
-                    st.success(f"Added ${amount:.2f} to your balance!")
+                    st.success(f"Added {money.format_money(money.to_cents(amount))} to your balance!")
+                    allocated = sum(cents for _, cents, _ in fund_entry.get("allocations", []))
+                    if allocated:
+                        st.info(f"{money.format_money(allocated)} was allocated to your savings goals.")
+                    st.session_state.ledger_cursors = [None]
                     st.rerun()
                 else:
                     st.error("Please enter a valid amount.")
@@ -50,43 +56,37 @@ with col1:
     # Recent transactions
     st.subheader("Recent Transactions")
     
-    db = get_db()
-    # Get both expenses and fund additions
-    expenses = list(db.expenses.find({"username": st.session_state.username}))
+    # One page of the combined expense/deposit ledger, newest first
+    conn = utils.get_db()
     
-    # Get fund transactions if the table exists
-    try:
-        deposits = list(db.fund_transactions.find({"username": st.session_state.username}))
-    except:
-        deposits = []
+    # Stack of cursors for the pages already visited (None is the first page)
+    if "ledger_cursors" not in st.session_state:
+        st.session_state.ledger_cursors = [None]
+    page_cursor = st.session_state.ledger_cursors[-1]
     
-    # Add transaction type
-    for expense in expenses:
-        expense["transaction_type"] = "Expense"
-        expense["amount"] = -expense["amount"]  # Negate amount for expenses
-    
-    for deposit in deposits:
-        deposit["transaction_type"] = "Deposit"
-        deposit["type"] = "Income"  # Add type to match expense schema
-    
-    # Combine and sort
-    transactions = expenses + deposits
-    transactions.sort(key=lambda x: x["date"], reverse=True)
+    transactions, next_cursor = ledger.get_ledger_page(
+        conn,
+        utils.get_user_id(st.session_state.username),
+        current_balance,
+        page_cursor
+    )
     
     if transactions:
         # Convert to DataFrame
-        df = pd.DataFrame(transactions[:10])  # Show top 10 recent transactions
+        df = pd.DataFrame(transactions)
         
         # Format date
         if 'date' in df.columns:
             df['date'] = pd.to_datetime(df['date']).dt.strftime('%m/%d/%Y %I:%M %p')
         
         # Format for display
-        display_df = df[['description', 'amount', 'date', 'transaction_type']].copy()
+        df['amount'] = df['amount_cents'].map(lambda cents: money.format_money(cents, sign=True))
+        df['balance'] = df['balance_cents'].map(money.format_money)
+        display_df = df[['description', 'amount', 'balance', 'date', 'transaction_type']].copy()
         
         # Colorize the amounts based on transaction type
         def highlight_transactions(val):
-            if val < 0:
+            if val.startswith('-'):
                 return 'color: red'
             else:
                 return 'color: green'
@@ -95,6 +95,17 @@ with col1:
             display_df.style.applymap(highlight_transactions, subset=['amount']),
             use_container_width=True
         )
+        
+        # Pagination controls
+        newer_col, older_col = st.columns(2)
+        with newer_col:
+            if len(st.session_state.ledger_cursors) > 1 and st.button("← Newer", key="ledger_newer"):
+                st.session_state.ledger_cursors.pop()
+                st.rerun()
+        with older_col:
+            if next_cursor is not None and st.button("Older →", key="ledger_older"):
+                st.session_state.ledger_cursors.append(next_cursor)
+                st.rerun()
     else:
         st.info("No transactions recorded yet.")
 
@@ -115,37 +126,57 @@ with col2:
                     utils.add_goal(
                         st.session_state.username,
                         goal_name,
-                        target_amount,
-                        initial_amount
+                        money.to_cents(target_amount),
+                        money.to_cents(initial_amount)
                     )
                     st.success(f"Created new goal: {goal_name}")
                     st.rerun()
                 else:
                     st.error("Please enter a goal name and a valid target amount.")
     
+    # Automatic allocation of new deposits
+    with st.expander("Automatic Allocation"):
+        rule = utils.get_allocation_rule(st.session_state.username)
+        with st.form("allocation_rule_form"):
+            allocation_enabled = st.checkbox("Split new deposits across my goals automatically", value=rule["enabled"])
+            allocation_strategy = st.radio(
+                "How to split",
+                allocation.STRATEGIES,
+                index=allocation.STRATEGIES.index(rule["strategy"]),
+                format_func=allocation.STRATEGY_LABELS.get
+            )
+            allocation_pct = st.slider("Share of each deposit to allocate (%)", 0, 100, rule["deposit_pct"])
+            st.caption("Set each goal's priority, percentage or deadline in the goal below.")
+            if st.form_submit_button("Save Allocation Rule"):
+                utils.update_allocation_rule(st.session_state.username, allocation_strategy, allocation_pct, allocation_enabled)
+                st.success("Allocation rule saved")
+                st.rerun()
+    
     # List existing goals
     goals = utils.get_user_goals(st.session_state.username)
+    projections = utils.get_goal_projections(st.session_state.username)
     
     if not goals:
         st.info("You don't have any savings goals yet. Create one above!")
     else:
         for i, goal in enumerate(goals):
             # Create an expander for each goal
-            with st.expander(f"{goal['name']} - ${goal['target_amount']:.2f}", expanded=i == 0):
+            with st.expander(f"{goal['name']} - {money.format_money(goal['target_cents'])}", expanded=i == 0):
                 # Calculate progress
-                progress = goal["current_amount"] / goal["target_amount"] * 100
+                progress = goal["current_cents"] / goal["target_cents"] * 100
                 
                 # Progress bar
                 st.progress(min(progress/100, 1.0))
-                st.write(f"${goal['current_amount']:.2f} / ${goal['target_amount']:.2f} ({progress:.1f}%)")
+                st.write(f"{money.format_money(goal['current_cents'])} / {money.format_money(goal['target_cents'])} ({progress:.1f}%)")
                 
                 # Calculate remaining amount
-                remaining = goal["target_amount"] - goal["current_amount"]
+                remaining = goal["target_cents"] - goal["current_cents"]
                 
                 if goal["completed"]:
                     st.success("✅ Goal Completed!")
                 else:
-                    st.write(f"Remaining: ${remaining:.2f}")
+                    st.write(f"Remaining: {money.format_money(remaining)}")
+                    st.caption(utils.format_goal_projection(projections.get(goal["id"])))
                 
                 # Add funds to this goal form
                 col1, col2 = st.columns([3, 1])
@@ -153,32 +184,27 @@ with col2:
                 with col1:
                     contribute_amount = st.number_input(f"Amount for '{goal['name']}'", 
                                                          min_value=0.01, 
-                                                         value=min(10.0, remaining) if remaining > 0 else 0.01,
+                                                         value=min(10.0, money.to_units(remaining)) if remaining > 0 else 0.01,
                                                          step=1.0,
                                                          key=f"goal_{i}")
                 
                 with col2:
                     if st.button("Contribute", key=f"contribute_{i}"):
-                        if contribute_amount > 0:
-                            if contribute_amount <= current_balance:
-                                # Update goal
-                                new_amount, completed = utils.update_goal(goal["id"], contribute_amount)
-                                
-                                # Update balance
-                                utils.update_balance(st.session_state.username, -contribute_amount)
+                        contribute_cents = money.to_cents(contribute_amount)
+                        if contribute_cents > 0:
+                            if contribute_cents <= current_balance:
+                                # Goal, ledger, balance and FinPet rewards update together
+                                completed_now, _ = utils.contribute_to_goal(
+                                    st.session_state.username,
+                                    goal["id"],
+                                    contribute_cents
+                                )
                                 
-                                if completed:
+                                if completed_now:
                                     st.success(f"🎉 Congratulations! You've reached your goal: {goal['name']}")
-                                    # Add a special reward for completing a savings goal
-                                    utils.add_finpet_reward(
-                                        st.session_state.username,
-                                        "Goal Achieved",
-                                        f"Completed savings goal: {goal['name']} (${goal['target_amount']:.2f})",
-                                        "🏆"
-                                    )
                                     st.info("🏆 You've earned a special FinPet reward for reaching your goal! +25 XP")
                                 else:
-                                    st.success(f"Added ${contribute_amount:.2f} to {goal['name']}")
+                                    st.success(f"Added {money.format_money(contribute_cents)} to {goal['name']}")
                                     # Note about XP earned
                                     st.info("🐾 Your FinPet earned +3 XP for saving money!")
                                 
@@ -188,6 +214,24 @@ with col2:
                         else:
                             st.error("Please enter a valid amount.")
                 
+                # How this goal shares in automatic allocation
+                if not goal["completed"]:
+                    with st.form(f"goal_allocation_{i}"):
+                        priority_col, pct_col, deadline_col = st.columns(3)
+                        with priority_col:
+                            goal_priority = st.number_input("Priority (1 = first)", min_value=0, value=goal["priority"], step=1, key=f"priority_{i}")
+                        with pct_col:
+                            goal_pct = st.number_input("Share (%)", min_value=0, max_value=100, value=goal["allocation_pct"], step=5, key=f"pct_{i}")
+                        with deadline_col:
+                            goal_deadline = st.date_input(
+                                "Deadline",
+                                value=datetime.fromisoformat(goal["deadline"]).date() if goal["deadline"] else None,
+                                key=f"deadline_{i}"
+                            )
+                        if st.form_submit_button("Save Allocation Settings"):
+                            utils.update_goal_allocation(st.session_state.username, goal["id"], goal_priority, goal_pct, goal_deadline)
+                            st.rerun()
+                
                 # Show creation date
                 if "date_created" in goal:
                     created_date = goal["date_created"].strftime("%B %d, %Y") if isinstance(goal["date_created"], datetime) else "Unknown"
@@ -2,8 +2,10 @@ import streamlit as st
 import pandas as pd
 import altair as alt
 from datetime import datetime, timedelta
+import money
 import utils
-from database import get_db
+import export
+import search
 
 st.set_page_config(page_title="Expense History", page_icon="📜", layout="wide")
 
@@ -15,6 +17,36 @@ if not st.session_state.get("logged_in", False):
 # Title
 st.title("📜 Expense History")
 
+# Export full history (streamed from the database, independent of the filters below)
+with st.expander("⬇️ Export"):
+    export_col1, export_col2 = st.columns(2)
+    with export_col1:
+        export_table = st.selectbox(
+            "Data",
+            ["expenses", "fund_transactions"],
+            format_func=lambda t: "Expenses" if t == "expenses" else "Deposits"
+        )
+    with export_col2:
+        export_format = st.selectbox("Format", list(export.EXPORT_FORMATS.keys()), format_func=str.upper)
+
+    user_id = utils.get_user_id(st.session_state.username)
+    st.download_button(
+        "Download",
+        data=lambda: export.export_file(utils.get_db(), export_table, user_id, export_format),
+        file_name=f"{export_table}.{export_format}",
+        mime=export.EXPORT_FORMATS[export_format],
+        on_click="ignore"
+    )
+
+# Expenses flagged by the duplicate scan or added again on purpose (see duplicates.py)
+duplicate_expenses = utils.get_duplicate_expenses(st.session_state.username)
+if duplicate_expenses:
+    with st.expander(f"⚠️ {len(duplicate_expenses)} possible duplicate expenses"):
+        duplicates_df = pd.DataFrame(duplicate_expenses)
+        duplicates_df['date'] = pd.to_datetime(duplicates_df['date']).dt.strftime('%m/%d/%Y %H:%M')
+        duplicates_df['amount'] = duplicates_df['amount_cents'].map(money.format_money)
+        st.dataframe(duplicates_df[['date', 'description', 'amount', 'category', 'type']], use_container_width=True, hide_index=True)
+
 # Get all expenses
 expenses = utils.get_user_expenses(st.session_state.username)
 
@@ -28,9 +60,16 @@ else:
     if 'date' in df.columns:
         df['date'] = pd.to_datetime(df['date'])
     
+    # Search, ranked by the full-text index (see search.py)
+    search_text = st.text_input("🔍 Search descriptions", placeholder="E.g., coffee, uber, netflix")
+    
     # Filters
     st.subheader("Filters")
     
+    # Date bounds and selections, also applied to search results
+    start_bound = end_bound = None
+    selected_category = selected_type = "All"
+    
     col1, col2, col3 = st.columns(3)
     
     with col1:
@@ -46,12 +85,15 @@ else:
         if date_range == "Last 7 Days":
             start_date = today - timedelta(days=7)
             df = df[(df['date'] >= start_date) & (df['date'] <= today)]
+            start_bound, end_bound = start_date, today
         elif date_range == "Last 30 Days":
             start_date = today - timedelta(days=30)
             df = df[(df['date'] >= start_date) & (df['date'] <= today)]
+            start_bound, end_bound = start_date, today
         elif date_range == "This Month":
             start_date = datetime(today.year, today.month, 1)
             df = df[(df['date'] >= start_date) & (df['date'] <= today)]
+            start_bound, end_bound = start_date, today
         elif date_range == "Last Month":
             if today.month == 1:
                 start_date = datetime(today.year - 1, 12, 1)
@@ -60,6 +102,7 @@ else:
                 start_date = datetime(today.year, today.month - 1, 1)
                 end_date = datetime(today.year, today.month, 1) - timedelta(days=1)
             df = df[(df['date'] >= start_date) & (df['date'] <= end_date)]
+            start_bound, end_bound = start_date, end_date
         elif date_range == "Custom":
             col1, col2 = st.columns(2)
             with col1:
@@ -71,6 +114,7 @@ else:
             custom_end = datetime.combine(custom_end, datetime.max.time())
             
             df = df[(df['date'] >= custom_start) & (df['date'] <= custom_end)]
+            start_bound, end_bound = custom_start, custom_end
     
     with col2:
         # Category filter
@@ -90,25 +134,64 @@ else:
             if selected_type != "All":
                 df = df[df['type'] == selected_type]
     
+    # Summary and charts below cover every match, not just the page shown
+    if search_text.strip():
+        df = df[df['id'].isin(utils.get_matching_expense_ids(st.session_state.username, search_text))]
+    
     # Main expense display
     st.subheader("Expense Records")
     
     if df.empty:
         st.info("No expenses match your filter criteria.")
     else:
-        # Format date
-        display_df = df.copy()
-        display_df['date'] = display_df['date'].dt.strftime('%m/%d/%Y %I:%M %p')
-        
-        # Sort by date (newest first)
-        display_df = display_df.sort_values(by='date', ascending=False)
-        
-        # Select columns to display
-        display_columns = ['description', 'amount', 'date', 'category', 'type']
-        display_df = display_df[[col for col in display_columns if col in display_df.columns]]
-        
-        # Show the data
-        st.dataframe(display_df, use_container_width=True)
+        if search_text.strip():
+            # Start over at the first page whenever the search or filters change
+            search_key = (search_text, start_bound, end_bound, selected_category, selected_type)
+            if st.session_state.get("search_key") != search_key:
+                st.session_state.search_key = search_key
+                st.session_state.search_page = 0
+            
+            results, total_matches = utils.search_expenses(
+                st.session_state.username,
+                search_text,
+                start_bound,
+                end_bound,
+                None if selected_category == "All" else selected_category,
+                None if selected_type == "All" else selected_type,
+                st.session_state.search_page
+            )
+            results_df = pd.DataFrame(results)
+            results_df['date'] = pd.to_datetime(results_df['date'], format="ISO8601").dt.strftime('%m/%d/%Y %I:%M %p')
+            results_df['amount'] = results_df['amount_cents'].map(money.format_money)
+            st.dataframe(results_df[['description', 'amount', 'date', 'category', 'type']], use_container_width=True, hide_index=True)
+            
+            page_count = -(-total_matches // search.SEARCH_PAGE_SIZE)
+            newer_col, page_col, older_col = st.columns([1, 2, 1])
+            with newer_col:
+                if st.session_state.search_page > 0 and st.button("← Better matches"):
+                    st.session_state.search_page -= 1
+                    st.rerun()
+            with page_col:
+                st.caption(f"{total_matches} matches, best first · page {st.session_state.search_page + 1} of {page_count}")
+            with older_col:
+                if st.session_state.search_page + 1 < page_count and st.button("More matches →"):
+                    st.session_state.search_page += 1
+                    st.rerun()
+        else:
+            # Format date
+            display_df = df.copy()
+            display_df['date'] = display_df['date'].dt.strftime('%m/%d/%Y %I:%M %p')
+            display_df['amount'] = display_df['amount_cents'].map(money.format_money)
+            
+            # Sort by date (newest first)
+            display_df = display_df.sort_values(by='date', ascending=False)
+            
+            # Select columns to display
+            display_columns = ['description', 'amount', 'date', 'category', 'type']
+            display_df = display_df[[col for col in display_columns if col in display_df.columns]]
+            
+            # Show the data
+            st.dataframe(display_df, use_container_width=True)
         
         # Summary statistics
         st.subheader("Summary")
@@ -117,18 +200,18 @@ else:
         
         with col1:
             # Total expenses
-            total_expenses = df['amount'].sum()
-            avg_expense = df['amount'].mean()
+            total_expenses = df['amount_cents'].sum()
             count = len(df)
+            avg_expense = round(total_expenses / count)
             
-            st.metric("Total Expenses", f"${total_expenses:.2f}")
-            st.metric("Average Expense", f"${avg_expense:.2f}")
+            st.metric("Total Expenses", money.format_money(total_expenses))
+            st.metric("Average Expense", money.format_money(avg_expense))
             st.metric("Number of Expenses", count)
         
         with col2:
             # Needs vs Wants
             if 'type' in df.columns:
-                needs_wants = df.groupby('type')['amount'].sum().to_dict()
+                needs_wants = df.groupby('type')['amount_cents'].sum().to_dict()
                 needs = needs_wants.get('Needs', 0)
                 wants = needs_wants.get('Wants', 0)
                 
@@ -139,8 +222,8 @@ else:
                 else:
                     needs_percent = wants_percent = 0
                 
-                st.metric("Needs Expenses", f"${needs:.2f} ({needs_percent:.1f}%)")
-                st.metric("Wants Expenses", f"${wants:.2f} ({wants_percent:.1f}%)")
+                st.metric("Needs Expenses", f"{money.format_money(needs)} ({needs_percent:.1f}%)")
+                st.metric("Wants Expenses", f"{money.format_money(wants)} ({wants_percent:.1f}%)")
     
     # Visualizations
     st.subheader("Visualizations")
@@ -153,7 +236,7 @@ else:
             if 'date' in df.columns:
                 # Group by day
                 df['day'] = df['date'].dt.date
-                daily_expenses = df.groupby('day')['amount'].sum().reset_index()
+                daily_expenses = money.cents_column(df.groupby('day')['amount_cents'].sum().reset_index())
                 
                 # Create chart
                 chart = alt.Chart(daily_expenses).mark_line(point=True).encode(
@@ -171,7 +254,7 @@ else:
         with tab2:
             # Category breakdown
             if 'category' in df.columns:
-                category_expenses = df.groupby('category')['amount'].sum().reset_index()
+                category_expenses = money.cents_column(df.groupby('category')['amount_cents'].sum().reset_index())
                 
                 # Create chart
                 chart = alt.Chart(category_expenses).mark_bar().encode(
@@ -189,19 +272,20 @@ else:
                 
                 # Category table
                 st.write("Category Breakdown")
-                category_expenses = category_expenses.sort_values('amount', ascending=False)
+                category_expenses = category_expenses.sort_values('amount_cents', ascending=False)
                 
                 # Add percentage column
-                total = category_expenses['amount'].sum()
-                category_expenses['percentage'] = (category_expenses['amount'] / total * 100).round(1)
+                total = category_expenses['amount_cents'].sum()
+                category_expenses['percentage'] = (category_expenses['amount_cents'] / total * 100).round(1)
                 category_expenses['percentage'] = category_expenses['percentage'].astype(str) + '%'
+                category_expenses['amount'] = category_expenses['amount_cents'].map(money.format_money)
                 
-                st.dataframe(category_expenses, use_container_width=True)
+                st.dataframe(category_expenses[['category', 'amount', 'percentage']], use_container_width=True)
         
         with tab3:
             # Needs vs Wants analysis
             if 'type' in df.columns:
-                type_expenses = df.groupby('type')['amount'].sum().reset_index()
+                type_expenses = money.cents_column(df.groupby('type')['amount_cents'].sum().reset_index())
                 
                 # Create chart
                 chart = alt.Chart(type_expenses).mark_bar().encode(
@@ -224,11 +308,14 @@ else:
                 if 'category' in df.columns:
                     wants_df = df[df['type'] == 'Wants']
                     if not wants_df.empty:
-                        wants_by_category = wants_df.groupby('category')['amount'].sum().reset_index()
-                        wants_by_category = wants_by_category.sort_values('amount', ascending=False)
+                        wants_by_category = money.cents_column(wants_df.groupby('category')['amount_cents'].sum().reset_index())
+                        wants_by_category = wants_by_category.sort_values('amount_cents', ascending=False)
                         
                         st.write("'Wants' Spending by Category")
-                        st.dataframe(wants_by_category, use_container_width=True)
+                        st.dataframe(
+                            wants_by_category.assign(amount=wants_by_category['amount_cents'].map(money.format_money))[['category', 'amount']],
+                            use_container_width=True
+                        )
                         
                         # Add visualization
                         chart = alt.Chart(wants_by_category).mark_bar().encode(
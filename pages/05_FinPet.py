@@ -1,15 +1,7 @@
 import streamlit as st
-import pandas as pd
 from datetime import datetime, timedelta
 import utils
-import sqlite3
-import threading
-import base64
-import os
-from pathlib import Path
-
-# Thread-local storage for database connections
-thread_local = threading.local()
+import assets
 
 # Set page config
 st.set_page_config(page_title="FinPet", page_icon="🐾", layout="wide")
@@ -22,95 +14,6 @@ if not st.session_state.get("logged_in", False):
 # Title
 st.title("🐾 FinPet - Your Financial Companion")
 
-# Helper functions for direct database access
-def get_db_connection():
-    if not hasattr(thread_local, 'conn'):
-        thread_local.conn = sqlite3.connect('finance_tracker.db', check_same_thread=False)
-        # Enable foreign keys
-        thread_local.conn.execute("PRAGMA foreign_keys = ON")
-    return thread_local.conn
-
-def get_finpet_data(username):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM finpet WHERE username = ?", (username,))
-    finpet_data = cursor.fetchone()
-    if finpet_data:
-        columns = [description[0] for description in cursor.description]
-        return dict(zip(columns, finpet_data))
-    return None
-
-def get_finpet_rewards(username):
-    """Get the rewards for a user's FinPet directly from the database."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT rewards FROM finpet WHERE username = ?", (username,))
-    rewards_data = cursor.fetchone()
-    
-    if rewards_data and rewards_data[0]:
-        try:
-            import json
-            return json.loads(rewards_data[0])
-        except Exception as e:
-            st.error(f"Error parsing rewards: {e}")
-            return []
-    return []
-
-def update_finpet_name(username, new_name):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE finpet SET name = ? WHERE username = ?", 
-                  (new_name, username))
-    conn.commit()
-    return cursor.rowcount > 0
-
-def get_user_goal_count(username):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT COUNT(*) FROM goals 
-        WHERE username = ? AND current_amount >= target_amount
-    """, (username,))
-    count = cursor.fetchone()[0]
-    return count
-
-def get_user_expense_count(username):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM expenses WHERE username = ?", (username,))
-    count = cursor.fetchone()[0]
-    return count
-
-def get_recent_expenses(username, limit=5):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id, username, description, amount, category, type, date
-        FROM expenses 
-        WHERE username = ? 
-        ORDER BY date DESC
-        LIMIT ?
-    """, (username, limit))
-    
-    results = cursor.fetchall()
-    if results:
-        columns = [description[0] for description in cursor.description]
-        expenses = [dict(zip(columns, row)) for row in results]
-        return expenses
-    return []
-
-# Helper function to load and display GIFs
-def get_img_with_href(img_path, target_size=(250, 250)):
-    with open(img_path, "rb") as f:
-        data = f.read()
-        b64 = base64.b64encode(data).decode()
-        html = f"""
-        <div style="display: flex; justify-content: center; align-items: center; height: 300px;">
-            <img src="data:image/gif;base64,{b64}" alt="FinPet" width="{target_size[0]}" height="{target_size[1]}">
-        </div>
-        """
-        return html
-
 # Get user's FinPet data
 finpet = utils.get_user_finpet(st.session_state.username)
 
@@ -132,32 +35,14 @@ with col1:
             """, unsafe_allow_html=True)
             st.markdown("<div style='text-align: center;'><b>Egg FinPet (Level up to hatch!)</b></div>", unsafe_allow_html=True)
         
-        # For levels 10-19, show first GIF
-        elif finpet['level'] < 20:
-            gif_path = "static/images/gif1.gif"
-            if os.path.exists(gif_path):
-                st.markdown(get_img_with_href(gif_path), unsafe_allow_html=True)
-                st.markdown("<div style='text-align: center;'><b>Baby FinPet</b></div>", unsafe_allow_html=True)
-            else:
-                st.error(f"GIF file not found: {gif_path}")
-        
-        # For levels 20-29, show second GIF
-        elif finpet['level'] < 30:
-            gif_path = "static/images/gif2.gif"
-            if os.path.exists(gif_path):
-                st.markdown(get_img_with_href(gif_path), unsafe_allow_html=True)
-                st.markdown("<div style='text-align: center;'><b>Teen FinPet</b></div>", unsafe_allow_html=True)
-            else:
-                st.error(f"GIF file not found: {gif_path}")
-        
-        # For levels 30+, show third GIF
+        # Hatched stages are served as static files (see assets.py)
         else:
-            gif_path = "static/images/gif3.gif"
-            if os.path.exists(gif_path):
-                st.markdown(get_img_with_href(gif_path), unsafe_allow_html=True)
-                st.markdown("<div style='text-align: center;'><b>Master FinPet</b></div>", unsafe_allow_html=True)
+            image, label = assets.pet_stage(finpet['level'])
+            if assets.exists(image):
+                st.markdown(assets.image_html(image), unsafe_allow_html=True)
+                st.markdown(f"<div style='text-align: center;'><b>{label}</b></div>", unsafe_allow_html=True)
             else:
-                st.error(f"GIF file not found: {gif_path}")
+                st.error(f"GIF file not found: static/{image}")
     
     # Progress to next level
     st.subheader("Progress")
@@ -172,7 +57,7 @@ with col1:
         submit_button = st.form_submit_button("Update Name")
         
         if submit_button and new_name:
-            if update_finpet_name(st.session_state.username, new_name):
+            if utils.update_finpet_name(st.session_state.username, new_name):
                 st.success(f"Your FinPet is now named {new_name}!")
                 st.rerun()
             else:
@@ -208,105 +93,47 @@ with col2:
     # FinPet achievements
     st.subheader("Achievements")
     
-    # Calculate achievements
-    
-    # Get total expenses count
-    total_expenses = get_user_expense_count(st.session_state.username)
-    
-    # Get needs ratio
-    expenses = utils.get_user_expenses(st.session_state.username)
-    df = pd.DataFrame(expenses) if expenses else pd.DataFrame(columns=["type", "amount"])
-    
-    needs_wants_ratio = 0
-    if not df.empty and 'type' in df.columns and df['amount'].sum() > 0:
-        needs_wants = df.groupby('type')['amount'].sum().to_dict()
-        needs = needs_wants.get('Needs', 0)
-        total = df['amount'].sum()
-        needs_wants_ratio = (needs / total) if total > 0 else 0
-    
-    # Get completed goals count
-    completed_goals = get_user_goal_count(st.session_state.username)
-    
-    # Display achievements
-    achievements = []
-    
-    # Level achievements
-    if finpet['level'] >= 5:
-        achievements.append("🏆 **First Steps**: Reached level 5")
-    if finpet['level'] >= 10:
-        achievements.append("🏆 **Hatched**: Reached level 10 and hatched from egg")
-    if finpet['level'] >= 20:
-        achievements.append("🏆 **Growing Up**: Reached level 20 and evolved")
-    if finpet['level'] >= 30:
-        achievements.append("🏆 **Financial Master**: Reached level 30 and achieved final form")
-    
-    # Expense tracking achievements
-    if total_expenses >= 10:
-        achievements.append("📊 **Tracker Beginner**: Recorded 10+ expenses")
-    if total_expenses >= 50:
-        achievements.append("📊 **Expense Expert**: Recorded 50+ expenses")
-    
-    # Needs/wants ratio achievements
-    if needs_wants_ratio >= 0.6:
-        achievements.append("🧠 **Needs-Focused**: 60%+ of spending on needs")
-    if needs_wants_ratio >= 0.8:
-        achievements.append("🧠 **Frugality Master**: 80%+ of spending on needs")
-    
-    # Goals achievements
-    if completed_goals >= 1:
-        achievements.append("🎯 **Goal Getter**: Completed first savings goal")
-    if completed_goals >= 3:
-        achievements.append("🎯 **Goal Master**: Completed 3+ savings goals")
+    # Achievements are declared in achievements.RULES and evaluated against running counters
+    achievements = utils.get_achievements(st.session_state.username)
     
     if achievements:
         for achievement in achievements:
-            st.success(achievement)
+            st.success(f"{achievement.icon} **{achievement.name}**: {achievement.description}")
     else:
         st.info("Start making good financial decisions to earn achievements!")
     
     # Rewards section
     st.subheader("Rewards & Trophies")
     
-    # Get user's rewards
-    rewards = []
-    if 'rewards' in finpet:
-        if isinstance(finpet['rewards'], list):
-            rewards = finpet['rewards']
-        elif isinstance(finpet['rewards'], str):
-            try:
-                import json
-                rewards = json.loads(finpet['rewards'])
-            except:
-                st.warning("Could not parse rewards from database")
+    # Get user's rewards, newest first
+    rewards = utils.get_finpet_rewards(st.session_state.username)
     
     # Display rewards in a pretty format with expandable details
     if rewards:
         for reward in rewards:
-            if isinstance(reward, dict):
-                icon = reward.get('icon', '🎁')
-                name = reward.get('name', 'Unnamed Reward')
-                description = reward.get('description', '')
-                date_str = "Unknown"
-                
-                # Format the date if it exists
-                if 'date' in reward:
-                    try:
-                        date_obj = datetime.fromisoformat(reward['date'].replace('Z', '+00:00'))
-                        date_str = date_obj.strftime("%m/%d/%Y")
-                    except:
-                        pass
-                
-                # Display reward
-                with st.expander(f"{icon} {name} - Earned {date_str}"):
-                    st.write(description)
+            icon = reward['icon'] or '🎁'
+            description = reward['description'] or ''
+            date_str = "Unknown"
+            
+            # Format the date if it exists
+            if reward['date']:
+                try:
+                    date_obj = datetime.fromisoformat(reward['date'].replace('Z', '+00:00'))
+                    date_str = date_obj.strftime("%m/%d/%Y")
+                except ValueError:
+                    pass
+            
+            # Display reward
+            with st.expander(f"{icon} {reward['name']} - Earned {date_str}"):
+                st.write(description)
     else:
         st.info("Make good financial decisions to earn rewards and trophies!")
     
     # Activity log
     st.subheader("Activity Log")
     
-    # Get recent expenses to show activity using direct SQL query
-    recent_expenses = get_recent_expenses(st.session_state.username, 5)
+    # Get recent expenses to show activity
+    recent_expenses = utils.get_recent_expenses(st.session_state.username, 5)
     
     if recent_expenses:
         for expense in recent_expenses:
@@ -2,12 +2,9 @@ import streamlit as st
 import pandas as pd
 import altair as alt
 from datetime import datetime, timedelta
+import budgets
+import money
 import utils
-import sqlite3
-import threading
-
-# Thread-local storage for database connections
-thread_local = threading.local()
 
 # Set page config
 st.set_page_config(page_title="Weekly Wants", page_icon="📅", layout="wide")
@@ -21,99 +18,30 @@ if not st.session_state.get("logged_in", False):
 st.title("📅 Weekly Wants Budget")
 st.write("Track and manage your discretionary spending")
 
-# Helper functions for direct database access
-def get_db_connection():
-    if not hasattr(thread_local, 'conn'):
-        thread_local.conn = sqlite3.connect('finance_tracker.db', check_same_thread=False)
-        # Enable foreign keys
-        thread_local.conn.execute("PRAGMA foreign_keys = ON")
-    return thread_local.conn
-
-def get_user_data(username):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
-    user_data = cursor.fetchone()
-    if user_data:
-        columns = [description[0] for description in cursor.description]
-        return dict(zip(columns, user_data))
-    return None
-
-def update_user_budget(username, budget):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE users SET wants_budget = ? WHERE username = ?", 
-                  (budget, username))
-    conn.commit()
-    return cursor.rowcount > 0
-
-def get_weekly_wants_expenses(username):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Calculate current week's start date
-    today = datetime.now()
-    week_start = today - timedelta(days=today.weekday())
-    week_start = datetime.combine(week_start, datetime.min.time())
-    
-    # Query for this week's wants expenses
-    cursor.execute("""
-        SELECT * FROM expenses 
-        WHERE username = ? AND type = 'Wants' AND date >= ? AND date <= ?
-        ORDER BY date DESC
-    """, (username, week_start, today))
-    
-    results = cursor.fetchall()
-    if results:
-        columns = [description[0] for description in cursor.description]
-        expenses = [dict(zip(columns, row)) for row in results]
-        return expenses
-    return []
-
-def get_monthly_wants_expenses(username, days=28):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Calculate date range
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=days)
-    
-    # Query for the past X days of wants expenses
-    cursor.execute("""
-        SELECT * FROM expenses 
-        WHERE username = ? AND type = 'Wants' AND date >= ? AND date <= ?
-    """, (username, start_date, end_date))
-    
-    results = cursor.fetchall()
-    if results:
-        columns = [description[0] for description in cursor.description]
-        expenses = [dict(zip(columns, row)) for row in results]
-        return expenses
-    return []
-
-# Get user data
-user = get_user_data(st.session_state.username)
-weekly_wants_budget = user.get("wants_budget", 100.0) if user else 100.0
-
-# Current week's wants spending from utils
-current_wants_spending = utils.get_weekly_wants_spending(st.session_state.username)
+# Current budget period, from the per-period counters (see budgets.py)
+budget = utils.get_wants_budget_status(st.session_state.username)
+weekly_wants_budget = budget["limit_cents"]
+current_wants_spending = budget["spent_cents"]
+period_label = budgets.PERIOD_LABELS[budget["period"]]
+period_name = budget["period"]
 
 # Main dashboard layout
 col1, col2 = st.columns([2, 1])
 
 with col1:
-    st.subheader("Your Weekly 'Wants' Budget")
+    st.subheader(f"Your {period_label.title()} 'Wants' Budget")
+    st.caption(f"Current {period_name}: {budget['period_start']:%b %d} - {budget['period_end'] - timedelta(days=1):%b %d}")
     
     # Budget progress
     progress_percentage = min((current_wants_spending / weekly_wants_budget) * 100, 100) if weekly_wants_budget > 0 else 0
     
     # Determine color based on percentage
     if progress_percentage < 70:
-        st.success(f"You've spent ${current_wants_spending:.2f} of your ${weekly_wants_budget:.2f} weekly 'wants' budget")
+        st.success(f"You've spent {money.format_money(current_wants_spending)} of your {money.format_money(weekly_wants_budget)} {period_label} 'wants' budget")
     elif progress_percentage < 90:
-        st.warning(f"You've spent ${current_wants_spending:.2f} of your ${weekly_wants_budget:.2f} weekly 'wants' budget")
+        st.warning(f"You've spent {money.format_money(current_wants_spending)} of your {money.format_money(weekly_wants_budget)} {period_label} 'wants' budget")
     else:
-        st.error(f"You've spent ${current_wants_spending:.2f} of your ${weekly_wants_budget:.2f} weekly 'wants' budget")
+        st.error(f"You've spent {money.format_money(current_wants_spending)} of your {money.format_money(weekly_wants_budget)} {period_label} 'wants' budget")
     
     st.progress(progress_percentage / 100)
     
@@ -121,7 +49,7 @@ with col1:
     remaining_budget = max(weekly_wants_budget - current_wants_spending, 0)
     st.metric(
         label="Remaining Budget", 
-        value=f"${remaining_budget:.2f}",
+        value=money.format_money(remaining_budget),
         delta=f"{100 - progress_percentage:.1f}% remaining"
     )
     
@@ -136,7 +64,7 @@ with col1:
                 utils.add_finpet_reward(
                     st.session_state.username,
                     "Budget Champion",
-                    f"Used less than 50% of your weekly wants budget (${weekly_wants_budget:.2f})",
+                    f"Used less than 50% of your {period_label} wants budget ({money.format_money(weekly_wants_budget)})",
                     "🎖️"
                 )
                 st.success("Congratulations! You've earned the Budget Champion reward (+10 XP)!")
@@ -149,55 +77,61 @@ with col1:
     st.subheader("Adjust Your Budget")
     with st.form("adjust_budget"):
         new_budget = st.number_input(
-            "Weekly 'Wants' Budget ($)", 
+            "'Wants' Budget per Period ($)", 
             min_value=0.0, 
-            value=weekly_wants_budget,
+            value=money.to_units(weekly_wants_budget),
             step=10.0
         )
+        new_period = st.radio(
+            "Budget Period",
+            budgets.PERIODS,
+            index=budgets.PERIODS.index(budget["period"]),
+            format_func=lambda period: budgets.PERIOD_LABELS[period].title(),
+            horizontal=True
+        )
+        new_week_start = st.selectbox(
+            "Weeks Start On",
+            range(len(budgets.WEEKDAYS)),
+            index=budget["week_start"],
+            format_func=lambda day: budgets.WEEKDAYS[day]
+        )
         
         submit_button = st.form_submit_button("Update Budget")
         
         if submit_button:
-            if update_user_budget(st.session_state.username, new_budget):
-                st.success(f"Budget updated to ${new_budget:.2f} per week")
+            new_budget_cents = money.to_cents(new_budget)
+            updated = utils.update_wants_budget(st.session_state.username, new_budget_cents)
+            if (new_period, new_week_start) != (budget["period"], budget["week_start"]):
+                updated = utils.update_wants_budget_period(st.session_state.username, new_period, new_week_start) and updated
+            if updated:
+                st.success(f"Budget updated to {money.format_money(new_budget_cents)} per {new_period}")
                 st.rerun()
             else:
                 st.error("Failed to update budget. Please try again.")
     
-    # Weekly spending chart
-    st.subheader("Weekly 'Wants' Spending History")
+    # Spending history chart
+    st.subheader(f"{period_label.title()} 'Wants' Spending History")
     
-    # Get data for the past 4 weeks
-    monthly_expenses = get_monthly_wants_expenses(st.session_state.username)
+    # The last 4 periods, straight from the per-period counters
+    history = utils.get_wants_budget_history(st.session_state.username)
     
-    if monthly_expenses:
-        # Convert to DataFrame
-        df = pd.DataFrame(monthly_expenses)
-        df['date'] = pd.to_datetime(df['date'])
-        df['week'] = df['date'].dt.isocalendar().week
-        
-        # Group by week
-        weekly_spending = df.groupby('week')['amount'].sum().reset_index()
-        
-        # Create labels for weeks
-        weeks = []
-        for week_num in weekly_spending['week']:
-            weeks.append(f"Week {week_num}")
-        
-        weekly_spending['week_label'] = weeks
+    if any(spent for _, spent in history):
+        period_spending = money.cents_column(pd.DataFrame(history, columns=['period_start', 'amount_cents']))
+        date_format = "%b %Y" if period_name == "month" else "Week of %b %d"
+        period_spending['period_label'] = [start.strftime(date_format) for start in period_spending['period_start']]
         
         # Create chart
-        chart = alt.Chart(weekly_spending).mark_bar().encode(
-            x=alt.X('week_label:N', title='Week'),
+        chart = alt.Chart(period_spending).mark_bar().encode(
+            x=alt.X('period_label:N', title=period_name.title(), sort=None),
             y=alt.Y('amount:Q', title='Amount ($)'),
             color=alt.condition(
-                alt.datum.amount > weekly_wants_budget,
+                alt.datum.amount > money.to_units(weekly_wants_budget),
                 alt.value('red'),  # over budget
                 alt.value('blue')  # within budget
             ),
-            tooltip=['week_label:N', 'amount:Q']
+            tooltip=['period_label:N', 'amount:Q']
         ).properties(
-            title='Weekly Wants Spending',
+            title=f'{period_label.title()} Wants Spending',
             width='container',
             height=300
         ).interactive()
@@ -205,21 +139,22 @@ with col1:
         st.altair_chart(chart, use_container_width=True)
         
         # Compare to budget
-        for i, row in weekly_spending.iterrows():
-            if row['amount'] > weekly_wants_budget:
-                over_amount = row['amount'] - weekly_wants_budget
-                st.warning(f"{row['week_label']}: Over budget by ${over_amount:.2f}")
+        for i, row in period_spending.iterrows():
+            if row['amount_cents'] > weekly_wants_budget:
+                over_amount = row['amount_cents'] - weekly_wants_budget
+                st.warning(f"{row['period_label']}: Over budget by {money.format_money(over_amount)}")
             else:
-                under_amount = weekly_wants_budget - row['amount']
-                st.success(f"{row['week_label']}: Under budget by ${under_amount:.2f}")
+                under_amount = weekly_wants_budget - row['amount_cents']
+                st.success(f"{row['period_label']}: Under budget by {money.format_money(under_amount)}")
     else:
-        st.info("No 'wants' spending data available for the past 4 weeks.")
+        st.info(f"No 'wants' spending data available for the past 4 {period_name}s.")
 
 with col2:
-    st.subheader("This Week's Wants")
+    st.subheader(f"This {period_name.title()}'s Wants")
     
-    # Get current week's wants expenses
-    weekly_wants = get_weekly_wants_expenses(st.session_state.username)
+    # Get the current period's wants expenses
+    period_start = datetime.combine(budget["period_start"], datetime.min.time())
+    weekly_wants = utils.get_expenses_between(st.session_state.username, period_start, datetime.now(), "Wants")
     
     if weekly_wants:
         # Convert to DataFrame for easier manipulation
@@ -231,16 +166,17 @@ with col2:
         
         # Display the expenses
         for i, row in df.iterrows():
-            with st.expander(f"{row['description']} - ${row['amount']:.2f}", expanded=i==0):
+            with st.expander(f"{row['description']} - {money.format_money(row['amount_cents'])}", expanded=i==0):
                 st.write(f"**Date:** {row['formatted_date']}")
                 st.write(f"**Category:** {row['category']}")
-                st.write(f"**Amount:** ${row['amount']:.2f}")
+                st.write(f"**Amount:** {money.format_money(row['amount_cents'])}")
                 
                 # Add context about impact on budget
-                percent_of_budget = (row['amount'] / weekly_wants_budget) * 100
-                st.write(f"This expense was **{percent_of_budget:.1f}%** of your weekly 'wants' budget.")
+                if weekly_wants_budget > 0:
+                    percent_of_budget = (row['amount_cents'] / weekly_wants_budget) * 100
+                    st.write(f"This expense was **{percent_of_budget:.1f}%** of your {period_label} 'wants' budget.")
     else:
-        st.info("You haven't recorded any 'wants' expenses this week.")
+        st.info(f"You haven't recorded any 'wants' expenses this {period_name}.")
     
     # Tips and suggestions
     st.subheader("Tips for Managing 'Wants'")
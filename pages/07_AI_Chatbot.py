@@ -2,8 +2,8 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
 import random
+import money
 import utils
-from database import get_db
 
 st.set_page_config(page_title="AI Chatbot", page_icon="💬", layout="wide")
 
@@ -97,10 +97,10 @@ def generate_response(prompt):
     
     # Check for account-specific queries
     elif "balance" in prompt_lower or "how much" in prompt_lower and "have" in prompt_lower:
-        return f"Your current balance is ${balance:.2f}."
+        return f"Your current balance is {money.format_money(balance)}."
     
     elif "spending" in prompt_lower and "week" in prompt_lower:
-        return f"You've spent ${weekly_spending:.2f} this week."
+        return f"You've spent {money.format_money(weekly_spending)} this week."
     
     elif "goal" in prompt_lower or "target" in prompt_lower:
         goals = utils.get_user_goals(username)
@@ -108,8 +108,8 @@ def generate_response(prompt):
             return "You don't have any savings goals set up yet. Would you like to create one?"
         else:
             goal = goals[0]  # Get the first goal
-            progress = (goal["current_amount"] / goal["target_amount"]) * 100
-            return f"For your '{goal['name']}' goal, you've saved ${goal['current_amount']:.2f} out of ${goal['target_amount']:.2f} ({progress:.1f}%)."
+            progress = (goal["current_cents"] / goal["target_cents"]) * 100
+            return f"For your '{goal['name']}' goal, you've saved {money.format_money(goal['current_cents'])} out of {money.format_money(goal['target_cents'])} ({progress:.1f}%)."
     
     elif "needs" in prompt_lower and "wants" in prompt_lower:
         needs_wants = utils.get_needs_wants_ratio(username)
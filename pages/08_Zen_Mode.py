@@ -1,8 +1,8 @@
 import streamlit as st
+import money
 import utils
-from database import get_db
 import pandas as pd
-from datetime import datetime, timedelta
+import zen
 
 st.set_page_config(page_title="Zen Mode", page_icon="🧘", layout="wide")
 
@@ -79,44 +79,49 @@ with col1:
         - Helps achieve financial goals faster
         """)
     
-    # Zen Mode impact
-    if zen_status:
-        st.subheader("Your Zen Mode Impact")
-        
-        # Get data since Zen Mode was activated
-        db = get_db()
-        user = db.users.find_one({"username": st.session_state.username})
-        
-        # For demo purposes, we'll show example impact data
-        # In a real implementation, we would track when Zen Mode was activated
-        today = datetime.now()
-        thirty_days_ago = today - timedelta(days=30)
-        
-        # Get wants expenses from last 30 days
-        wants_expenses = list(db.expenses.find({
-            "username": st.session_state.username,
-            "type": "Wants",
-            "date": {"$gte": thirty_days_ago}
-        }))
-        
-        if wants_expenses:
-            df = pd.DataFrame(wants_expenses)
-            total_wants = df['amount'].sum()
-            
-            # Estimated savings (assume 15% reduction in wants spending due to Zen Mode)
-            estimated_savings = total_wants * 0.15
-            
+    # Zen Mode impact, measured from activation history (see zen.py)
+    st.subheader("Your Zen Mode Impact")
+    sessions, impact = utils.get_zen_impact(st.session_state.username)
+    
+    if impact is not None:
+        impact_col1, impact_col2, impact_col3 = st.columns(3)
+        with impact_col1:
             st.metric(
-                label="Estimated Monthly Savings with Zen Mode", 
-                value=f"${estimated_savings:.2f}",
-                delta="15% reduction in 'wants' spending"
+                label="Wants per Day Before",
+                value=money.format_money(round(impact["before_daily_cents"]))
             )
-            
-            # Project annual impact
-            annual_impact = estimated_savings * 12
-            st.write(f"If maintained for a full year, Zen Mode could help you save approximately **${annual_impact:.2f}**!")
-        else:
-            st.info("Start tracking your 'wants' expenses to see the impact of Zen Mode on your finances.")
+        with impact_col2:
+            st.metric(
+                label="Wants per Day in Zen Mode",
+                value=money.format_money(round(impact["after_daily_cents"])),
+                delta=f"{impact['change_pct']:.1f}%" if impact["change_pct"] is not None else None,
+                delta_color="inverse"
+            )
+        with impact_col3:
+            st.metric(
+                label="Saved in Zen Mode",
+                value=money.format_money(impact["saved_cents"])
+            )
+        
+        st.caption(
+            f"Compares your 'wants' spending during {impact['sessions']} Zen Mode session(s) "
+            f"({impact['zen_days']:.0f} days) with the {zen.IMPACT_WINDOW_DAYS} days before each one started."
+        )
+        
+        with st.expander("Session History"):
+            history = pd.DataFrame({
+                "Started": pd.to_datetime(sessions["started"], format="ISO8601").dt.strftime("%B %d, %Y"),
+                "Days": sessions["after_days"].round(1),
+                "Before ($/day)": sessions["before_daily_cents"].round().map(money.format_money),
+                "During ($/day)": sessions["after_daily_cents"].round().map(money.format_money),
+                "Saved": sessions["saved_cents"].map(money.format_money),
+                "Status": sessions["ongoing"].map({True: "Active", False: "Ended"}),
+            })
+            st.dataframe(history, hide_index=True, use_container_width=True)
+    elif zen_status:
+        st.info(f"Your impact will appear here after a day in Zen Mode. It compares your 'wants' spending with the {zen.IMPACT_WINDOW_DAYS} days before you turned it on.")
+    else:
+        st.info("Turn on Zen Mode to start measuring how it changes your 'wants' spending.")
 
 with col2:
     st.subheader("Zen Mode Tips")
@@ -163,19 +168,20 @@ with col2:
         with st.form("quick_savings"):
             st.write("Add savings from avoided 'wants' purchase:")
             amount = st.number_input("Amount Saved ($)", min_value=1.0, value=20.0, step=5.0)
-            goal_options = {goal["name"]: str(goal["_id"]) for goal in goals}
+            goal_options = {goal["name"]: goal["id"] for goal in goals}
             selected_goal = st.selectbox("Add to Goal", options=list(goal_options.keys()))
             
             submit_button = st.form_submit_button("Add to Goal")
             
             if submit_button and amount > 0:
-                goal_id = goal_options[selected_goal]
-                utils.update_goal(goal_id, amount)
-                
-                # Award extra XP for Zen savings
-                utils.add_finpet_xp(st.session_state.username, 10)
-                
-                st.success(f"Added ${amount:.2f} to {selected_goal} and earned 10 XP for your FinPet!")
-                st.rerun()
+                amount_cents = money.to_cents(amount)
+                if amount_cents > utils.get_current_balance():
+                    st.error("Insufficient funds in your balance.")
+                else:
+                    # Goal, ledger, balance, goal rewards and the extra XP for Zen savings update together
+                    utils.contribute_to_goal(st.session_state.username, goal_options[selected_goal], amount_cents, bonus_xp=10)
+                    
+                    st.success(f"Added {money.format_money(amount_cents)} to {selected_goal} and earned 10 XP for your FinPet!")
+                    st.rerun()
     else:
         st.info("Create a savings goal to track your Zen Mode savings!")
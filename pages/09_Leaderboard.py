@@ -0,0 +1,47 @@
+import streamlit as st
+import pandas as pd
+import leaderboard
+import utils
+
+# Set page config
+st.set_page_config(page_title="Leaderboard", page_icon="🏅", layout="wide")
+
+# Check if user is logged in
+if not st.session_state.get("logged_in", False):
+    st.warning("Please login to access this page.")
+    st.switch_page("app.py")
+
+# Title
+st.title("🏅 FinPet Leaderboard")
+st.write("See how your FinPet stacks up against everyone else's")
+
+# One tab per board; each is a single indexed top-N query
+tabs = st.tabs([board["title"] for board in leaderboard.BOARDS.values()])
+
+for tab, (name, board) in zip(tabs, leaderboard.BOARDS.items()):
+    with tab:
+        rank = utils.get_leaderboard_rank(st.session_state.username, name)
+        if rank is not None:
+            st.metric("Your Rank", f"#{rank:,}")
+        else:
+            st.info("You're not on this board yet. Keep saving and growing your FinPet!")
+
+        entries = utils.get_leaderboard(name)
+        if entries:
+            df = pd.DataFrame(entries)
+            df["username"] = df["username"].where(
+                df["username"] != st.session_state.username, df["username"] + " (you)"
+            )
+            df = df.rename(columns={
+                "rank": "Rank",
+                "username": "User",
+                "pet_name": "FinPet",
+                "value": board["value"],
+                "xp": "XP",
+            })
+            columns = ["Rank", "User", "FinPet", board["value"]] + (["XP"] if "XP" in df else [])
+            st.dataframe(df[columns], hide_index=True, use_container_width=True)
+        else:
+            st.info("Nobody is on this board yet.")
+
+st.caption("Savings streaks count consecutive weeks with at least one deposit.")
@@ -0,0 +1,95 @@
+import streamlit as st
+import pandas as pd
+import altair as alt
+import money
+import simulation
+import utils
+
+# Set page config
+st.set_page_config(page_title="What If?", page_icon="🔮", layout="wide")
+
+# Check if user is logged in
+if not st.session_state.get("logged_in", False):
+    st.warning("Please login to access this page.")
+    st.switch_page("app.py")
+
+# Title
+st.title("🔮 What If?")
+st.write("See where your balance and goals could be if your habits change, based on your own spending history.")
+
+# Scenario controls
+col1, col2, col3, col4 = st.columns(4)
+with col1:
+    wants_cut = st.slider("Cut wants spending by (%)", 0, 100, 20, step=5)
+with col2:
+    needs_cut = st.slider("Cut needs spending by (%)", 0, 50, 0, step=5)
+with col3:
+    income_change = st.slider("Change deposits by (%)", -50, 100, 0, step=5)
+with col4:
+    horizon_label = st.selectbox("Look ahead", ["3 months", "6 months", "1 year", "2 years"], index=2)
+horizon = {"3 months": 91, "6 months": 182, "1 year": 365, "2 years": 730}[horizon_label]
+
+scenario_result = utils.run_what_if(
+    st.session_state.username, wants_cut / 100, needs_cut / 100, income_change / 100, horizon
+)
+baseline_result = utils.run_what_if(st.session_state.username, horizon=horizon)
+
+if scenario_result is None:
+    st.info(f"Track at least {simulation.MIN_HISTORY_DAYS} days of expenses and deposits to run a simulation.")
+    st.stop()
+
+# Balance outlook
+st.subheader("📈 Balance Outlook")
+final_scenario = scenario_result["balance"].iloc[-1]
+final_baseline = baseline_result["balance"].iloc[-1]
+
+metric_cols = st.columns(3)
+for metric_col, column, label in zip(metric_cols, ["p10", "p50", "p90"], ["Pessimistic", "Typical", "Optimistic"]):
+    with metric_col:
+        st.metric(
+            label=f"{label} balance in {horizon_label}",
+            value=money.format_money(final_scenario[column]),
+            delta=money.format_money(final_scenario[column] - final_baseline[column], sign=True),
+        )
+
+chart_df = (scenario_result["balance"] / 100).reset_index(names="date")
+chart_df["baseline"] = baseline_result["balance"]["p50"].to_numpy() / 100
+band = alt.Chart(chart_df).mark_area(opacity=0.25).encode(
+    x=alt.X("date:T", title="Date"),
+    y=alt.Y("p10:Q", title="Balance ($)"),
+    y2="p90:Q",
+)
+median_line = alt.Chart(chart_df).mark_line().encode(x="date:T", y="p50:Q")
+baseline_line = alt.Chart(chart_df).mark_line(strokeDash=[4, 4], color="gray").encode(x="date:T", y="baseline:Q")
+st.altair_chart(band + median_line + baseline_line, use_container_width=True)
+st.caption("Shaded: 80% of simulated outcomes. Solid line: typical outcome with your changes. Dashed: typical outcome with no changes.")
+
+# Goal outlook
+st.subheader("🎯 Goal Outlook")
+goals = scenario_result["goals"]
+if goals.empty:
+    st.info("You don't have any open savings goals. Create one in the Funds & Goals section!")
+else:
+    baseline_goals = baseline_result["goals"].set_index("id")
+    goal_table = pd.DataFrame({
+        "Goal": goals["name"],
+        "Still Needed": goals["remaining_cents"].map(money.format_money),
+        "Chance": goals["probability"],
+        "Chance Without Changes": goals["id"].map(baseline_goals["probability"]),
+        "Likely By": goals["median_date"].map(lambda d: f"{d:%B %d, %Y}" if not pd.isna(d) else "—"),
+    })
+    st.dataframe(
+        goal_table,
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "Chance": st.column_config.ProgressColumn("Chance", min_value=0.0, max_value=1.0, format="percent"),
+            "Chance Without Changes": st.column_config.ProgressColumn("Chance Without Changes", min_value=0.0, max_value=1.0, format="percent"),
+        },
+    )
+    st.caption("Each goal is judged as if all of your savings went to it.")
+
+st.caption(
+    f"Based on {scenario_result['paths']:,} simulated futures, each built from days drawn at random "
+    f"from your last {scenario_result['history_days']} days of activity."
+)
@@ -0,0 +1,329 @@
+import argparse
+import sys
+import time
+from datetime import date as date_type, timedelta
+
+import numpy as np
+import pandas as pd
+
+import database
+import storage
+
+# Recurring expense detection. Expenses are grouped per user by a normalized
+# description; each group's day intervals are tested against the common
+# billing periods all at once with pandas group operations, and groups that
+# repeat on schedule at a steady amount become recurring_series rows. Each run
+# only re-analyzes the groups that gained expenses since the user's last scan.
+
+# Billing period -> (typical days between charges, tolerance in days)
+PERIODS = {
+    "weekly": (7, 1),
+    "biweekly": (14, 2),
+    "monthly": (30.44, 3),
+    "quarterly": (91.31, 7),
+    "yearly": (365.25, 10),
+}
+PERIOD_MONTHS = {"monthly": 1, "quarterly": 3, "yearly": 12}
+
+# A group needs this many charges, this share of intervals on schedule and of
+# amounts within AMOUNT_TOLERANCE of their median to count as recurring
+MIN_OCCURRENCES = 3
+MATCH_RATIO = 0.75
+AMOUNT_TOLERANCE = 0.15
+
+# Only the most recent charges in this window are analyzed; long enough for three yearly charges
+LOOKBACK_DAYS = 800
+MAX_OCCURRENCES = 12
+
+# Users analyzed per transaction by the batch job
+DETECT_BATCH_SIZE = 500
+
+# Auto-created charges caught up per series in one go
+MAX_CATCH_UP = 12
+
+_MONTH_NAMES = r"\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\b"
+
+# ------------------------
+# Grouping and analysis
+# ------------------------
+
+def normalize(descriptions):
+    """Vectorized series key for descriptions: lowercase words with numbers, dates and month names removed."""
+    return (
+        descriptions.fillna("").str.lower()
+        .str.replace(_MONTH_NAMES, " ", regex=True)
+        .str.replace(r"[^a-z]+", " ", regex=True)
+        .str.strip()
+    )
+
+def next_occurrence(day, period, anchor_day):
+    """The charge after one on day, keeping monthly-type series on their day of the month."""
+    if period in PERIOD_MONTHS:
+        month_index = day.year * 12 + day.month - 1 + PERIOD_MONTHS[period]
+        year, month = divmod(month_index, 12)
+        month_end = (date_type(year, month + 1, 28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        return date_type(year, month + 1, min(anchor_day, month_end.day))
+    return day + timedelta(days=PERIODS[period][0])
+
+def analyze(expenses):
+    """
+    Find recurring series in expenses (user_id, key, description, amount_cents, date, category, type).
+
+    Returns (detected, analyzed): one row per recurring group with its period,
+    median amount and next expected date, and every (user_id, key) looked at.
+    """
+    df = expenses[expenses["key"] != ""].sort_values(["user_id", "key", "date"])
+    df = df[df.groupby(["user_id", "key"]).cumcount(ascending=False) < MAX_OCCURRENCES].copy()
+    analyzed = df[["user_id", "key"]].drop_duplicates()
+    grouped = df.groupby(["user_id", "key"], sort=False)
+
+    df["interval"] = grouped["date"].diff().dt.total_seconds() / 86400
+    for period, (days, tolerance) in PERIODS.items():
+        df[period] = (df["interval"] - days).abs() <= tolerance
+    median_amount = grouped["amount_cents"].transform("median")
+    df["steady"] = (df["amount_cents"] - median_amount).abs() <= median_amount * AMOUNT_TOLERANCE
+
+    stats = df.groupby(["user_id", "key"], sort=False).agg(
+        occurrences=("date", "size"),
+        last_date=("date", "max"),
+        amount_cents=("amount_cents", "median"),
+        steady=("steady", "mean"),
+        description=("description", "last"),
+        category=("category", "last"),
+        type=("type", "last"),
+        **{period: (period, "sum") for period in PERIODS},
+    )
+    intervals = (stats["occurrences"] - 1).where(stats["occurrences"] > 1)
+    on_schedule = stats[list(PERIODS)].div(intervals, axis=0).fillna(0.0)
+    stats["period"] = on_schedule.idxmax(axis=1)
+    stats["match"] = on_schedule.max(axis=1)
+
+    detected = stats[
+        (stats["occurrences"] >= MIN_OCCURRENCES)
+        & (stats["match"] >= MATCH_RATIO)
+        & (stats["steady"] >= MATCH_RATIO)
+    ].reset_index()
+    if detected.empty:
+        return detected.assign(anchor_day=pd.Series(dtype=np.int64), next_date=pd.Series(dtype=object)), analyzed
+    detected["amount_cents"] = detected["amount_cents"].round().astype(np.int64)
+    detected["last_date"] = detected["last_date"].dt.date
+    detected["anchor_day"] = [day.day for day in detected["last_date"]]
+    detected["next_date"] = [
+        next_occurrence(day, period, day.day) for day, period in zip(detected["last_date"], detected["period"])
+    ]
+    return detected, analyzed
+
+# ------------------------
+# Detection
+# ------------------------
+
+def _pending_users(conn, user_ids=None):
+    """(user_id, newest expense id) for users with expenses newer than their last scan."""
+    cursor = conn.cursor()
+    if user_ids is not None:
+        # Each user's newest id comes straight off idx_expenses_user_date
+        cursor.execute(f'''
+        SELECT e.user_id, MAX(e.id) AS last_id
+        FROM expenses e
+        WHERE e.user_id IN ({', '.join('?' * len(user_ids))})
+        GROUP BY e.user_id
+        HAVING last_id > COALESCE((SELECT last_expense_id FROM recurring_scan s WHERE s.user_id = e.user_id), 0)
+        ''', list(user_ids))
+        return cursor.fetchall()
+    cursor.execute("SELECT COALESCE(MIN(last_expense_id), 0) FROM recurring_scan")
+    # Every scanned user's watermark is at least this, and newer expenses have larger ids
+    floor = cursor.fetchone()[0]
+    cursor.execute('''
+    SELECT e.user_id, MAX(e.id)
+    FROM expenses e
+    LEFT JOIN recurring_scan s ON s.user_id = e.user_id
+    WHERE e.id > ? AND e.id > COALESCE(s.last_expense_id, 0)
+    GROUP BY e.user_id
+    ''', (floor,))
+    return cursor.fetchall()
+
+def _load_expenses(conn, user_ids, today):
+    since = (today - timedelta(days=LOOKBACK_DAYS)).isoformat()
+    placeholders = ", ".join("?" * len(user_ids))
+    df = pd.read_sql_query(
+        f'''
+        SELECT id, user_id, description, amount_cents, date, category, type
+        FROM expenses
+        WHERE user_id IN ({placeholders}) AND date >= ?
+        ''',
+        conn, params=list(user_ids) + [since]
+    )
+    df["date"] = pd.to_datetime(df["date"], format="ISO8601").dt.normalize()
+    df["key"] = normalize(df["description"])
+    return df
+
+_UPSERT_SERIES = '''
+INSERT INTO recurring_series (user_id, key, description, category, type, period, amount_cents,
+                              anchor_day, occurrences, last_date, next_date, active)
+VALUES (:user_id, :key, :description, :category, :type, :period, :amount_cents,
+        :anchor_day, :occurrences, :last_date, :next_date, 1)
+ON CONFLICT (user_id, key) DO UPDATE SET
+    description = excluded.description,
+    category = excluded.category,
+    type = excluded.type,
+    period = excluded.period,
+    amount_cents = excluded.amount_cents,
+    anchor_day = excluded.anchor_day,
+    occurrences = excluded.occurrences,
+    last_date = excluded.last_date,
+    next_date = excluded.next_date,
+    active = 1
+'''
+
+@storage.serialized_write
+def detect(conn, user_ids=None, today=None, batch_size=DETECT_BATCH_SIZE):
+    """
+    Update recurring series for users with new expenses since their last scan.
+
+    Only the description groups that gained an expense are re-analyzed; a
+    group that no longer repeats on schedule has its series deactivated.
+    Commits once per batch of users. Returns (users scanned, series detected).
+    """
+    today = today or date_type.today()
+    pending = _pending_users(conn, user_ids)
+    detected_count = 0
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        watermarks = {user_id: last_id for user_id, last_id in batch}
+        expenses = _load_expenses(conn, list(watermarks), today)
+        # Groups touched by an expense newer than the user's watermark
+        scanned = conn.execute(
+            f"SELECT user_id, last_expense_id FROM recurring_scan WHERE user_id IN ({', '.join('?' * len(batch))})",
+            list(watermarks)
+        ).fetchall()
+        previous = expenses["user_id"].map(dict(scanned)).fillna(0)
+        touched = expenses.loc[expenses["id"] > previous, ["user_id", "key"]].drop_duplicates()
+        expenses = expenses.merge(touched, on=["user_id", "key"])
+
+        detected, analyzed = analyze(expenses)
+        rows = detected[["user_id", "key", "description", "category", "type", "period", "amount_cents",
+                         "anchor_day", "occurrences", "last_date", "next_date"]].to_dict("records")
+        for row in rows:
+            row["last_date"] = row["last_date"].isoformat()
+            row["next_date"] = row["next_date"].isoformat()
+        conn.executemany(_UPSERT_SERIES, rows)
+        lapsed = analyzed.merge(detected[["user_id", "key"]], how="left", indicator=True)
+        lapsed = lapsed[lapsed["_merge"] == "left_only"]
+        conn.executemany(
+            "UPDATE recurring_series SET active = 0 WHERE user_id = ? AND key = ?",
+            lapsed[["user_id", "key"]].itertuples(index=False, name=None)
+        )
+        conn.executemany(
+            "INSERT INTO recurring_scan (user_id, last_expense_id) VALUES (?, ?) "
+            "ON CONFLICT (user_id) DO UPDATE SET last_expense_id = excluded.last_expense_id",
+            list(watermarks.items())
+        )
+        conn.commit()
+        detected_count += len(rows)
+    return len(pending), detected_count
+
+# ------------------------
+# Series
+# ------------------------
+
+def get_series(conn, user_id, today=None):
+    """
+    A user's active recurring series as a DataFrame, soonest first.
+
+    A series is marked lapsed once a whole period has passed since its
+    expected charge without one.
+    """
+    today = today or date_type.today()
+    df = pd.read_sql_query(
+        "SELECT * FROM recurring_series WHERE user_id = ? AND active ORDER BY next_date, id",
+        conn, params=[user_id]
+    )
+    if df.empty:
+        return df
+    df["auto_create"] = df["auto_create"].astype(bool)
+    next_date = pd.to_datetime(df["next_date"])
+    grace = pd.to_timedelta(df["period"].map({period: round(days) for period, (days, _) in PERIODS.items()}), unit="D")
+    df["lapsed"] = next_date + grace < pd.Timestamp(today)
+    df["next_date"] = next_date.dt.date
+    df["last_date"] = pd.to_datetime(df["last_date"]).dt.date
+    return df
+
+def set_auto_create(conn, user_id, series_id, enabled):
+    """Turn automatic creation of a series' expenses on or off."""
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE recurring_series SET auto_create = ? WHERE id = ? AND user_id = ?",
+        (int(enabled), series_id, user_id)
+    )
+    conn.commit()
+    return cursor.rowcount > 0
+
+def get_due(conn, user_id, today=None):
+    """Charges of a user's auto-created series due by today, as [(series dict, date)] oldest first."""
+    today = today or date_type.today()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT * FROM recurring_series WHERE user_id = ? AND active AND auto_create AND next_date <= ?",
+        (user_id, today.isoformat())
+    )
+    due = []
+    for row in cursor.fetchall():
+        series = dict(row)
+        day = date_type.fromisoformat(series["next_date"])
+        for _ in range(MAX_CATCH_UP):
+            if day > today:
+                break
+            due.append((series, day))
+            day = next_occurrence(day, series["period"], series["anchor_day"])
+    return sorted(due, key=lambda item: item[1])
+
+def mark_created(conn, series_id, charge_date):
+    """Advance a series past a charge that was just created. Runs in the caller's transaction."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT period, anchor_day FROM recurring_series WHERE id = ?", (series_id,))
+    period, anchor_day = cursor.fetchone()
+    cursor.execute(
+        "UPDATE recurring_series SET last_date = ?, next_date = ?, occurrences = occurrences + 1 WHERE id = ?",
+        (charge_date.isoformat(), next_occurrence(charge_date, period, anchor_day).isoformat(), series_id)
+    )
+
+def forecast(conn, user_id, start, end, today=None):
+    """
+    Expected recurring charges from start up to (not including) end.
+
+    Returns a DataFrame with one row per expected charge: series id,
+    description, category, type, date and amount_cents. Lapsed series are left out.
+    """
+    series = get_series(conn, user_id, today)
+    rows = []
+    if not series.empty:
+        for item in series[~series["lapsed"]].itertuples():
+            day = item.next_date
+            while day < end:
+                if day >= start:
+                    rows.append((item.id, item.description, item.category, item.type, day, item.amount_cents))
+                day = next_occurrence(day, item.period, item.anchor_day)
+    return pd.DataFrame(rows, columns=["series_id", "description", "category", "type", "date", "amount_cents"])
+
+# ------------------------
+# Command line interface
+# ------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Detect recurring expenses from new expenses.")
+    parser.add_argument("command", choices=["detect"])
+    parser.add_argument("--db", default=database.get_db_path(), help="SQLite database file")
+    parser.add_argument("--batch-size", type=int, default=DETECT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    conn = database.connect(args.db)
+    try:
+        started = time.perf_counter()
+        users, series = detect(conn, batch_size=args.batch_size)
+        print(f"Scanned {users} users, {series} recurring series in {time.perf_counter() - started:.2f}s")
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+import argparse
+import re
+import sys
+import time
+
+import numpy as np
+
+import archive
+import database
+
+# Full-text search over expense descriptions. expenses_fts is an external-
+# content FTS5 index on expenses.description, kept in step by triggers (see
+# database.SCHEMA); results are ranked by bm25 and filtered by the same date,
+# category and type filters as the history page, one page at a time. The
+# joins are CROSS JOINs so SQLite always drives them from the index: left to
+# itself it may walk the user's expenses and run the MATCH once per row.
+# Archived expenses are matched through archived_expenses_fts (see
+# archive.py), filtered on their mapped columns and listed after the hot
+# matches.
+
+SEARCH_PAGE_SIZE = 25
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+def to_match_query(text):
+    """
+    Turn free text into an FTS5 query: every word must match, the last as a prefix.
+
+    Words are quoted so FTS5 operators and punctuation in the input are taken
+    literally. Returns None when the text has no words.
+    """
+    words = _TOKEN.findall(text or "")
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    # The last word is probably still being typed
+    terms[-1] += "*"
+    return " ".join(terms)
+
+def _filters(user_id, start=None, end=None, category=None, expense_type=None):
+    clauses = ["e.user_id = :user_id"]
+    params = {"user_id": user_id}
+    if start is not None:
+        clauses.append("e.date >= :start")
+        params["start"] = start.isoformat()
+    if end is not None:
+        clauses.append("e.date <= :end")
+        params["end"] = end.isoformat()
+    if category is not None:
+        clauses.append("e.category = :category")
+        params["category"] = category
+    if expense_type is not None:
+        clauses.append("e.type = :type")
+        params["type"] = expense_type
+    return " AND ".join(clauses), params
+
+def _archived_match(archive_match, user_id):
+    # Scoped to the user's owner token; rank on the description column alone
+    return f'description : ({archive_match}) AND owner : "{archive.owner_token(user_id)}"'
+
+def _archived_matches(conn, user_id, match, start=None, end=None, category=None, expense_type=None):
+    """
+    The user's archive and the positions and bm25 ranks of its expenses
+    matching an FTS5 query and the filters, or None when nothing matches.
+    """
+    cold = archive.open_archive(conn, user_id)
+    if cold is None or cold["rows"] == 0:
+        return None
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT rowid, bm25(archived_expenses_fts, 1.0, 0.0) FROM archived_expenses_fts WHERE archived_expenses_fts MATCH ?",
+        (_archived_match(match, user_id),)
+    )
+    hits = cursor.fetchall()
+    if not hits:
+        return None
+    rank_by_id = dict(hits)
+    positions = archive.positions_of(cold, list(rank_by_id))
+    keep = np.ones(len(positions), dtype=bool)
+    micros = np.asarray(cold["micros"][positions])
+    if start is not None:
+        keep &= micros >= np.datetime64(start, "us").astype(np.int64)
+    if end is not None:
+        keep &= micros <= np.datetime64(end, "us").astype(np.int64)
+    for column, value in (("category", category), ("type", expense_type)):
+        if value is not None:
+            labels = cold["labels"][column]
+            if value not in labels:
+                return None
+            keep &= np.asarray(cold[column][positions]) == labels.index(value)
+    positions = positions[keep]
+    if len(positions) == 0:
+        return None
+    ranks = np.array([rank_by_id[expense_id] for expense_id in np.asarray(cold["id"][positions]).tolist()])
+    return cold, positions, ranks
+
+def search_expenses(conn, user_id, text, start=None, end=None, category=None, expense_type=None,
+                    page=0, page_size=SEARCH_PAGE_SIZE):
+    """
+    One page of a user's expenses matching text, best match first.
+
+    Archived matches follow every hot one: bm25 scores from the two indexes
+    rest on different corpus statistics, so each tier is ranked on its own.
+    Returns (rows, total): up to page_size expense dicts with their bm25 rank
+    within their tier, and the number of matches across all pages.
+    """
+    match = to_match_query(text)
+    if match is None:
+        return [], 0
+    where, params = _filters(user_id, start, end, category, expense_type)
+    params.update({"match": match, "limit": page_size, "offset": page * page_size})
+    cursor = conn.cursor()
+    cursor.execute(f'''
+    SELECT e.id, e.description, e.amount_cents, e.date, e.category, e.type, bm25(expenses_fts) AS rank
+    FROM expenses_fts
+    CROSS JOIN expenses e ON e.id = expenses_fts.rowid
+    WHERE expenses_fts MATCH :match AND {where}
+    ORDER BY rank, e.date DESC
+    LIMIT :limit OFFSET :offset
+    ''', params)
+    rows = [dict(row) for row in cursor.fetchall()]
+    cursor.execute(f'''
+    SELECT COUNT(*)
+    FROM expenses_fts
+    CROSS JOIN expenses e ON e.id = expenses_fts.rowid
+    WHERE expenses_fts MATCH :match AND {where}
+    ''', params)
+    total = cursor.fetchone()[0]
+
+    cold = _archived_matches(conn, user_id, match, start, end, category, expense_type)
+    if cold is None:
+        return rows, total
+    cold, positions, ranks = cold
+    if len(rows) < page_size:
+        # The page runs past the hot matches into the archived ones
+        first = max(page * page_size - total, 0)
+        micros = np.asarray(cold["micros"][positions])
+        # Same order as the SQL: rank, then newest first
+        order = np.lexsort((-micros, ranks))[first:first + page_size - len(rows)]
+        archived = archive.decode(cold, positions[order])
+        for expense, rank in zip(archived.itertuples(index=False), ranks[order].tolist()):
+            rows.append({
+                "id": int(expense.id),
+                "description": expense.description,
+                "amount_cents": int(expense.amount_cents),
+                "date": expense.date.isoformat(),
+                "category": expense.category,
+                "type": expense.type,
+                "rank": rank,
+            })
+    return rows, total + len(positions)
+
+def matching_ids(conn, user_id, text):
+    """Ids of all of a user's expenses matching text, archived ones included."""
+    match = to_match_query(text)
+    if match is None:
+        return set()
+    cursor = conn.cursor()
+    cursor.execute('''
+    SELECT e.id
+    FROM expenses_fts
+    CROSS JOIN expenses e ON e.id = expenses_fts.rowid
+    WHERE expenses_fts MATCH ? AND e.user_id = ?
+    ''', (match, user_id))
+    ids = {row[0] for row in cursor.fetchall()}
+    cursor.execute("SELECT rowid FROM archived_expenses_fts WHERE archived_expenses_fts MATCH ?",
+                   (_archived_match(match, user_id),))
+    return ids | {row[0] for row in cursor.fetchall()}
+
+def rebuild(conn):
+    """Rebuild the search indexes from the expenses table and the archives."""
+    conn.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+    archive.reindex(conn)
+    conn.commit()
+
+# ------------------------
+# Command line interface
+# ------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain or query the expense search index.")
+    parser.add_argument("command", choices=["rebuild", "query"])
+    parser.add_argument("text", nargs="?", help="search text (query)")
+    parser.add_argument("--db", default=database.get_db_path(), help="SQLite database file")
+    parser.add_argument("--user", help="username to search (query)")
+    args = parser.parse_args(argv)
+
+    conn = database.connect(args.db)
+    try:
+        if args.command == "rebuild":
+            started = time.perf_counter()
+            rebuild(conn)
+            print(f"Rebuilt the expense search index in {time.perf_counter() - started:.2f}s")
+            return 0
+        if not args.user or not args.text:
+            parser.error("query needs --user and search text")
+        started = time.perf_counter()
+        rows, total = search_expenses(conn, database.get_user_id(args.user, conn), args.text)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        for row in rows:
+            print(f"{row['date'][:10]}  {row['amount_cents']:>10}  {row['description']}")
+        print(f"{total} matches in {elapsed_ms:.1f} ms")
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
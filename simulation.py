@@ -0,0 +1,246 @@
+import argparse
+import sys
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import database
+import ledger
+import money
+
+# Monte Carlo what-if projections. Each path replays days sampled at random
+# from the user's own recent history (needs spending, wants spending and
+# deposits), scaled by a scenario such as "cut wants by 20%". All paths are
+# simulated at once as (paths x days) arrays, and results are cached per
+# scenario until the user's data changes.
+
+# Days of history sampled from; newer users are sampled over their whole history
+HISTORY_DAYS = 90
+MIN_HISTORY_DAYS = 7
+
+DEFAULT_PATHS = 10_000
+DEFAULT_HORIZON_DAYS = 365
+
+# Balance percentiles reported for each simulated day
+PERCENTILES = (10, 50, 90)
+
+# Fractions: wants_cut=0.2 spends 20% less on wants, income_change=0.1 deposits 10% more
+Scenario = namedtuple("Scenario", "wants_cut needs_cut income_change", defaults=(0.0, 0.0, 0.0))
+
+# (user_id, scenario, paths, horizon, seed) -> (data key, result); oldest dropped first
+_results = {}
+_results_lock = threading.Lock()
+MAX_CACHED_RESULTS = 128
+
+# ------------------------
+# History
+# ------------------------
+
+_DAILY_QUERY = '''
+SELECT date(date) AS day,
+       COALESCE(SUM(amount_cents) FILTER (WHERE type = 'Wants'), 0) AS wants_cents,
+       COALESCE(SUM(amount_cents) FILTER (WHERE type IS NOT 'Wants'), 0) AS needs_cents,
+       0 AS income_cents
+FROM expenses
+WHERE user_id = :user_id AND date >= :since
+GROUP BY day
+UNION ALL
+SELECT date(date), 0, 0, SUM(amount_cents)
+FROM fund_transactions
+WHERE user_id = :user_id AND date >= :since AND amount_cents > 0
+GROUP BY date(date)
+'''
+
+def daily_history(conn, user_id, today=None, days=HISTORY_DAYS):
+    """
+    Daily needs, wants and income totals in cents over the recent window.
+
+    Returns a DataFrame indexed by day with one row per calendar day from the
+    user's first activity in the window to yesterday, zero-filled; empty if
+    there is less than MIN_HISTORY_DAYS of it.
+    """
+    today = (today or datetime.now()).date()
+    since = today - timedelta(days=days)
+    df = pd.read_sql_query(_DAILY_QUERY, conn, params={"user_id": user_id, "since": since.isoformat()})
+    # Today is still in progress, so it would understate a typical day
+    df = df[df["day"] < today.isoformat()]
+    if df.empty:
+        return df
+    df = df.groupby("day").sum()
+    first_day = datetime.fromisoformat(df.index.min()).date()
+    if (today - first_day).days < MIN_HISTORY_DAYS:
+        return df.iloc[0:0]
+    calendar = pd.date_range(first_day, today - timedelta(days=1), freq="D").strftime("%Y-%m-%d")
+    return df.reindex(calendar, fill_value=0).astype(np.int64)
+
+def _data_key(conn, user_id, today):
+    cursor = conn.cursor()
+    cursor.execute('''
+    SELECT (SELECT MAX(id) FROM expenses WHERE user_id = :user_id),
+           (SELECT MAX(id) FROM money_movements WHERE user_id = :user_id),
+           (SELECT MAX(id) FROM goal_contributions WHERE user_id = :user_id),
+           (SELECT COUNT(*) FROM goals WHERE user_id = :user_id)
+    ''', {"user_id": user_id})
+    return tuple(cursor.fetchone()) + (today.date(),)
+
+# ------------------------
+# Simulation
+# ------------------------
+
+def simulate_paths(history, scenario, paths=DEFAULT_PATHS, horizon=DEFAULT_HORIZON_DAYS, seed=None):
+    """
+    Simulate net daily cash flow. Returns a (paths, horizon) int64 array of cumulative savings in cents.
+
+    Every simulated day is a historical day drawn with replacement, so the
+    spread of outcomes follows the user's real day-to-day variation.
+    """
+    rng = np.random.default_rng(seed)
+    # Net flow of each historical day under the scenario, then one gather for all paths
+    net = np.rint(
+        history["income_cents"].to_numpy() * (1 + scenario.income_change)
+        - history["needs_cents"].to_numpy() * (1 - scenario.needs_cut)
+        - history["wants_cents"].to_numpy() * (1 - scenario.wants_cut)
+    ).astype(np.int64)
+    days = rng.integers(0, len(net), size=(paths, horizon), dtype=np.int32)
+    return np.cumsum(net[days], axis=1)
+
+def summarize(savings, balance_cents, open_goals, today):
+    """
+    Reduce simulated savings paths to balance percentiles and goal-completion odds.
+
+    A goal counts as reached on the first day cumulative savings cover what it
+    still needs, as if every saved cent went to that goal.
+    """
+    paths, horizon = savings.shape
+    dates = pd.date_range(pd.Timestamp(today).normalize() + pd.Timedelta(days=1), periods=horizon, freq="D")
+    bands = np.percentile(savings, PERCENTILES, axis=0).T + balance_cents
+    balance = pd.DataFrame(np.rint(bands).astype(np.int64), index=dates, columns=[f"p{p}" for p in PERCENTILES])
+
+    goal_rows = []
+    if open_goals:
+        # Running peak is non-decreasing, so days below a target count the days before reaching it
+        peak = np.maximum.accumulate(savings, axis=1)
+        for goal in open_goals:
+            days_to_reach = (peak < goal["remaining_cents"]).sum(axis=1)
+            reached = days_to_reach < horizon
+            probability = reached.mean()
+            median_days = np.median(days_to_reach[reached]) if reached.any() else np.nan
+            goal_rows.append({
+                "id": goal["id"],
+                "name": goal["name"],
+                "remaining_cents": goal["remaining_cents"],
+                "probability": probability,
+                # Day index 0 is tomorrow
+                "median_date": dates[int(median_days)] if probability >= 0.5 else pd.NaT,
+                "p90_date": dates[int(np.percentile(days_to_reach, 90))] if np.percentile(days_to_reach, 90) < horizon else pd.NaT,
+            })
+    goals = pd.DataFrame(goal_rows, columns=["id", "name", "remaining_cents", "probability", "median_date", "p90_date"])
+    return {"balance": balance, "goals": goals, "paths": paths, "horizon": horizon}
+
+def run(conn, user_id, scenario=Scenario(), paths=DEFAULT_PATHS, horizon=DEFAULT_HORIZON_DAYS, seed=0, today=None):
+    """
+    Project a user's balance and goals under a scenario, cached until their data changes.
+
+    Returns a dict with "balance" (daily percentile bands), "goals" (completion
+    probability and dates per open goal) and "history_days", or None when
+    there isn't enough history to sample from.
+    """
+    today = today or datetime.now()
+    cache_key = (user_id, Scenario(*scenario), paths, horizon, seed)
+    data_key = _data_key(conn, user_id, today)
+    with _results_lock:
+        cached = _results.get(cache_key)
+        if cached is not None and cached[0] == data_key:
+            return cached[1]
+
+    history = daily_history(conn, user_id, today)
+    if history.empty:
+        result = None
+    else:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id, name, target_cents - current_cents AS remaining_cents FROM goals WHERE user_id = ? AND current_cents < target_cents ORDER BY id",
+            (user_id,)
+        )
+        open_goals = [dict(row) for row in cursor.fetchall()]
+        savings = simulate_paths(history, Scenario(*scenario), paths, horizon, seed)
+        result = summarize(savings, ledger.get_balance(conn, user_id), open_goals, today)
+        result["history_days"] = len(history)
+
+    with _results_lock:
+        _results.pop(cache_key, None)
+        _results[cache_key] = (data_key, result)
+        while len(_results) > MAX_CACHED_RESULTS:
+            del _results[next(iter(_results))]
+    return result
+
+# ------------------------
+# Benchmark
+# ------------------------
+
+def benchmark(paths=DEFAULT_PATHS, horizon=DEFAULT_HORIZON_DAYS, goal_count=5, repeats=5):
+    """Time simulate_paths and summarize on synthetic history. Returns the best times in milliseconds."""
+    rng = np.random.default_rng(1)
+    history = pd.DataFrame({
+        "wants_cents": rng.integers(0, 5000, HISTORY_DAYS),
+        "needs_cents": rng.integers(0, 8000, HISTORY_DAYS),
+        "income_cents": np.where(rng.random(HISTORY_DAYS) < 1 / 14, 150000, 0),
+    })
+    goals = [{"id": i, "name": f"Goal {i}", "remaining_cents": 50000 * (i + 1)} for i in range(goal_count)]
+    simulate_ms = summarize_ms = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        savings = simulate_paths(history, Scenario(wants_cut=0.2), paths, horizon)
+        simulated = time.perf_counter()
+        summarize(savings, 100000, goals, datetime.now())
+        finished = time.perf_counter()
+        simulate_ms = min(simulate_ms, (simulated - started) * 1000)
+        summarize_ms = min(summarize_ms, (finished - simulated) * 1000)
+    return simulate_ms, summarize_ms
+
+# ------------------------
+# Command line interface
+# ------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run or benchmark what-if balance simulations.")
+    parser.add_argument("command", choices=["run", "bench"])
+    parser.add_argument("--db", default=database.get_db_path(), help="SQLite database file")
+    parser.add_argument("--user", help="username to simulate (run)")
+    parser.add_argument("--wants-cut", type=float, default=0.0, help="fraction of wants spending cut, e.g. 0.2")
+    parser.add_argument("--needs-cut", type=float, default=0.0)
+    parser.add_argument("--income-change", type=float, default=0.0)
+    parser.add_argument("--paths", type=int, default=DEFAULT_PATHS)
+    parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON_DAYS, help="days to simulate")
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        simulate_ms, summarize_ms = benchmark(args.paths, args.horizon)
+        print(f"{args.paths} paths x {args.horizon} days: simulate {simulate_ms:.1f} ms, summarize {summarize_ms:.1f} ms")
+        return 0
+
+    if not args.user:
+        parser.error("run needs --user")
+    conn = database.connect(args.db)
+    try:
+        user_id = database.get_user_id(args.user, conn)
+        scenario = Scenario(args.wants_cut, args.needs_cut, args.income_change)
+        result = run(conn, user_id, scenario, args.paths, args.horizon)
+        if result is None:
+            print(f"Not enough history to simulate (need {MIN_HISTORY_DAYS} days)")
+            return 1
+        final = result["balance"].iloc[-1]
+        print(f"Balance in {args.horizon} days: " + ", ".join(f"{column} {money.format_money(final[column])}" for column in final.index))
+        for goal in result["goals"].itertuples():
+            when = f"median {goal.median_date:%Y-%m-%d}" if not pd.isna(goal.median_date) else "unlikely"
+            print(f"{goal.name}: {goal.probability:.0%} within horizon, {when}")
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+import argparse
+import functools
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+# ------------------------
+# Connection settings
+# ------------------------
+
+# How long SQLite itself waits on a locked database before raising
+BUSY_TIMEOUT_MS = 5000
+
+# Negative cache_size is in KiB: roughly 20 MB of page cache per connection
+CACHE_SIZE_KIB = 20000
+
+# Retry policy for writes that still hit "database is locked" after the busy timeout
+WRITE_RETRIES = 5
+WRITE_BACKOFF_S = 0.05
+WRITE_BACKOFF_MAX_S = 1.0
+
+PRAGMAS = {
+    # WAL lets readers keep reading while a single writer appends
+    "journal_mode": "WAL",
+    # NORMAL is durable across application crashes in WAL mode and avoids an fsync per commit
+    "synchronous": "NORMAL",
+    "busy_timeout": BUSY_TIMEOUT_MS,
+    "cache_size": -CACHE_SIZE_KIB,
+    "temp_store": "MEMORY",
+}
+
+def configure(conn, foreign_keys=False):
+    """Apply the storage pragmas to an open connection."""
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    if foreign_keys:
+        conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+def connect(db_path, row_factory=None, foreign_keys=False):
+    """Open a SQLite connection configured for concurrent Streamlit sessions."""
+    conn = sqlite3.connect(db_path, check_same_thread=False, timeout=BUSY_TIMEOUT_MS / 1000)
+    if row_factory is not None:
+        conn.row_factory = row_factory
+    return configure(conn, foreign_keys)
+
+# ------------------------
+# Serialized writer
+# ------------------------
+
+# One writer at a time per process; SQLite allows only one anyway, and queueing
+# here is cheaper than having sessions spin on the file lock.
+_write_lock = threading.RLock()
+_write_state = threading.local()
+
+def _is_lock_error(error):
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+# Callables returning a thread's open connections (see register_connections)
+_connection_sources = []
+
+def register_connections(source):
+    """Register a callable returning this thread's cached connections, rolled back before a write is retried."""
+    _connection_sources.append(source)
+
+def _roll_back(args, kwargs):
+    # A failed attempt's statements must not ride along into the retry
+    connections = [value for value in (*args, *kwargs.values()) if isinstance(value, sqlite3.Connection)]
+    for source in _connection_sources:
+        connections.extend(source())
+    for conn in connections:
+        if conn.in_transaction:
+            conn.rollback()
+
+def in_write():
+    """Whether this thread is inside a serialized_write call."""
+    return getattr(_write_state, "depth", 0) > 0
+
+def serialized_write(func):
+    """
+    Run a write function under the process-wide writer lock, retrying with
+    exponential backoff and jitter when the database is locked by another process.
+
+    Nested calls reuse the outer lock and only the outermost call retries,
+    after rolling back the failed attempt on the connections passed in and
+    the thread's registered ones.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        depth = getattr(_write_state, "depth", 0)
+        if depth:
+            _write_state.depth = depth + 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _write_state.depth = depth
+
+        delay = WRITE_BACKOFF_S
+        for attempt in range(WRITE_RETRIES + 1):
+            with _write_lock:
+                _write_state.depth = 1
+                try:
+                    return func(*args, **kwargs)
+                except sqlite3.OperationalError as e:
+                    if not _is_lock_error(e) or attempt == WRITE_RETRIES:
+                        raise
+                    _roll_back(args, kwargs)
+                finally:
+                    _write_state.depth = 0
+            time.sleep(delay * (1 + random.random()))
+            delay = min(delay * 2, WRITE_BACKOFF_MAX_S)
+    return wrapper
+
+# ------------------------
+# Load test
+# ------------------------
+
+def load_test(db_path, writers=4, readers=8, seconds=5.0, wal=True):
+    """
+    Hammer a scratch database with concurrent writer and reader threads.
+
+    Returns a dict of throughput, read latency percentiles and error counts.
+    """
+    if wal:
+        setup = connect(db_path)
+    else:
+        setup = sqlite3.connect(db_path, check_same_thread=False)
+    setup.execute('''
+    CREATE TABLE IF NOT EXISTS expenses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL,
+        description TEXT NOT NULL,
+        amount REAL NOT NULL,
+        date TEXT NOT NULL
+    )
+    ''')
+    setup.commit()
+    setup.close()
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    stats = {"writes": 0, "reads": 0, "write_errors": 0, "read_errors": 0}
+    read_latencies = []
+
+    def open_conn():
+        if wal:
+            return connect(db_path)
+        return sqlite3.connect(db_path, check_same_thread=False)
+
+    def writer(worker_id):
+        conn = open_conn()
+
+        def insert():
+            conn.execute(
+                "INSERT INTO expenses (username, description, amount, date) VALUES (?, ?, ?, datetime('now'))",
+                (f"user{worker_id}", "load test", random.uniform(1, 100))
+            )
+            conn.commit()
+
+        write = serialized_write(insert) if wal else insert
+        while not stop.is_set():
+            try:
+                write()
+                with lock:
+                    stats["writes"] += 1
+            except sqlite3.OperationalError:
+                conn.rollback()
+                with lock:
+                    stats["write_errors"] += 1
+
+    def reader(worker_id):
+        conn = open_conn()
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                conn.execute(
+                    "SELECT COUNT(*), SUM(amount) FROM expenses WHERE username = ?",
+                    (f"user{worker_id % max(writers, 1)}",)
+                ).fetchone()
+                elapsed = time.perf_counter() - start
+                with lock:
+                    stats["reads"] += 1
+                    read_latencies.append(elapsed)
+            except sqlite3.OperationalError:
+                with lock:
+                    stats["read_errors"] += 1
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    read_latencies.sort()
+    def percentile(p):
+        if not read_latencies:
+            return 0.0
+        return read_latencies[min(int(len(read_latencies) * p), len(read_latencies) - 1)] * 1000
+
+    return {
+        "writes_per_s": stats["writes"] / seconds,
+        "reads_per_s": stats["reads"] / seconds,
+        "read_p50_ms": percentile(0.50),
+        "read_p99_ms": percentile(0.99),
+        "write_errors": stats["write_errors"],
+        "read_errors": stats["read_errors"],
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SQLite storage tools.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    bench = subparsers.add_parser("loadtest", help="Concurrent read/write load test on a scratch database")
+    bench.add_argument("--writers", type=int, default=4)
+    bench.add_argument("--readers", type=int, default=8)
+    bench.add_argument("--seconds", type=float, default=5.0)
+    bench.add_argument("--compare", action="store_true", help="Also run with the default rollback journal")
+    args = parser.parse_args(argv)
+
+    modes = [True, False] if args.compare else [True]
+    for wal in modes:
+        with tempfile.TemporaryDirectory() as tmp:
+            result = load_test(os.path.join(tmp, "loadtest.db"), args.writers, args.readers, args.seconds, wal)
+        label = "WAL + serialized writer" if wal else "rollback journal"
+        print(f"{label}: " + ", ".join(
+            f"{key}={value:.1f}" if isinstance(value, float) else f"{key}={value}"
+            for key, value in result.items()
+        ))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
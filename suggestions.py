@@ -0,0 +1,151 @@
+import argparse
+import bisect
+import heapq
+import sys
+import threading
+import time
+
+import database
+import money
+
+# Description autocomplete. Each user's distinct descriptions are kept in a
+# sorted list of normalized keys, so the descriptions starting with what has
+# been typed so far are one bisect away. Every entry remembers how often it
+# was used and the category, type and amount it had last time, which lets a
+# picked suggestion be entered without asking the classifier. An index is
+# built on the user's first lookup and then updated as expenses are added.
+
+# Suggestions offered for a prefix, most used first
+MAX_SUGGESTIONS = 5
+
+# user_id -> (sorted normalized keys, {key: entry}); least recently used dropped first
+_indexes = {}
+_indexes_lock = threading.Lock()
+MAX_CACHED_INDEXES = 256
+
+def normalize(description):
+    """Key a description is indexed under: case-folded, whitespace collapsed."""
+    return " ".join((description or "").casefold().split())
+
+def _merge(entries, description, count, category, expense_type, amount_cents, date):
+    key = normalize(description)
+    if not key:
+        return None
+    entry = entries.get(key)
+    if entry is None:
+        entries[key] = {
+            "description": description.strip(),
+            "count": count,
+            "category": category,
+            "type": expense_type,
+            "amount_cents": amount_cents,
+            "date": date,
+        }
+        return key
+    entry["count"] += count
+    # The newest use decides the spelling and the details offered
+    if date >= entry["date"]:
+        entry.update(description=description.strip(), category=category, type=expense_type,
+                     amount_cents=amount_cents, date=date)
+    return None
+
+def build(conn, user_id):
+    """Build a user's index from their expenses: (sorted keys, {key: entry})."""
+    cursor = conn.cursor()
+    # Bare columns come from the row with MAX(date), i.e. the latest use
+    cursor.execute('''
+    SELECT description, COUNT(*) AS count, category, type, amount_cents, MAX(date) AS date
+    FROM expenses
+    WHERE user_id = ?
+    GROUP BY description
+    ''', (user_id,))
+    entries = {}
+    for row in cursor.fetchall():
+        _merge(entries, row[0], row[1], row[2], row[3], row[4], row[5])
+    return sorted(entries), entries
+
+def _get_index(conn, user_id):
+    with _indexes_lock:
+        index = _indexes.pop(user_id, None)
+        if index is not None:
+            # Reinserted as the most recently used
+            _indexes[user_id] = index
+            return index
+    index = build(conn, user_id)
+    with _indexes_lock:
+        # Another session may have built it meanwhile; keep the first one
+        index = _indexes.setdefault(user_id, index)
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            del _indexes[next(iter(_indexes))]
+        return index
+
+def record(user_id, description, amount_cents, date, category, expense_type):
+    """Add a committed expense to the user's index, if it has been built."""
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is None:
+            return
+        keys, entries = index
+        key = _merge(entries, description, 1, category, expense_type, int(amount_cents), date.isoformat())
+        if key is not None:
+            bisect.insort(keys, key)
+
+def clear(user_id=None):
+    """Drop one user's index, or all of them, so the next lookup rebuilds it."""
+    with _indexes_lock:
+        if user_id is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(user_id, None)
+
+def suggest(conn, user_id, prefix, limit=MAX_SUGGESTIONS):
+    """The user's most used descriptions starting with prefix, as entry dicts."""
+    prefix = normalize(prefix)
+    if not prefix:
+        return []
+    keys, entries = _get_index(conn, user_id)
+    with _indexes_lock:
+        start = bisect.bisect_left(keys, prefix)
+        # Every key with the prefix sorts before prefix + the largest code point
+        end = bisect.bisect_left(keys, prefix + "\U0010ffff", start)
+        matches = heapq.nlargest(limit, (entries[key] for key in keys[start:end]),
+                                 key=lambda entry: (entry["count"], entry["date"]))
+        return [dict(entry) for entry in matches]
+
+def lookup(conn, user_id, description):
+    """The entry for a description the user has entered before, or None."""
+    keys, entries = _get_index(conn, user_id)
+    with _indexes_lock:
+        entry = entries.get(normalize(description))
+        return dict(entry) if entry else None
+
+# ------------------------
+# Command line interface
+# ------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query or time a user's description suggestions.")
+    parser.add_argument("prefix", help="text typed so far")
+    parser.add_argument("--db", default=database.get_db_path(), help="SQLite database file")
+    parser.add_argument("--user", required=True, help="username to suggest for")
+    args = parser.parse_args(argv)
+
+    conn = database.connect(args.db)
+    try:
+        user_id = database.get_user_id(args.user, conn)
+        started = time.perf_counter()
+        keys, _ = _get_index(conn, user_id)
+        build_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        matches = suggest(conn, user_id, args.prefix)
+        suggest_ms = (time.perf_counter() - started) * 1000
+        for entry in matches:
+            print(f"{entry['description']}  ({entry['count']}x, last {money.format_money(entry['amount_cents'])}, "
+                  f"{entry['category']}/{entry['type']})")
+        print(f"Indexed {len(keys)} descriptions in {build_ms:.1f} ms; suggested in {suggest_ms:.2f} ms")
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import archive
+import columnar
+import database
+import goals
+import outbox
+import simulation
+import suggestions
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Point the application at a fresh database file (and archive directory) under tmp_path."""
+    path = str(tmp_path / "pfm.db")
+    monkeypatch.setattr(database, "get_db_path", lambda: path)
+    # Side effects are applied with outbox.drain, not by the background worker
+    monkeypatch.setattr(outbox, "start_worker", lambda: None)
+    # Process caches are keyed on user ids and data versions, which repeat across fresh databases
+    for module, cache in [(database, "_user_ids"), (columnar, "_stores"), (archive, "_frames"),
+                          (goals, "_projections"), (simulation, "_results"), (suggestions, "_indexes")]:
+        monkeypatch.setattr(module, cache, {})
+    yield path
+    connections = database._connections.__dict__.get("by_path", {})
+    conn = connections.pop(path, None)
+    if conn is not None:
+        conn.close()
+
+@pytest.fixture
+def conn(db_path):
+    """This thread's connection to the test database."""
+    return database.get_db()
+
+@pytest.fixture
+def user(conn):
+    """A user with a funded balance; returns (username, user_id)."""
+    import utils
+
+    database.create_user("alice", "hash")
+    utils.add_funds("alice", 100_000)
+    return "alice", database.get_user_id("alice", conn)
@@ -0,0 +1,32 @@
+import pytest
+
+from allocation import _split
+
+def test_split_is_proportional_and_exact():
+    assert _split(1_000, [50, 30, 20], [10_000] * 3).tolist() == [500, 300, 200]
+    shares = _split(100, [1, 1, 1], [10_000] * 3)
+    # The cent lost to flooring goes to a largest remainder
+    assert shares.sum() == 100
+    assert sorted(shares.tolist()) == [33, 33, 34]
+
+def test_split_hands_capped_overflow_to_the_others():
+    shares = _split(1_000, [1, 1, 1], [100, 10_000, 10_000])
+    assert shares.tolist() == [100, 450, 450]
+
+def test_split_never_exceeds_caps():
+    shares = _split(1_000, [5, 3, 2], [50, 60, 70])
+    assert shares.tolist() == [50, 60, 70]
+
+def test_split_skips_unweighted_and_full_goals():
+    shares = _split(900, [0, 1, 2], [1_000, 0, 1_000])
+    assert shares.tolist() == [0, 0, 900]
+    assert _split(500, [0, 0], [100, 100]).tolist() == [0, 0]
+
+@pytest.mark.parametrize("pool", [1, 7, 999, 123_457])
+def test_split_conserves_cents(pool):
+    weights = [3.2, 0.7, 11.0, 1.0]
+    caps = [40_000, 5, 90_000, 20_000]
+    shares = _split(pool, weights, caps)
+    assert shares.sum() == min(pool, sum(caps))
+    assert (shares <= caps).all()
+    assert (shares >= 0).all()
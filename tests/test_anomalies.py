@@ -0,0 +1,37 @@
+import math
+import random
+
+import pytest
+
+import anomalies
+
+def test_incremental_updates_match_backfill(conn, user):
+    _, user_id = user
+    rng = random.Random(7)
+    amounts = {"Food": [rng.randint(200, 5_000) for _ in range(40)], "": [rng.randint(1, 90_000) for _ in range(15)]}
+    cursor = conn.cursor()
+    for category, values in amounts.items():
+        for amount in values:
+            cursor.execute(
+                "INSERT INTO expenses (user_id, description, amount_cents, date, category, type) VALUES (?, ?, ?, ?, ?, ?)",
+                (user_id, "x", amount, "2026-01-01T12:00:00", category or None, "Needs")
+            )
+            anomalies.record(conn, user_id, category or None, amount)
+    conn.commit()
+    incremental = {category: anomalies.get_stats(conn, user_id, category) for category in amounts}
+
+    anomalies.backfill(conn)
+    for category, values in amounts.items():
+        count, mean, m2 = anomalies.get_stats(conn, user_id, category)
+        logs = [math.log(amount) for amount in values]
+        assert count == incremental[category][0] == len(values)
+        assert mean == pytest.approx(incremental[category][1]) == pytest.approx(sum(logs) / len(logs))
+        assert m2 == pytest.approx(incremental[category][2])
+
+def test_outlier_is_flagged(conn, user):
+    _, user_id = user
+    for amount in [1_000, 1_100, 950, 1_050, 1_000, 980, 1_020]:
+        anomalies.record(conn, user_id, "Food", amount)
+    conn.commit()
+    assert not anomalies.score(conn, user_id, "Food", 1_000)["flagged"]
+    assert anomalies.score(conn, user_id, "Food", 50_000)["flagged"]
@@ -0,0 +1,121 @@
+import os
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+
+import archive
+import export
+import search
+import utils
+
+TODAY = date(2026, 10, 18)
+
+def _add_history(conn, username, user_id):
+    start = datetime(2023, 1, 2, 8, 30, 15, 123456)
+    for i in range(60):
+        when = start + timedelta(days=20 * i, minutes=i)
+        category = ["Other", "Food", "Travel"][i % 3]
+        utils.add_expense(username, f"Trip {i} café", 1_000 + i, when, category, "Wants" if i % 2 else "Needs")
+    # Rows from before classification was required
+    conn.execute(
+        "INSERT INTO expenses (user_id, description, amount_cents, date, category, type) VALUES (?, ?, ?, ?, NULL, NULL)",
+        (user_id, "Unsorted café", 999, "2023-02-01T10:00:00")
+    )
+    conn.commit()
+
+def _hot_rows(conn, user_id):
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT id, description, amount_cents, date, category, type FROM expenses WHERE user_id = ? ORDER BY date, id",
+        (user_id,)
+    )
+    return [tuple(row) for row in cursor.fetchall()]
+
+def test_archive_round_trip(conn, user):
+    username, user_id = user
+    _add_history(conn, username, user_id)
+    before = _hot_rows(conn, user_id)
+    exported = list(export.iter_rows(conn, "expenses", user_id))
+    matches = search.matching_ids(conn, user_id, "café")
+
+    users, moved = archive.run(conn, today=TODAY)
+    cutoff = archive.cutoff(TODAY).isoformat()
+    assert (users, moved) == (1, sum(row[3] < cutoff for row in before))
+    assert 0 < moved < len(before)
+
+    cold = archive.open_archive(conn, user_id)
+    assert cold["rows"] == moved and cold["ordered"]
+    frame = archive.to_frame(cold)
+    frame["date"] = [value.isoformat() for value in frame["date"]]
+    restored = [tuple(row) for row in frame.astype(object).itertuples(index=False, name=None)]
+    assert restored + _hot_rows(conn, user_id) == before
+
+    # Readers see the same history as before the move
+    assert list(export.iter_rows(conn, "expenses", user_id, batch_size=7)) == exported
+    assert search.matching_ids(conn, user_id, "café") == matches
+    expenses = utils.get_user_expenses(username)
+    assert [expense["id"] for expense in expenses[:moved]] == [row[0] for row in before[:moved]]
+    assert sorted(expense["id"] for expense in expenses) == sorted(row[0] for row in before)
+    assert all(isinstance(expense["date"], datetime) for expense in expenses)
+
+def test_archive_rerun_and_late_expense(conn, user):
+    username, user_id = user
+    _add_history(conn, username, user_id)
+    archive.run(conn, today=TODAY)
+    assert archive.run(conn, today=TODAY) == (0, 0)
+
+    # An expense dated inside the archived months lands out of order
+    utils.add_expense(username, "Late receipt", 777, datetime(2023, 3, 1, 9), "Food", "Needs")
+    assert archive.run(conn, today=TODAY) == (1, 1)
+    cold = archive.open_archive(conn, user_id)
+    assert not cold["ordered"]
+    frames = list(archive.iter_frames(cold, batch_size=4))
+    micros = np.concatenate([frame["date"].to_numpy("datetime64[us]").astype(np.int64) for frame in frames])
+    assert sum(len(frame) for frame in frames) == cold["rows"]
+    assert (np.diff(micros) >= 0).all()
+
+def _visible_ids(conn, username, user_id):
+    return sorted(expense["id"] for expense in utils.get_user_expenses(username))
+
+def test_failed_delete_leaves_rows_only_in_sqlite(conn, user, monkeypatch):
+    username, user_id = user
+    _add_history(conn, username, user_id)
+    ids = _visible_ids(conn, username, user_id)
+
+    def fail(*args):
+        raise RuntimeError("crashed before the delete")
+    with monkeypatch.context() as patch:
+        patch.setattr(archive, "_index", fail)
+        with pytest.raises(RuntimeError):
+            archive.run(conn, today=TODAY)
+    conn.rollback()
+    # Appended under a pending manifest that readers ignore
+    assert archive.open_archive(conn, user_id) is None
+    assert _visible_ids(conn, username, user_id) == ids
+
+    users, moved = archive.run(conn, today=TODAY)
+    assert moved > 0
+    assert archive.open_archive(conn, user_id)["rows"] == moved
+    assert _visible_ids(conn, username, user_id) == ids
+
+def test_unpublished_manifest_counts_once_committed(conn, user, monkeypatch):
+    username, user_id = user
+    _add_history(conn, username, user_id)
+    ids = _visible_ids(conn, username, user_id)
+
+    def fail(*args):
+        raise RuntimeError("crashed before publishing")
+    with monkeypatch.context() as patch:
+        patch.setattr(archive, "_settle", fail)
+        with pytest.raises(RuntimeError):
+            archive.run(conn, today=TODAY)
+    cold = archive.open_archive(conn, user_id)
+    assert cold is not None and cold["rows"] > 0
+    assert _visible_ids(conn, username, user_id) == ids
+
+    # The next run publishes it
+    archive.run(conn, today=TODAY)
+    directory = os.path.join(archive.archive_root(conn), str(user_id))
+    assert not os.path.exists(os.path.join(directory, archive.PENDING_FILE))
+    assert archive.open_archive(conn, user_id)["rows"] == cold["rows"]
@@ -0,0 +1,82 @@
+from datetime import date, datetime
+
+import pytest
+
+import budgets
+import database
+import utils
+
+def test_period_start_honours_the_week_start():
+    wednesday = date(2026, 3, 4)
+    assert budgets.period_start(wednesday) == date(2026, 3, 2)
+    assert budgets.period_start(wednesday, week_start=6) == date(2026, 3, 1)
+    assert budgets.period_start(datetime(2026, 3, 4, 23, 59), "month") == date(2026, 3, 1)
+    assert budgets.next_period_start(date(2026, 1, 1), "month") == date(2026, 2, 1)
+    assert budgets.previous_period_start(date(2026, 3, 1), "month") == date(2026, 2, 1)
+
+def test_wants_budget_is_seeded_at_registration(conn, user):
+    _, user_id = user
+    budget_id = budgets.get_wants_budget_id(conn, user_id)
+    assert budget_id is not None
+    assert budgets.get_budget(conn, budget_id)["limit_cents"] == 10_000
+
+def test_reading_the_wants_budget_does_not_write(conn, user):
+    username, _ = user
+    before = conn.total_changes
+    utils.get_wants_budget_status(username)
+    utils.get_wants_budget_history(username)
+    assert conn.total_changes == before
+
+def test_startup_seeds_a_missing_wants_budget(conn, user):
+    _, user_id = user
+    budget_id = budgets.get_wants_budget_id(conn, user_id)
+    conn.execute("DELETE FROM budget_periods WHERE budget_id = ?", (budget_id,))
+    conn.execute("DELETE FROM budgets WHERE id = ?", (budget_id,))
+    conn.commit()
+    database.initialize_db(conn)
+    assert budgets.get_wants_budget_id(conn, user_id) is not None
+
+def test_counters_match_a_rebuild_and_follow_period_changes(conn, user):
+    username, user_id = user
+    budget_id = budgets.get_wants_budget_id(conn, user_id)
+    today = datetime(2026, 3, 18, 12, 0)
+    for day, amount, expense_type in [(2, 1_000, "Wants"), (9, 2_500, "Wants"), (10, 700, "Needs"),
+                                      (16, 400, "Wants"), (18, 600, "Wants")]:
+        utils.add_expense(username, "Thing", amount, datetime(2026, 3, day, 9, 0), "Other", expense_type)
+
+    budget = budgets.get_budget(conn, budget_id, today)
+    assert (budget["period_start"], budget["spent_cents"], budget["remaining_cents"]) == (date(2026, 3, 16), 1_000, 9_000)
+    history = budgets.get_history(conn, budget_id, 4, today)
+    assert history == [(date(2026, 2, 23), 0), (date(2026, 3, 2), 1_000), (date(2026, 3, 9), 2_500), (date(2026, 3, 16), 1_000)]
+
+    budgets.rebuild(conn, budget_id=budget_id)
+    assert budgets.get_history(conn, budget_id, 4, today) == history
+
+    assert budgets.set_period(conn, budget_id, "month", today=today)
+    assert budgets.get_budget(conn, budget_id, today)["spent_cents"] == 4_500
+    with pytest.raises(ValueError):
+        budgets.set_period(conn, budget_id, "fortnight")
+
+def test_envelope_rollover_and_status(conn, user):
+    username, user_id = user
+    food = budgets.create_envelope(conn, user_id, "Food", 10_000, today=datetime(2026, 1, 10))
+    fun = budgets.create_envelope(conn, user_id, "Fun", 5_000, rollover=False, today=datetime(2026, 1, 10))
+    assert budgets.create_envelope(conn, user_id, "Food", 1, today=datetime(2026, 1, 10)) is None
+
+    for when, amount, category in [(datetime(2026, 1, 12), 3_000, "Food"), (datetime(2026, 2, 3), 15_000, "Food"),
+                                   (datetime(2026, 3, 2), 10_000, "Food"), (datetime(2026, 3, 2), 6_000, "Fun")]:
+        utils.add_expense(username, "Spend", amount, when, category, "Wants")
+
+    march = datetime(2026, 3, 5)
+    envelopes = budgets.evaluate_envelopes(conn, user_id, march).set_index("id")
+    assert envelopes.loc[food, ["carried_cents", "available_cents", "spent_cents", "remaining_cents"]].tolist() == [2_000, 12_000, 10_000, 2_000]
+    assert envelopes.loc[food, "status"] == "warning"
+    assert envelopes.loc[fun, ["carried_cents", "remaining_cents", "status"]].tolist() == [0, -1_000, "over"]
+
+    # A new limit applies from this period on; the carried balance is kept
+    budgets.set_limit(conn, food, 20_000, today=march)
+    food_row = budgets.evaluate_envelopes(conn, user_id, march).set_index("id").loc[food]
+    assert (food_row["carried_cents"], food_row["available_cents"], food_row["status"]) == (2_000, 22_000, "ok")
+
+    assert budgets.delete_budget(conn, user_id, fun)
+    assert budgets.evaluate_envelopes(conn, user_id, march)["id"].tolist() == [food]
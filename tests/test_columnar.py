@@ -0,0 +1,89 @@
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+import archive
+import columnar
+import utils
+
+START = datetime(2026, 2, 1, 8, 0)
+
+def _add_expenses(conn, username, user_id, count, start=START):
+    for i in range(count):
+        utils.add_expense(username, f"Item {i}", 100 + 37 * i, start + timedelta(hours=13 * i),
+                          ["Food", "Travel", "Bills"][i % 3], "Wants" if i % 2 else "Needs")
+    # A row from before classification was required
+    conn.execute(
+        "INSERT INTO expenses (user_id, description, amount_cents, date, category, type) VALUES (?, 'Old', 999, ?, NULL, NULL)",
+        (user_id, (start + timedelta(hours=5)).isoformat())
+    )
+    conn.commit()
+
+def _frame(conn, user_id):
+    df = pd.read_sql_query("SELECT date, amount_cents, category, type FROM expenses WHERE user_id = ?", conn, params=(user_id,))
+    df["date"] = pd.to_datetime(df["date"], format="ISO8601")
+    return df
+
+def _reductions(store):
+    return (
+        columnar.total_between(store, START + timedelta(days=2), START + timedelta(days=9)),
+        columnar.daily_totals(store, START.date(), 14).tolist(),
+        columnar.totals_by(store, "category"),
+        columnar.totals_by(store, "type"),
+    )
+
+def test_reductions_match_pandas(conn, user):
+    username, user_id = user
+    _add_expenses(conn, username, user_id, 40)
+    store = columnar.get_store(conn, user_id)
+    df = _frame(conn, user_id)
+
+    low, high = START + timedelta(days=2), START + timedelta(days=9)
+    assert columnar.total_between(store, low, high) == df.loc[df["date"].between(low, high), "amount_cents"].sum()
+    daily = df[df["date"] >= START.replace(hour=0)].groupby(df["date"].dt.date)["amount_cents"].sum()
+    days = [START.date() + timedelta(days=i) for i in range(14)]
+    assert columnar.daily_totals(store, START.date(), 14).tolist() == [int(daily.get(day, 0)) for day in days]
+    assert columnar.totals_by(store, "category") == df.groupby("category")["amount_cents"].sum().to_dict()
+    assert columnar.totals_by(store, "type") == df.groupby("type")["amount_cents"].sum().to_dict()
+
+def test_appends_grow_the_store_in_place(conn, user, monkeypatch):
+    monkeypatch.setattr(columnar, "INITIAL_CAPACITY", 2)
+    username, user_id = user
+    store = columnar.get_store(conn, user_id)
+    assert store["size"] == 0 and len(store["cents"]) == 2
+    _add_expenses(conn, username, user_id, 9)
+
+    # Raw inserts don't bump the expense counter, so the appended store is still current
+    assert columnar.get_store(conn, user_id) is store
+    assert store["size"] == 9 and len(store["cents"]) >= 9
+    rebuilt = columnar.build(conn, user_id)
+    # The raw row is only in the rebuilt store
+    assert rebuilt["size"] == 10
+    assert columnar.totals_by(rebuilt, "category") == columnar.totals_by(store, "category")
+
+def test_outside_writes_trigger_a_rebuild(conn, user):
+    username, user_id = user
+    _add_expenses(conn, username, user_id, 3)
+    store = columnar.get_store(conn, user_id)
+    conn.execute("UPDATE user_counters SET expense_count = expense_count + 1 WHERE user_id = ?", (user_id,))
+    conn.commit()
+    assert columnar.get_store(conn, user_id) is not store
+
+def test_store_cache_drops_the_oldest(conn, monkeypatch):
+    monkeypatch.setattr(columnar, "MAX_CACHED_STORES", 2)
+    for user_id in (1, 2, 3):
+        columnar.get_store(conn, user_id)
+    assert list(columnar._stores) == [2, 3]
+
+def test_archived_expenses_are_still_counted(conn, user):
+    username, user_id = user
+    _add_expenses(conn, username, user_id, 20, start=datetime(2023, 5, 1, 8, 0))
+    _add_expenses(conn, username, user_id, 20)
+    before = _reductions(columnar.build(conn, user_id))
+    _, moved = archive.run(conn, today=date(2026, 10, 18))
+    assert moved == 21
+
+    store = columnar.get_store(conn, user_id)
+    assert store["archive"] is not None and store["size"] == 21
+    assert _reductions(store) == before
+    assert columnar.nbytes(store) == sum(store[column].nbytes for column in columnar.COLUMNS)
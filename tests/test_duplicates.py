@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+
+import duplicates
+import utils
+
+# A moment just before a bucket boundary
+BOUNDARY = datetime(2026, 3, 1, 12, 0)
+assert duplicates._bucket(BOUNDARY) != duplicates._bucket(BOUNDARY - timedelta(seconds=1))
+
+def test_bucket_width():
+    start = BOUNDARY
+    assert duplicates._bucket(start + timedelta(seconds=duplicates.DUPLICATE_WINDOW_SECONDS - 1)) == duplicates._bucket(start)
+    assert duplicates._bucket(start + timedelta(seconds=duplicates.DUPLICATE_WINDOW_SECONDS)) == duplicates._bucket(start) + 1
+
+def test_content_hash_normalizes_description():
+    first = duplicates.content_hash(1, "Coffee  Shop", 450, BOUNDARY)
+    assert first == duplicates.content_hash(1, "coffee shop", 450, BOUNDARY + timedelta(seconds=5))
+    assert first != duplicates.content_hash(1, "coffee shop", 451, BOUNDARY)
+    assert first != duplicates.content_hash(2, "coffee shop", 450, BOUNDARY)
+
+def test_duplicate_found_across_a_bucket_boundary(conn, user):
+    username, user_id = user
+    utils.add_expense(username, "Coffee", 450, BOUNDARY - timedelta(seconds=3), "Food", "Wants")
+    match = duplicates.find_duplicate(conn, user_id, "coffee", 450, BOUNDARY + timedelta(seconds=4))
+    assert match is not None and match["description"] == "Coffee"
+
+def test_no_duplicate_outside_the_window_or_for_another_amount(conn, user):
+    username, user_id = user
+    utils.add_expense(username, "Coffee", 450, BOUNDARY, "Food", "Wants")
+    later = BOUNDARY + timedelta(seconds=duplicates.DUPLICATE_WINDOW_SECONDS + 1)
+    assert duplicates.find_duplicate(conn, user_id, "Coffee", 450, later) is None
+    assert duplicates.find_duplicate(conn, user_id, "Coffee", 451, BOUNDARY) is None
+
+def test_add_expense_skips_a_resubmission_unless_allowed(conn, user):
+    username, _ = user
+    assert not utils.add_expense(username, "Taxi", 1_200, BOUNDARY, "Transport", "Needs")["duplicate"]
+    assert utils.add_expense(username, "Taxi", 1_200, BOUNDARY + timedelta(seconds=20), "Transport", "Needs")["duplicate"]
+    assert not utils.add_expense(username, "Taxi", 1_200, BOUNDARY + timedelta(seconds=20), "Transport", "Needs", allow_duplicate=True)["duplicate"]
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM expenses WHERE description = 'Taxi'")
+    assert cursor.fetchone()[0] == 2
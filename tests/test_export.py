@@ -0,0 +1,73 @@
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import archive
+import export
+import utils
+
+def _full_query(conn, table_name, user_id):
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT {', '.join(export.EXPORT_TABLES[table_name])} FROM {table_name} WHERE user_id = ? ORDER BY date, id",
+        (user_id,)
+    )
+    return [tuple(row) for row in cursor.fetchall()]
+
+def _add_expenses(username, count, start=datetime(2026, 1, 5, 9, 0)):
+    for i in range(count):
+        # Out of date order, with ties, so ORDER BY date, id matters
+        when = start + timedelta(days=(i * 7) % count)
+        utils.add_expense(username, f"Item, \"{i}\"", 100 + i, when, "Food", "Wants" if i % 2 else "Needs")
+
+@pytest.mark.parametrize("batch_size", [1, 3, 7, 500])
+def test_batched_rows_equal_the_full_query(conn, user, batch_size):
+    username, user_id = user
+    _add_expenses(username, 23)
+    for table_name in export.EXPORT_TABLES:
+        expected = _full_query(conn, table_name, user_id)
+        assert expected
+        assert list(export.iter_rows(conn, table_name, user_id, batch_size)) == expected
+
+def test_csv_and_jsonl_round_trip(conn, user):
+    username, user_id = user
+    _add_expenses(username, 5)
+    columns = export.EXPORT_TABLES["expenses"]
+    expected = _full_query(conn, "expenses", user_id)
+
+    text = io.StringIO()
+    export.write_export(conn, "expenses", user_id, text, "csv", batch_size=2)
+    parsed = list(csv.reader(io.StringIO(text.getvalue())))
+    assert parsed[0] == columns
+    assert parsed[1:] == [[str(value) for value in row] for row in expected]
+
+    lines = "".join(export.iter_export(conn, "expenses", user_id, "jsonl", batch_size=2)).splitlines()
+    assert [json.loads(line) for line in lines] == [dict(zip(columns, row)) for row in expected]
+
+def test_export_file_is_spooled_bytes(conn, user):
+    username, user_id = user
+    _add_expenses(username, 3)
+    spool = export.export_file(conn, "expenses", user_id, "csv")
+    assert spool.read().decode("utf-8").splitlines()[0] == ",".join(export.EXPORT_TABLES["expenses"])
+
+def test_unsupported_table_or_format(conn, user):
+    _, user_id = user
+    with pytest.raises(ValueError):
+        list(export.iter_rows(conn, "users", user_id))
+    with pytest.raises(ValueError):
+        export.iter_export(conn, "expenses", user_id, "xml")
+
+def test_archived_rows_come_first(conn, user):
+    username, user_id = user
+    _add_expenses(username, 6, start=datetime(2022, 3, 1, 9, 0))
+    _add_expenses(username, 6)
+    expected = _full_query(conn, "expenses", user_id)
+
+    _, moved = archive.run(conn, today=date(2026, 10, 18))
+    assert moved == 6
+    assert list(export.iter_rows(conn, "expenses", user_id, batch_size=4)) == expected
+    archived = archive.to_frame(archive.open_archive(conn, user_id))
+    assert archived["id"].tolist() == [row[0] for row in expected[:moved]]
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import goals
+import utils
+
+def test_projection_uses_the_recent_saving_rate(conn, user):
+    username, user_id = user
+    today = datetime.now()
+    young = utils.add_goal(username, "Bike", 10_000)["id"]
+    utils.contribute_to_goal(username, young, 700)
+
+    old = utils.add_goal(username, "Trip", 50_000, current_cents=20_000)["id"]
+    conn.execute("UPDATE goals SET date_created = ? WHERE id = ?", ((today - timedelta(days=400)).isoformat(), old))
+    goals.record_contribution(conn, user_id, old, 20_000, today - timedelta(days=200))
+    goals.record_contribution(conn, user_id, old, 9_000, today - timedelta(days=30))
+    done = utils.add_goal(username, "Phone", 1_000, current_cents=1_000)["id"]
+    conn.commit()
+
+    projections = goals.compute_projections(conn, user_id, today).set_index("id")
+    # Younger than MIN_RATE_DAYS: measured over a week
+    assert projections.loc[young, "daily_rate_cents"] == 100
+    assert projections.loc[young, "days_left"] == 93
+    assert projections.loc[young, "projected_date"] == pd.Timestamp(today).normalize() + pd.Timedelta(days=93)
+    # Only the last RATE_WINDOW_DAYS count
+    assert projections.loc[old, "daily_rate_cents"] == 100
+    assert projections.loc[old, "days_left"] == 300
+    assert projections.loc[done, "completed"] and pd.isna(projections.loc[done, "projected_date"])
+
+def test_projections_are_cached_until_a_contribution(conn, user):
+    username, user_id = user
+    goal_id = utils.add_goal(username, "Bike", 10_000)["id"]
+    first = goals.get_projections(conn, user_id)
+    assert goals.get_projections(conn, user_id) is first
+    utils.contribute_to_goal(username, goal_id, 500)
+    second = goals.get_projections(conn, user_id)
+    assert second is not first and second.iloc[0]["current_cents"] == 500
+    assert [row["amount_cents"] for row in goals.get_contributions(conn, goal_id)] == [500]
+
+def test_projection_cache_drops_the_least_recently_used(conn, monkeypatch):
+    monkeypatch.setattr(goals, "MAX_CACHED_PROJECTIONS", 2)
+    for user_id in (1, 2):
+        goals.get_projections(conn, user_id)
+    goals.get_projections(conn, 1)
+    goals.get_projections(conn, 3)
+    assert list(goals._projections) == [1, 3]
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import achievements
+import leaderboard
+
+TODAY = datetime(2026, 3, 18, 12, 0)
+
+def _legacy_level_up(level, xp, next_level_xp, gained):
+    # The per-level loop FinPets levelled with before the XP table
+    xp += gained
+    while xp >= next_level_xp:
+        xp -= next_level_xp
+        level += 1
+        next_level_xp = int(next_level_xp * achievements.XP_GROWTH)
+    return level, xp, next_level_xp
+
+def test_xp_table_matches_the_level_loop():
+    legacy = table = (1, 0, achievements.XP_BASE)
+    for gained in [10, 70, 1, 500, 0, 12_345, 3, 99_999]:
+        legacy = _legacy_level_up(*legacy, gained)
+        table = achievements.apply_xp(*table[:2], gained)
+        assert table == legacy
+    assert table[0] > 20
+
+def test_split_grants_land_where_one_grant_does():
+    level, xp, _ = achievements.apply_xp(1, 0, 400)
+    level, xp, _ = achievements.apply_xp(level, xp, 6_000)
+    assert achievements.apply_xp(1, 0, 6_400)[:2] == (level, xp)
+    assert achievements.apply_xp(3, 10, -1_000) == (3, 0, achievements.level_threshold(3))
+    assert achievements.level_for_total_xp(achievements.xp_to_reach(7)) == 7
+    assert achievements.level_for_total_xp(achievements.xp_to_reach(7) - 1) == 6
+
+def _ranked(conn, order):
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT u.username, p.user_id FROM finpet p JOIN users u ON u.id = p.user_id ORDER BY {order}")
+    return cursor.fetchall()
+
+def test_boards_and_ranks_agree(conn):
+    leaderboard.populate(conn, 60, seed=3)
+    expected = _ranked(conn, "p.level DESC, p.xp DESC, p.user_id")
+    top = leaderboard.top(conn, "level", limit=10, today=TODAY)
+    assert [entry["username"] for entry in top] == [username for username, _ in expected[:10]]
+    assert [entry["rank"] for entry in top] == list(range(1, 11))
+    for position, (_, user_id) in enumerate(expected, start=1):
+        assert leaderboard.rank_of(conn, "level", user_id, today=TODAY) == position
+
+    for board in ("rewards", "streak"):
+        for entry in leaderboard.top(conn, board, limit=60):
+            user_id = int(entry["username"][len("user"):])
+            assert leaderboard.rank_of(conn, board, user_id) == entry["rank"]
+
+def test_stale_streaks_are_left_off(conn):
+    leaderboard.populate(conn, 2)
+    live = achievements.week_start(TODAY)
+    stale = achievements.week_start(TODAY - timedelta(weeks=3))
+    conn.executemany(
+        "UPDATE user_counters SET savings_streak_weeks = ?, last_savings_week = ? WHERE user_id = ?",
+        [(4, live, 1), (9, stale, 2)]
+    )
+    conn.commit()
+    assert [entry["username"] for entry in leaderboard.top(conn, "streak", today=TODAY)] == ["user1"]
+    assert leaderboard.rank_of(conn, "streak", 2, today=TODAY) is None
+    with pytest.raises(ValueError):
+        leaderboard.top(conn, "karma")
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+
+import ledger
+import outbox
+import utils
+
+def _replay(conn, user_id):
+    cursor = conn.cursor()
+    cursor.execute("SELECT COALESCE(SUM(amount_cents), 0) FROM money_movements WHERE user_id = ?", (user_id,))
+    return cursor.fetchone()[0]
+
+def test_balance_matches_replay_across_snapshots(conn, user):
+    username, user_id = user
+    goal_id = utils.add_goal(username, "Bike", 50_000)["id"]
+    start = datetime(2026, 1, 1, 9)
+    # Enough movements to take more than one snapshot
+    for i in range(2 * ledger.SNAPSHOT_INTERVAL + 7):
+        if i % 10 == 0:
+            utils.add_funds(username, 2_500 + i)
+        elif i % 10 == 5:
+            utils.contribute_to_goal(username, goal_id, 300)
+        else:
+            utils.add_expense(username, f"Lunch {i}", 150 + i, start + timedelta(hours=i), "Food", "Needs")
+    utils.update_balance(username, -42)
+    outbox.drain(conn)
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT last_movement_id FROM balance_snapshots WHERE user_id = ?", (user_id,))
+    assert cursor.fetchone() is not None
+    assert ledger.get_balance(conn, user_id) == _replay(conn, user_id)
+    assert utils.get_user_funds(username)["balance_cents"] == _replay(conn, user_id)
+    assert not ledger.reconcile(conn)["drift"].any()
+
+def test_get_balance_is_read_only(conn, user):
+    username, user_id = user
+    for i in range(ledger.SNAPSHOT_INTERVAL + 1):
+        ledger.record_movement(conn, user_id, -1, "adjustment", commit=False)
+    conn.commit()
+    changes = conn.total_changes
+    assert ledger.get_balance(conn, user_id) == _replay(conn, user_id)
+    assert conn.total_changes == changes
+    assert not conn.in_transaction
+
+def test_reconcile_reports_drift(conn, user):
+    _, user_id = user
+    conn.execute("UPDATE funds SET balance_cents = balance_cents + 5 WHERE user_id = ?", (user_id,))
+    conn.commit()
+    report = ledger.reconcile(conn).set_index("user_id")
+    assert report.loc[user_id, "drift"] and report.loc[user_id, "stored_drift"] == 5
@@ -0,0 +1,70 @@
+from datetime import datetime
+
+import pytest
+
+import outbox
+import utils
+
+def _queued(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT kind, payload FROM outbox ORDER BY id")
+    return [tuple(row) for row in cursor.fetchall()]
+
+def _finpet(conn, user_id):
+    cursor = conn.cursor()
+    cursor.execute("SELECT level, xp FROM finpet WHERE user_id = ?", (user_id,))
+    return tuple(cursor.fetchone())
+
+def test_drain_applies_each_event_once(conn, user):
+    username, user_id = user
+    conn.execute("DELETE FROM outbox")
+    conn.commit()
+    for i in range(4):
+        utils.add_expense(username, f"Groceries {i}", 300, datetime(2026, 3, 1 + i, 12), "Food", "Needs")
+    assert [kind for kind, _ in _queued(conn)] == ["xp", "recurring_scan"] * 4
+
+    assert outbox.drain(conn, batch_size=3) == 8
+    assert _queued(conn) == []
+    assert _finpet(conn, user_id) == (1, 20)
+    assert outbox.drain(conn) == 0
+    assert _finpet(conn, user_id) == (1, 20)
+
+def test_a_failed_batch_is_retried_whole(conn, user, monkeypatch):
+    username, user_id = user
+    conn.execute("DELETE FROM outbox")
+    outbox.enqueue_xp(conn, user_id, 30)
+    outbox.enqueue_reward(conn, user_id, "Early Bird", "Queued first", commit=True)
+
+    with monkeypatch.context() as patched:
+        def fail(*args, **kwargs):
+            raise RuntimeError("worker crashed")
+        patched.setattr(utils, "add_finpet_xp_batch", fail)
+        with pytest.raises(RuntimeError):
+            outbox.process_batch(conn)
+        # As the worker does after an error
+        conn.rollback()
+    assert len(_queued(conn)) == 2
+    assert _finpet(conn, user_id) == (1, 0)
+    assert utils.get_finpet_rewards(username) == []
+
+    assert outbox.drain(conn) == 2
+    assert _finpet(conn, user_id) == (1, 30)
+    assert [reward["name"] for reward in utils.get_finpet_rewards(username)] == ["Early Bird"]
+
+def test_zen_bonus_xp_is_queued_with_the_contribution(conn, user):
+    username, _ = user
+    goal_id = utils.add_goal(username, "Holiday", 50_000)["id"]
+    conn.execute("DELETE FROM outbox")
+    conn.commit()
+    utils.contribute_to_goal(username, goal_id, 1_000, bonus_xp=10)
+    assert ("xp", '{"xp": 10}') in _queued(conn)
+
+    conn.execute("DELETE FROM outbox")
+    conn.commit()
+    utils.contribute_to_goal(username, goal_id + 1, 1_000, bonus_xp=10)
+    assert _queued(conn) == []
+
+def test_unknown_kinds_are_rejected(conn, user):
+    _, user_id = user
+    with pytest.raises(ValueError):
+        outbox.enqueue(conn, user_id, "email")
@@ -0,0 +1,77 @@
+from datetime import date, datetime
+
+import pandas as pd
+
+import recurring
+import utils
+
+TODAY = date(2026, 6, 20)
+
+def _add(username, description, amount_cents, day, expense_type="Needs"):
+    utils.add_expense(username, description, amount_cents, datetime.combine(day, datetime.min.time()), "Bills", expense_type)
+
+def test_normalize_drops_numbers_dates_and_months():
+    keys = recurring.normalize(pd.Series(["Netflix Jan 2026", "NETFLIX - February #123", None]))
+    assert keys.tolist() == ["netflix", "netflix", ""]
+
+def test_next_occurrence_keeps_the_anchor_day():
+    assert recurring.next_occurrence(date(2026, 1, 31), "monthly", 31) == date(2026, 2, 28)
+    assert recurring.next_occurrence(date(2026, 2, 28), "monthly", 31) == date(2026, 3, 31)
+    assert recurring.next_occurrence(date(2025, 11, 30), "quarterly", 30) == date(2026, 2, 28)
+    assert recurring.next_occurrence(date(2026, 1, 1), "weekly", 1) == date(2026, 1, 8)
+
+def test_detects_a_monthly_charge_and_ignores_one_offs(conn, user):
+    username, user_id = user
+    for month, amount in [(1, 1_599), (2, 1_599), (3, 1_649), (4, 1_599), (5, 1_599)]:
+        _add(username, f"Netflix {date(2026, month, 1):%b} {month}", amount, date(2026, month, 15))
+    for day in [date(2026, 1, 3), date(2026, 2, 20), date(2026, 5, 2)]:
+        _add(username, "Hardware store", 4_000 + day.day, day)
+
+    assert recurring.detect(conn, today=TODAY) == (1, 1)
+    series = recurring.get_series(conn, user_id, today=TODAY)
+    assert series["key"].tolist() == ["netflix"]
+    row = series.iloc[0]
+    assert (row["period"], row["amount_cents"], row["occurrences"]) == ("monthly", 1_599, 5)
+    assert row["next_date"] == date(2026, 6, 15) and not row["lapsed"]
+    assert recurring.get_series(conn, user_id, today=date(2026, 8, 1)).iloc[0]["lapsed"]
+
+    # Nothing new since the last scan
+    assert recurring.detect(conn, today=TODAY) == (0, 0)
+
+def test_an_off_schedule_charge_deactivates_the_series(conn, user):
+    username, user_id = user
+    for month in (2, 3, 4):
+        _add(username, "Gym membership", 3_000, date(2026, month, 1))
+    recurring.detect(conn, today=TODAY)
+    assert len(recurring.get_series(conn, user_id, today=TODAY)) == 1
+
+    _add(username, "Gym membership", 3_000, date(2026, 4, 4))
+    assert recurring.detect(conn, today=TODAY) == (1, 0)
+    assert recurring.get_series(conn, user_id, today=TODAY).empty
+
+def test_due_charges_catch_up_and_advance(conn, user):
+    username, user_id = user
+    for month in (1, 2, 3):
+        _add(username, "Rent", 120_000, date(2026, month, 31 if month != 2 else 28))
+    recurring.detect(conn, today=date(2026, 4, 1))
+    series_id = int(recurring.get_series(conn, user_id, today=TODAY).iloc[0]["id"])
+    assert recurring.get_due(conn, user_id, today=TODAY) == []
+
+    assert recurring.set_auto_create(conn, user_id, series_id, True)
+    due = recurring.get_due(conn, user_id, today=TODAY)
+    assert [charge_date for _, charge_date in due] == [date(2026, 4, 30), date(2026, 5, 31)]
+
+    for series, charge_date in due:
+        recurring.mark_created(conn, series["id"], charge_date)
+    conn.commit()
+    assert recurring.get_due(conn, user_id, today=TODAY) == []
+    assert recurring.get_series(conn, user_id, today=TODAY).iloc[0]["next_date"] == date(2026, 6, 30)
+
+def test_forecast_lists_each_charge_in_range(conn, user):
+    username, user_id = user
+    for day in (1, 8, 15, 22):
+        _add(username, "Cleaner", 5_000, date(2026, 5, day))
+    recurring.detect(conn, today=date(2026, 5, 25))
+    charges = recurring.forecast(conn, user_id, date(2026, 6, 1), date(2026, 6, 15), today=date(2026, 5, 25))
+    assert charges["date"].tolist() == [date(2026, 6, 5), date(2026, 6, 12)]
+    assert charges["amount_cents"].sum() == 10_000
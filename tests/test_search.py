@@ -0,0 +1,68 @@
+from datetime import date, datetime, timedelta
+
+import archive
+import database
+import search
+import utils
+
+def _add(username, description, day, category="Food", expense_type="Wants", amount_cents=500):
+    return utils.add_expense(username, description, amount_cents, day, category, expense_type)
+
+def test_match_query_quotes_words_and_prefixes_the_last():
+    assert search.to_match_query('coffee "shop') == '"coffee" "shop"*'
+    assert search.to_match_query("AND OR *") == '"AND" "OR"*'
+    assert search.to_match_query(" -- ") is None
+
+def test_search_matches_prefixes_filters_and_scopes_to_the_user(conn, user):
+    username, user_id = user
+    _add(username, "Coffee shop", datetime(2026, 3, 1, 9))
+    _add(username, "Coffee beans", datetime(2026, 3, 5, 9), category="Groceries", expense_type="Needs")
+    _add(username, "Tea house", datetime(2026, 3, 6, 9))
+    database.create_user("bob", "hash")
+    utils.add_funds("bob", 10_000)
+    _add("bob", "Coffee shop", datetime(2026, 3, 2, 9))
+
+    rows, total = search.search_expenses(conn, user_id, "cof")
+    assert total == 2 and {row["description"] for row in rows} == {"Coffee shop", "Coffee beans"}
+    assert search.search_expenses(conn, user_id, "coffee shop")[1] == 1
+    assert search.search_expenses(conn, user_id, "coffee", category="Groceries")[0][0]["description"] == "Coffee beans"
+    assert search.search_expenses(conn, user_id, "coffee", expense_type="Wants")[1] == 1
+    assert search.search_expenses(conn, user_id, "coffee", start=datetime(2026, 3, 2), end=datetime(2026, 3, 31))[1] == 1
+    assert search.search_expenses(conn, user_id, "   ") == ([], 0)
+
+def test_index_follows_edits_and_deletes(conn, user):
+    username, user_id = user
+    _add(username, "Cinema tickets", datetime(2026, 3, 1, 9))
+    expense_id = next(iter(search.matching_ids(conn, user_id, "cinema")))
+    conn.execute("UPDATE expenses SET description = 'Theatre tickets' WHERE id = ?", (expense_id,))
+    conn.commit()
+    assert search.matching_ids(conn, user_id, "cinema") == set()
+    assert search.matching_ids(conn, user_id, "theatre") == {expense_id}
+    conn.execute("DELETE FROM expenses WHERE id = ?", (expense_id,))
+    conn.commit()
+    assert search.matching_ids(conn, user_id, "tickets") == set()
+
+def test_pages_cover_hot_then_archived_matches_once(conn, user):
+    username, user_id = user
+    start = datetime(2023, 1, 2, 9)
+    for i in range(12):
+        _add(username, "Lunch" if i % 2 else "Lunch lunch lunch", start + timedelta(days=7 * i))
+    for i in range(9):
+        _add(username, "Lunch", datetime(2026, 9, 1, 12) + timedelta(days=i))
+    archive.run(conn, today=date(2026, 10, 18))
+    archived_ids = set(archive.to_frame(archive.open_archive(conn, user_id))["id"].tolist())
+    assert len(archived_ids) == 12
+
+    seen = []
+    for page in range(5):
+        rows, total = search.search_expenses(conn, user_id, "lunch", page=page, page_size=5)
+        assert total == 21
+        seen.extend(row["id"] for row in rows)
+    assert len(seen) == len(set(seen)) == 21
+    # Every hot match comes before any archived one
+    assert [expense_id in archived_ids for expense_id in seen] == [False] * 9 + [True] * 12
+    # Within the archived tier, best match first
+    archived_rows = search.search_expenses(conn, user_id, "lunch", page=0, page_size=21)[0][9:]
+    ranks = [row["rank"] for row in archived_rows]
+    assert ranks == sorted(ranks)
+    assert archived_rows[0]["description"] == "Lunch lunch lunch"
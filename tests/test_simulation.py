@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import simulation
+import utils
+
+TODAY = datetime(2026, 3, 21, 12, 0)
+
+def _spend_daily(username, days, amount_cents=1_000, expense_type="Wants"):
+    for i in range(1, days + 1):
+        utils.add_expense(username, "Lunch", amount_cents, TODAY - timedelta(days=i), "Food", expense_type)
+
+def test_history_is_zero_filled_and_stops_before_today(conn, user):
+    username, user_id = user
+    utils.add_expense(username, "Lunch", 500, TODAY - timedelta(days=10), "Food", "Wants")
+    utils.add_expense(username, "Rent", 9_000, TODAY - timedelta(days=3), "Housing", "Needs")
+    utils.add_expense(username, "Lunch", 700, TODAY, "Food", "Wants")
+    history = simulation.daily_history(conn, user_id, TODAY)
+    assert len(history) == 10 and history.index[-1] == "2026-03-20"
+    assert history["wants_cents"].sum() == 500 and history["needs_cents"].sum() == 9_000
+
+    # Less than MIN_HISTORY_DAYS of activity is not enough to sample from
+    assert simulation.daily_history(conn, user_id, TODAY - timedelta(days=5)).empty
+
+def test_constant_history_gives_exact_paths():
+    history = pd.DataFrame({"wants_cents": [1_000] * 5, "needs_cents": [300] * 5, "income_cents": [2_000] * 5})
+    savings = simulation.simulate_paths(history, simulation.Scenario(wants_cut=0.5, income_change=-0.1), paths=4, horizon=6, seed=1)
+    assert savings.shape == (4, 6)
+    assert (savings == np.arange(1, 7) * (1_800 - 300 - 500)).all()
+
+def test_goal_odds_and_dates():
+    savings = np.tile(np.arange(1, 31) * 100, (10, 1))
+    result = simulation.summarize(savings, 5_000, [{"id": 1, "name": "Bike", "remaining_cents": 1_000},
+                                                   {"id": 2, "name": "Car", "remaining_cents": 1_000_000}], TODAY)
+    assert result["balance"]["p50"].iloc[0] == 5_100
+    bike, car = result["goals"].to_dict("records")
+    assert bike["probability"] == 1.0 and bike["median_date"] == pd.Timestamp("2026-03-31")
+    assert car["probability"] == 0.0 and pd.isna(car["median_date"])
+
+def test_run_is_cached_until_the_data_changes(conn, user):
+    username, user_id = user
+    assert simulation.run(conn, user_id, paths=50, horizon=30, today=TODAY) is None
+    _spend_daily(username, 20)
+    result = simulation.run(conn, user_id, simulation.Scenario(wants_cut=0.5), paths=50, horizon=30, today=TODAY)
+    assert result["history_days"] == 20
+    assert result["balance"]["p50"].tolist()[:2] == [100_000 - 20_000 - 500, 100_000 - 20_000 - 1_000]
+    assert simulation.run(conn, user_id, (0.5, 0.0, 0.0), paths=50, horizon=30, today=TODAY) is result
+
+    utils.add_expense(username, "Lunch", 1_000, TODAY - timedelta(days=21), "Food", "Wants")
+    assert simulation.run(conn, user_id, (0.5, 0.0, 0.0), paths=50, horizon=30, today=TODAY) is not result
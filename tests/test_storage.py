@@ -0,0 +1,57 @@
+import sqlite3
+
+import pytest
+
+import storage
+
+@pytest.fixture
+def scratch(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "WRITE_BACKOFF_S", 0.0)
+    conn = storage.connect(str(tmp_path / "scratch.db"))
+    conn.execute("CREATE TABLE events (id INTEGER PRIMARY KEY, name TEXT)")
+    yield conn
+    conn.close()
+
+def test_retry_rolls_back_the_failed_attempt(scratch):
+    attempts = []
+
+    @storage.serialized_write
+    def write(conn, name):
+        conn.execute("INSERT INTO events (name) VALUES (?)", (name,))
+        attempts.append(name)
+        if len(attempts) == 1:
+            # Locked after the first statement already ran
+            raise sqlite3.OperationalError("database is locked")
+        conn.execute("INSERT INTO events (name) VALUES (?)", (name + " detail",))
+        conn.commit()
+
+    write(scratch, "deposit")
+    assert len(attempts) == 2
+    assert [row[0] for row in scratch.execute("SELECT name FROM events ORDER BY id")] == ["deposit", "deposit detail"]
+
+def test_registered_connections_are_rolled_back(scratch, monkeypatch):
+    monkeypatch.setattr(storage, "_connection_sources", [lambda: [scratch]])
+    attempts = []
+
+    @storage.serialized_write
+    def write(name):
+        scratch.execute("INSERT INTO events (name) VALUES (?)", (name,))
+        attempts.append(name)
+        if len(attempts) < 3:
+            raise sqlite3.OperationalError("database is busy")
+        scratch.commit()
+
+    write("xp")
+    assert scratch.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 1
+
+def test_other_errors_are_not_retried(scratch):
+    attempts = []
+
+    @storage.serialized_write
+    def write(conn):
+        attempts.append(1)
+        conn.execute("INSERT INTO missing_table VALUES (1)")
+
+    with pytest.raises(sqlite3.OperationalError):
+        write(scratch)
+    assert len(attempts) == 1
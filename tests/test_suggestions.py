@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+import suggestions
+import utils
+
+START = datetime(2026, 3, 1, 9, 0)
+
+def _add(username, description, days, category="Food", expense_type="Wants", amount_cents=450):
+    utils.add_expense(username, description, amount_cents, START + timedelta(days=days), category, expense_type)
+
+def test_most_used_first_with_the_latest_details(conn, user):
+    username, user_id = user
+    _add(username, "Coffee shop", 0, amount_cents=400)
+    _add(username, "coffee  SHOP", 1, amount_cents=420)
+    _add(username, "Coffee Shop", 2, category="Treats", amount_cents=480)
+    _add(username, "Coffee beans", 3, expense_type="Needs")
+    _add(username, "Cinema", 4)
+
+    matches = suggestions.suggest(conn, user_id, "  co")
+    assert [match["description"] for match in matches] == ["Coffee Shop", "Coffee beans"]
+    assert (matches[0]["count"], matches[0]["category"], matches[0]["amount_cents"]) == (3, "Treats", 480)
+    assert suggestions.suggest(conn, user_id, "coffee s", limit=1)[0]["count"] == 3
+    assert suggestions.suggest(conn, user_id, "") == []
+    assert suggestions.suggest(conn, user_id, "zzz") == []
+
+def test_new_expenses_update_a_built_index(conn, user):
+    username, user_id = user
+    _add(username, "Bakery", 0)
+    assert suggestions.suggest(conn, user_id, "b")[0]["count"] == 1
+
+    _add(username, "Bus pass", 1, category="Transport", expense_type="Needs")
+    _add(username, "bakery", 2, category="Groceries")
+    assert [match["description"] for match in suggestions.suggest(conn, user_id, "b")] == ["bakery", "Bus pass"]
+    # The cache matches a rebuild from the table
+    assert suggestions._indexes[user_id] == suggestions.build(conn, user_id)
+
+def test_classification_reuses_a_known_description(conn, user):
+    username, user_id = user
+    _add(username, "Rent", 0, category="Housing", expense_type="Needs")
+    assert utils.classify_expense(username, " rent ") == ("Housing", "Needs")
+    assert suggestions.lookup(conn, user_id, "Unknown thing") is None
+
+def test_index_cache_drops_the_least_recently_used(conn, monkeypatch):
+    monkeypatch.setattr(suggestions, "MAX_CACHED_INDEXES", 2)
+    for user_id in (1, 2):
+        suggestions.suggest(conn, user_id, "a")
+    suggestions.suggest(conn, 1, "a")
+    suggestions.suggest(conn, 3, "a")
+    assert list(suggestions._indexes) == [1, 3]
+    suggestions.clear(1)
+    assert list(suggestions._indexes) == [3]
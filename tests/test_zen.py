@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import utils
+import zen
+
+ON = datetime(2026, 4, 1)
+
+def _daily(username, first, days, amount_cents, expense_type="Wants"):
+    for i in range(days):
+        utils.add_expense(username, "Treat", amount_cents, first + timedelta(days=i), "Food", expense_type)
+
+def test_only_changes_are_logged(conn, user):
+    _, user_id = user
+    assert zen.set_zen_mode(conn, user_id, True, ON)
+    assert not zen.set_zen_mode(conn, user_id, True, ON + timedelta(hours=1))
+    assert zen.set_zen_mode(conn, user_id, False, ON + timedelta(days=2))
+    conn.commit()
+    assert [event["active"] for event in zen.get_events(conn, user_id)] == [True, False]
+
+def test_session_impact_compares_daily_wants_spending(conn, user):
+    username, user_id = user
+    _daily(username, ON - timedelta(days=30), 30, 1_000)
+    _daily(username, ON - timedelta(days=30), 30, 5_000, "Needs")
+    _daily(username, ON, 10, 400)
+    zen.set_zen_mode(conn, user_id, True, ON)
+    zen.set_zen_mode(conn, user_id, False, ON + timedelta(days=10))
+    conn.commit()
+
+    sessions = zen.session_impact(conn, user_id, now=ON + timedelta(days=40))
+    row = sessions.iloc[0]
+    assert (row["before_days"], row["after_days"], row["ongoing"]) == (30, 10, False)
+    assert (row["before_cents"], row["after_cents"]) == (30_000, 4_000)
+    assert row["change_pct"] == pytest.approx(-60.0)
+    assert row["saved_cents"] == 6_000
+
+    summary = zen.summarize_impact(sessions)
+    assert (summary["sessions"], summary["saved_cents"]) == (1, 6_000)
+
+def test_windows_are_clipped_to_the_history_and_now(conn, user):
+    username, user_id = user
+    _daily(username, ON - timedelta(days=5), 5, 1_000)
+    zen.set_zen_mode(conn, user_id, True, ON)
+    conn.commit()
+
+    row = zen.session_impact(conn, user_id, now=ON + timedelta(days=3)).iloc[0]
+    assert (row["before_days"], row["after_days"], row["ongoing"]) == (5, 3, True)
+    assert row["before_daily_cents"] == 1_000 and row["saved_cents"] == 3_000
+
+def test_no_sessions_means_no_summary(conn, user):
+    _, user_id = user
+    assert zen.session_impact(conn, user_id).empty
+    assert zen.summarize_impact(zen.session_impact(conn, user_id)) is None
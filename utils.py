@@ -4,25 +4,52 @@ from datetime import datetime, timedelta
 import altair as alt
 import matplotlib.pyplot as plt
 import random
-import json
 from ml_models import predict_expense_type, predict_expense_category
-import sqlite3
+import achievements
+import allocation
+import anomalies
+import archive
+import budgets
+import columnar
+import database
+import duplicates
+import goals
+import leaderboard
+import ledger
+import money
+import outbox
+import recurring
+import search
+import simulation
+import storage
+import suggestions
+import zen
 
 def get_db():
-    # Connect to (or create) your SQLite database file
-    conn = sqlite3.connect("finance.db", check_same_thread=False)
-    conn.row_factory = sqlite3.Row  # Allows access by column name
-    return conn
+    # All data lives in the canonical database; see database.py
+    return database.get_db()
+
+def get_user_id(username):
+    """Get the integer id for a username."""
+    return database.get_user_id(username)
+
+# Categories offered when classifying expenses by hand or creating envelopes
+EXPENSE_CATEGORIES = [
+    "Food", "Utilities", "Housing", "Transport",
+    "Shopping", "Electronics", "Education", "Entertainment",
+    "Health", "Personal Care", "Fitness", "Gifts", "Charity", "Other",
+]
 
 # ------------------------
 # Database utility functions
 # ------------------------
 
 def get_user_expenses(username):
-    """Get all expenses for a specific user."""
+    """Get all expenses for a specific user, archived ones (see archive.py) first."""
     conn = get_db()
+    user_id = get_user_id(username)
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM expenses WHERE username = ?", (username,))
+    cursor.execute("SELECT * FROM expenses WHERE user_id = ?", (user_id,))
     rows = cursor.fetchall()
     # Convert rows to list of dictionaries
     columns = [desc[0] for desc in cursor.description]
@@ -34,19 +61,30 @@ def get_user_expenses(username):
                 expense['date'] = datetime.fromisoformat(expense['date'])
             except (ValueError, TypeError):
                 expense['date'] = datetime.now()
+    # Decoded once per archive size and cached (see archive.get_frame)
+    archived = archive.get_frame(conn, user_id)
+    if archived is not None:
+        # Column by column; much faster than DataFrame.to_dict("records")
+        columns = archived.columns.tolist()
+        values = [
+            list(archived[column].dt.to_pydatetime()) if column == 'date' else archived[column].tolist()
+            for column in columns
+        ]
+        expenses = [dict(zip(columns, row)) for row in zip(*values)] + expenses
     return expenses
 
 def get_user_funds(username):
     """Get funds for a specific user."""
+    user_id = get_user_id(username)
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM funds WHERE username = ?", (username,))
+    cursor.execute("SELECT * FROM funds WHERE user_id = ?", (user_id,))
     row = cursor.fetchone()
     if row is None:
         # Initialize funds if not exists
-        cursor.execute("INSERT INTO funds (username, balance) VALUES (?, ?)", (username, 0))
+        cursor.execute("INSERT INTO funds (user_id, balance_cents) VALUES (?, ?)", (user_id, 0))
         conn.commit()
-        funds = {"username": username, "balance": 0}
+        funds = {"user_id": user_id, "balance_cents": 0}
     else:
         columns = [desc[0] for desc in cursor.description]
         funds = dict(zip(columns, row))
@@ -56,34 +94,49 @@ def get_user_goals(username):
     """Get all savings goals for a specific user."""
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM goals WHERE username = ?", (username,))
+    cursor.execute("SELECT * FROM goals WHERE user_id = ?", (get_user_id(username),))
     rows = cursor.fetchall()
     columns = [desc[0] for desc in cursor.description]
-    goals = [dict(zip(columns, row)) for row in rows]
-    return goals
+    return [dict(zip(columns, row)) for row in rows]
+
+def get_goal_projections(username):
+    """Get projected completion for each of a user's goals as {goal_id: row dict}. Cached until the next contribution."""
+    projections = goals.get_projections(get_db(), get_user_id(username))
+    return {row["id"]: row for row in projections.to_dict("records")}
+
+def format_goal_projection(projection):
+    """One-line description of a goal projection for display."""
+    if projection is None:
+        return "Contribute to this goal to see when you'll reach it."
+    if projection["completed"]:
+        return "Goal reached!"
+    if pd.isna(projection["projected_date"]):
+        return f"No contributions in the last {goals.RATE_WINDOW_DAYS} days, so there's no projection yet."
+    weekly = money.format_money(round(projection["daily_rate_cents"] * 7))
+    return f"On track for **{projection['projected_date']:%B %d, %Y}** at about {weekly}/week"
 
 def get_user_finpet(username):
     """Get FinPet status for a specific user."""
+    user_id = get_user_id(username)
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM finpet WHERE username = ?", (username,))
+    cursor.execute("SELECT * FROM finpet WHERE user_id = ?", (user_id,))
     row = cursor.fetchone()
     if row is None:
         # Initialize FinPet if not exists
         current_time = datetime.now().isoformat()
         cursor.execute(
-            "INSERT INTO finpet (username, level, xp, next_level_xp, name, last_fed, rewards) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (username, 1, 0, 75, "Penny", current_time, json.dumps([]))
+            "INSERT INTO finpet (user_id, level, xp, next_level_xp, name, last_fed) VALUES (?, ?, ?, ?, ?, ?)",
+            (user_id, 1, 0, 75, "Penny", current_time)
         )
         conn.commit()
         finpet = {
-            "username": username,
+            "user_id": user_id,
             "level": 1,
             "xp": 0,
             "next_level_xp": 75,
             "name": "Penny",
-            "last_fed": current_time,
-            "rewards": []
+            "last_fed": current_time
         }
     else:
         columns = [desc[0] for desc in cursor.description]
@@ -94,353 +147,508 @@ def get_user_finpet(username):
                 finpet['last_fed'] = datetime.fromisoformat(finpet['last_fed'])
             except:
                 finpet['last_fed'] = datetime.now()
-        # Ensure rewards is a list
-        if isinstance(finpet.get('rewards'), str):
-            try:
-                finpet['rewards'] = json.loads(finpet['rewards'])
-            except json.JSONDecodeError:
-                finpet['rewards'] = []
-        elif finpet.get('rewards') is None:
-            finpet['rewards'] = []
     return finpet
 
+def get_finpet_rewards(username, limit=None):
+    """Get a user's earned rewards, newest first."""
+    query = "SELECT name, description, icon, date FROM rewards WHERE user_id = ? ORDER BY date DESC, id DESC"
+    params = [get_user_id(username)]
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    return [dict(row) for row in cursor.fetchall()]
+
+def get_reward_count(username):
+    """Count a user's earned rewards."""
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM rewards WHERE user_id = ?", (get_user_id(username),))
+    return cursor.fetchone()[0]
+
 def get_zen_mode_status(username):
     """Get Zen mode status for a user."""
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute("SELECT zen_mode FROM users WHERE username = ?", (username,))
+    cursor.execute("SELECT zen_mode FROM users WHERE id = ?", (get_user_id(username),))
     row = cursor.fetchone()
     if row:
         return bool(row[0])
     return False
 
+@storage.serialized_write
 def update_zen_mode(username, status):
-    """Update Zen mode status for a user."""
+    """Update Zen mode status for a user, logging the change for impact tracking."""
     conn = get_db()
-    status_int = 1 if status else 0
-    cursor = conn.cursor()
-    cursor.execute("UPDATE users SET zen_mode = ? WHERE username = ?", (status_int, username))
+    zen.set_zen_mode(conn, get_user_id(username), status)
     conn.commit()
     st.session_state.zen_mode = status
 
-def add_expense(username, description, amount, date=None, category=None, expense_type=None):
-    """Add a new expense for a user."""
+def get_zen_impact(username):
+    """Get (per-activation impact DataFrame, overall summary or None) for the user's Zen Mode history."""
+    sessions = zen.session_impact(get_db(), get_user_id(username))
+    return sessions, zen.summarize_impact(sessions)
+
+@storage.serialized_write
+def add_expense(username, description, amount_cents, date=None, category=None, expense_type=None, allow_duplicate=False):
+    """
+    Add a new expense for a user. The amount is in integer cents.
+    
+    A resubmission of an expense added moments ago (see duplicates.py) is not
+    added again: the earlier expense is returned with "duplicate" set. With
+    allow_duplicate it is added anyway and flagged as a duplicate.
+    """
     if date is None:
         date = datetime.now()
-    date_str = date.isoformat()
-    
-    # Use ML to predict category and type if not provided
-    if category is None:
-        category = predict_expense_category(description)
-    if expense_type is None:
-        expense_type = predict_expense_type(description)
     
+    user_id = get_user_id(username)
     conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO expenses (username, description, amount, date, category, type) VALUES (?, ?, ?, ?, ?, ?)",
-        (username, description, float(amount), date_str, category, expense_type)
-    )
-    conn.commit()
+    existing = duplicates.find_duplicate(conn, user_id, description, amount_cents, date)
+    if existing is not None and not allow_duplicate:
+        existing.update(username=username, date=datetime.fromisoformat(existing["date"]), anomaly=None, duplicate=True)
+        return existing
     
-    # Update balance
-    update_balance(username, -float(amount))
+    # Fill in category and type from the user's history or the ML models
+    if category is None or expense_type is None:
+        predicted_category, predicted_type = classify_expense(username, description)
+        category = category or predicted_category
+        expense_type = expense_type or predicted_type
     
-    # Update FinPet XP if it's a "Needs" expense (responsible spending)
-    if expense_type == "Needs":
-        add_finpet_xp(username, 5)
+    get_user_funds(username)  # Make sure the funds row exists
+    # Scored against the spending before it, so it can be flagged right away
+    anomaly = anomalies.score(conn, user_id, category, int(amount_cents))
+    expense_id = _record_expense(conn, user_id, description, amount_cents, date, category, expense_type,
+                                 duplicate_of=existing["id"] if existing else None)
+    
+    # The expense, the balance change and the queued XP land in one commit
+    conn.commit()
+    outbox.notify()
+    suggestions.record(user_id, description, amount_cents, date, category, expense_type)
+    columnar.append(user_id, expense_id, date, amount_cents, category, expense_type)
     
     expense = {
         "username": username,
         "description": description,
-        "amount": float(amount),
+        "amount_cents": int(amount_cents),
         "date": date,  # Return datetime object
         "category": category,
-        "type": expense_type
+        "type": expense_type,
+        "anomaly": anomaly,
+        "duplicate": False
     }
     return expense
 
-def add_funds(username, amount, description="Deposit"):
-    """Add funds to user's balance."""
+@storage.serialized_write
+def add_funds(username, amount_cents, description="Deposit"):
+    """Add funds to user's balance. The amount is in integer cents."""
+    user_id = get_user_id(username)
+    get_user_funds(username)  # Make sure the funds row exists
     conn = get_db()
     cursor = conn.cursor()
-    # Create the fund_transactions table if it doesn't exist
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS fund_transactions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT NOT NULL,
-        amount REAL NOT NULL,
-        description TEXT,
-        date TEXT NOT NULL,
-        FOREIGN KEY (username) REFERENCES users(username)
-    )
-    ''')
-    conn.commit()
     
     fund_entry = {
         "username": username,
-        "amount": float(amount),
+        "amount_cents": int(amount_cents),
         "description": description,
         "date": datetime.now().isoformat()
     }
     
     cursor.execute('''
-    INSERT INTO fund_transactions (username, amount, description, date)
+    INSERT INTO fund_transactions (user_id, amount_cents, description, date)
     VALUES (?, ?, ?, ?)
-    ''', (fund_entry["username"], fund_entry["amount"], fund_entry["description"], fund_entry["date"]))
-    conn.commit()
+    ''', (user_id, fund_entry["amount_cents"], fund_entry["description"], fund_entry["date"]))
     fund_entry["id"] = cursor.lastrowid
     
     # Update the user's balance with the new deposit
-    update_balance(username, float(amount))
+    _apply_balance_change(conn, user_id, fund_entry["amount_cents"], "deposit", fund_entry["id"])
+    if fund_entry["amount_cents"] > 0:
+        achievements.record_deposit(conn, user_id, datetime.fromisoformat(fund_entry["date"]))
+        # Split the deposit across goals by the user's rule, in this same transaction
+        fund_entry["allocations"] = allocation.allocate_deposit(conn, user_id, fund_entry["id"], fund_entry["amount_cents"])
     
-    # Add FinPet XP for adding funds (savings behavior)
-    xp_amount = min(10, int(float(amount) / 50))
+    # Queue FinPet XP for adding funds (savings behavior): 1 XP per $50, up to 10
+    xp_amount = min(10, fund_entry["amount_cents"] // money.to_cents(50))
     if xp_amount > 0:
-        add_finpet_xp(username, xp_amount)
+        outbox.enqueue_xp(conn, user_id, xp_amount)
+    
+    # Queue a check for savings milestone rewards
+    outbox.enqueue_savings_check(conn, user_id)
     
-    # Check for savings rewards
-    funds = get_user_funds(username)
-    current_balance = funds.get("balance", 0)
-    check_and_add_savings_rewards(username, current_balance)
+    conn.commit()
+    outbox.notify()
     
     return fund_entry
 
-def update_balance(username, amount_change):
-    """Update user's balance by the given amount."""
-    conn = get_db()
-    funds = get_user_funds(username)
-    current_balance = funds.get("balance", 0)
-    new_balance = current_balance + amount_change
+def suggest_descriptions(username, prefix):
+    """The user's most used descriptions starting with prefix, each with its last category, type and amount."""
+    return suggestions.suggest(get_db(), get_user_id(username), prefix)
+
+def classify_expense(username, description):
+    """
+    Get (category, type) for a description.
+
+    A description the user has entered before gets the category and type it
+    had last time, without running the ML models; anything new is predicted.
+    """
+    known = suggestions.lookup(get_db(), get_user_id(username), description)
+    if known is not None:
+        return known["category"], known["type"]
+    return predict_expense_category(description), predict_expense_type(description)
+
+def score_expense(username, category, amount_cents):
+    """Score an amount against the user's spending in a category; see anomalies.score."""
+    return anomalies.score(get_db(), get_user_id(username), category, int(amount_cents))
+
+def describe_anomaly(anomaly):
+    """Warning text for a flagged expense score, or None if it isn't unusual."""
+    if not anomaly or not anomaly["flagged"]:
+        return None
+    return (f"This is about {anomaly['ratio']:.1f}x what you usually spend here "
+            f"(typically {money.format_money(anomaly['typical_cents'])}).")
+
+def _record_expense(conn, user_id, description, amount_cents, date, category, expense_type, duplicate_of=None):
+    """Insert an expense and apply its balance, counter, budget and XP updates without committing."""
     cursor = conn.cursor()
-    cursor.execute("UPDATE funds SET balance = ? WHERE username = ?", (new_balance, username))
+    cursor.execute('''
+    INSERT INTO expenses (user_id, description, amount_cents, date, category, type, content_hash, duplicate_of)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (user_id, description, int(amount_cents), date.isoformat(), category, expense_type,
+          duplicates.content_hash(user_id, description, amount_cents, date), duplicate_of))
+    expense_id = cursor.lastrowid
+    
+    # Update balance
+    _apply_balance_change(conn, user_id, -int(amount_cents), "expense", expense_id)
+    
+    achievements.record_expense(conn, user_id, int(amount_cents), expense_type)
+    anomalies.record(conn, user_id, category, int(amount_cents))
+    budgets.record_expense(conn, user_id, int(amount_cents), date, category, expense_type)
+    
+    # Queue FinPet XP if it's a "Needs" expense (responsible spending)
+    if expense_type == "Needs":
+        outbox.enqueue_xp(conn, user_id, 5)
+    # Recurring series are detected by the outbox worker, not while pages render
+    outbox.enqueue_recurring_scan(conn, user_id)
+    return expense_id
+
+def _apply_balance_change(conn, user_id, change_cents, kind, ref_id=None):
+    """Record a money movement and refresh the cached balance without committing."""
+    ledger.record_movement(conn, user_id, change_cents, kind, ref_id, commit=False)
+    new_balance = ledger.refresh_funds(conn, user_id)
+    achievements.record_balance(conn, user_id, new_balance)
+    return new_balance
+
+@storage.serialized_write
+def update_balance(username, change_cents, kind="adjustment", ref_id=None):
+    """Record a money movement in cents and refresh the user's cached balance."""
+    get_user_funds(username)  # Make sure the funds row exists
+    conn = get_db()
+    new_balance = _apply_balance_change(conn, get_user_id(username), int(change_cents), kind, ref_id)
     conn.commit()
+    return new_balance
 
-def add_goal(username, name, target_amount, current_amount=0):
-    """Add a new savings goal."""
+@storage.serialized_write
+def add_goal(username, name, target_cents, current_cents=0):
+    """Add a new savings goal. Amounts are in integer cents."""
     conn = get_db()
     date_created = datetime.now().isoformat()
     cursor = conn.cursor()
     cursor.execute(
-        "INSERT INTO goals (username, name, target_amount, current_amount, date_created, completed) VALUES (?, ?, ?, ?, ?, ?)",
-        (username, name, float(target_amount), float(current_amount), date_created, 0)
+        "INSERT INTO goals (user_id, name, target_cents, current_cents, date_created, completed) VALUES (?, ?, ?, ?, ?, ?)",
+        (get_user_id(username), name, int(target_cents), int(current_cents), date_created, 0)
     )
     conn.commit()
     goal_id = cursor.lastrowid
     goal = {
         "id": goal_id,
-        "username": username,
+        "user_id": get_user_id(username),
         "name": name,
-        "target_amount": float(target_amount),
-        "current_amount": float(current_amount),
+        "target_cents": int(target_cents),
+        "current_cents": int(current_cents),
         "date_created": date_created,
         "completed": 0
     }
     return goal
 
-def update_goal(goal_id, amount_change):
-    """Update progress towards a goal."""
+@storage.serialized_write
+def contribute_to_goal(username, goal_id, amount_cents, bonus_xp=0):
+    """
+    Move cents from the balance into a goal in one transaction.
+
+    bonus_xp is queued for the FinPet in the same transaction, on top of the
+    contribution XP. Returns (completed_now, new balance); a goal that
+    doesn't exist gets nothing and completed_now is False.
+    """
+    user_id = get_user_id(username)
+    get_user_funds(username)  # Make sure the funds row exists
     conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM goals WHERE id = ?", (goal_id,))
-    row = cursor.fetchone()
-    if row is None:
-        return 0, False
-    columns = [desc[0] for desc in cursor.description]
-    goal = dict(zip(columns, row))
-    new_amount = goal["current_amount"] + amount_change
-    completed = new_amount >= goal["target_amount"]
-    completed_int = 1 if completed else 0
-    cursor.execute("UPDATE goals SET current_amount = ?, completed = ? WHERE id = ?", (new_amount, completed_int, goal_id))
+    results = allocation.apply(conn, user_id, [(goal_id, amount_cents)])
+    if results and bonus_xp > 0:
+        outbox.enqueue_xp(conn, user_id, bonus_xp)
+    balance = ledger.get_balance(conn, user_id)
     conn.commit()
-    
-    # Add FinPet XP for goal progress
-    if completed:
-        add_finpet_xp(goal["username"], 25)  # Bonus XP for completing a goal
-    else:
-        add_finpet_xp(goal["username"], 3)  # Small XP for progress
-    
-    return new_amount, completed
+    outbox.notify()
+    return (results[0][2] if results else False), balance
+
+def get_allocation_rule(username):
+    """Get the user's automatic allocation rule as a dict."""
+    return allocation.get_rule(get_db(), get_user_id(username))
+
+@storage.serialized_write
+def update_allocation_rule(username, strategy, deposit_pct, enabled):
+    """Set how the user's deposits are split across goals."""
+    allocation.set_rule(get_db(), get_user_id(username), strategy, deposit_pct, enabled)
+
+@storage.serialized_write
+def update_goal_allocation(username, goal_id, priority=0, allocation_pct=0, deadline=None):
+    """Set a goal's allocation priority, percentage and deadline."""
+    return allocation.set_goal_allocation(get_db(), get_user_id(username), goal_id, priority, allocation_pct, deadline)
 
-def add_finpet_reward(username, reward_name, description, icon="🎁"):
-    """Add a reward to the user's FinPet."""
+@storage.serialized_write
+def add_finpet_reward(username, reward_name, description, icon="🎁", commit=True):
+    """Award a reward to the user's FinPet. Returns None if it was already earned."""
     conn = get_db()
-    finpet = get_user_finpet(username)
     reward = {
         "name": reward_name,
         "description": description,
         "icon": icon,
         "date": datetime.now().isoformat()
     }
-    rewards = finpet.get("rewards", [])
-    if not isinstance(rewards, list):
-        try:
-            rewards = json.loads(rewards)
-            if not isinstance(rewards, list):
-                rewards = []
-        except json.JSONDecodeError:
-            rewards = []
-    rewards.append(reward)
     cursor = conn.cursor()
-    cursor.execute("UPDATE finpet SET rewards = ? WHERE username = ?", (json.dumps(rewards), username))
-    conn.commit()
-    return reward
-
-def check_and_add_savings_rewards(username, amount_saved):
-    """Check if user qualifies for savings-based rewards and add them."""
-    milestones = [
-        (100, "Saving Starter", "Saved your first $100", "💰"),
-        (500, "Penny Pincher", "Reached $500 in savings", "🪙"),
-        (1000, "Money Master", "Saved $1,000", "💵"),
-        (5000, "Wealth Builder", "Accumulated $5,000 in savings", "🏆")
-    ]
-    
-    rewards_added = []
-    finpet = get_user_finpet(username)
-    existing_rewards = [r.get("name") for r in finpet.get("rewards", [])]
-    
-    for milestone, name, desc, icon in milestones:
-        if amount_saved >= milestone and name not in existing_rewards:
-            reward = add_finpet_reward(username, name, desc, icon)
-            rewards_added.append(reward)
-            bonus_xp = milestone // 100  # 1 XP per $100 saved at milestone
-            add_finpet_xp(username, bonus_xp)
-    
-    return rewards_added
+    # UNIQUE (user_id, name) does the dedupe
+    cursor.execute(
+        "INSERT OR IGNORE INTO rewards (user_id, name, description, icon, date) VALUES (?, ?, ?, ?, ?)",
+        (get_user_id(username), reward_name, description, icon, reward["date"])
+    )
+    added = cursor.rowcount
+    if added:
+        achievements.record_reward(conn, get_user_id(username))
+    if commit:
+        conn.commit()
+    return reward if added else None
+
+@storage.serialized_write
+def check_milestone_rewards(username, metrics=None, commit=True):
+    """Award any milestone rewards the user has newly reached, plus their bonus XP."""
+    earned = achievements.award_rewards(get_db(), get_user_id(username), metrics, commit)
+    bonus_xp = sum(rule.bonus_xp for rule in earned)
+    if bonus_xp > 0:
+        add_finpet_xp(username, bonus_xp, commit)
+    return earned
+
+def get_achievements(username):
+    """Get the FinPet achievements a user has earned."""
+    return achievements.get_achievements(get_db(), get_user_id(username))
+
+def get_leaderboard(board, limit=leaderboard.LEADERBOARD_SIZE):
+    """Get the top entries of a cross-user leaderboard (see leaderboard.BOARDS)."""
+    return leaderboard.top(get_db(), board, limit)
+
+def get_leaderboard_rank(username, board):
+    """Get a user's rank on a leaderboard, or None if they aren't on it."""
+    return leaderboard.rank_of(get_db(), board, get_user_id(username))
+
+def run_what_if(username, wants_cut=0.0, needs_cut=0.0, income_change=0.0, horizon=simulation.DEFAULT_HORIZON_DAYS):
+    """Simulate the user's balance and goals under a scenario. Cached per scenario; None without enough history."""
+    scenario = simulation.Scenario(wants_cut, needs_cut, income_change)
+    return simulation.run(get_db(), get_user_id(username), scenario, horizon=horizon)
+
+@storage.serialized_write
+def add_finpet_xp(username, xp_amount, commit=True):
+    """Add XP to user's FinPet, applying any number of level ups. Returns the number of levels gained."""
+    return add_finpet_xp_batch([(username, xp_amount)], commit).get(username, 0)
+
+@storage.serialized_write
+def add_finpet_xp_batch(events, commit=True):
+    """
+    Apply (username, xp) events in one write, coalesced per user.
+
+    Returns {username: levels gained}. Every level milestone crossed is awarded
+    at once. With commit=False everything stays in the caller's transaction.
+    """
+    totals = {}
+    for username, xp_amount in events:
+        totals[username] = totals.get(username, 0) + int(xp_amount)
+    if not totals:
+        return {}
 
-def add_finpet_xp(username, xp_amount):
-    """Add XP to user's FinPet and handle level ups."""
     conn = get_db()
-    finpet = get_user_finpet(username)
-    new_xp = finpet["xp"] + xp_amount
-    level_up = new_xp >= finpet["next_level_xp"]
-    current_time = datetime.now().isoformat()
     cursor = conn.cursor()
-    if level_up:
-        new_level = finpet["level"] + 1
-        new_next_level_xp = int(finpet["next_level_xp"] * 1.3)
-        cursor.execute(
-            "UPDATE finpet SET xp = ?, level = ?, next_level_xp = ?, last_fed = ? WHERE username = ?",
-            (new_xp - finpet["next_level_xp"], new_level, new_next_level_xp, current_time, username)
-        )
-        conn.commit()
-        # Add reward for leveling up at specific milestones
-        if new_level in [5, 10, 20, 30]:
-            level_milestones = {
-                5: ("Level 5 Badge", "Reached level 5 with your FinPet", "🌱"),
-                10: ("Hatched", "Your FinPet hatched from its egg at level 10", "🐣"),
-                20: ("Evolution", "Your FinPet evolved to its teen form", "✨"),
-                30: ("Final Form", "Your FinPet reached its final form", "🌟")
-            }
-            name, desc, icon = level_milestones[new_level]
-            add_finpet_reward(username, name, desc, icon)
-        return True  # Indicates level up occurred
-    else:
-        cursor.execute(
-            "UPDATE finpet SET xp = ?, last_fed = ? WHERE username = ?",
-            (new_xp, current_time, username)
-        )
+    user_ids = {username: get_user_id(username) for username in totals}
+    placeholders = ", ".join("?" * len(user_ids))
+    cursor.execute(
+        f"SELECT user_id, level, xp FROM finpet WHERE user_id IN ({placeholders})",
+        list(user_ids.values())
+    )
+    current = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+    current_time = datetime.now().isoformat()
+    updates = []
+    levels_gained = {}
+    for username, xp_amount in totals.items():
+        user_id = user_ids[username]
+        level, xp = current.get(user_id, (1, 0))
+        new_level, new_xp, next_level_xp = achievements.apply_xp(level, xp, xp_amount)
+        updates.append((user_id, new_level, new_xp, next_level_xp, current_time))
+        levels_gained[username] = new_level - level
+
+    cursor.executemany('''
+    INSERT INTO finpet (user_id, level, xp, next_level_xp, last_fed) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (user_id) DO UPDATE SET
+        level = excluded.level,
+        xp = excluded.xp,
+        next_level_xp = excluded.next_level_xp,
+        last_fed = excluded.last_fed
+    ''', updates)
+    if commit:
         conn.commit()
-        return False  # No level up
+
+    # Level milestone rewards are declared in achievements.RULES
+    for username, gained in levels_gained.items():
+        if gained > 0:
+            check_milestone_rewards(username, ("level",), commit)
+    return levels_gained
+
+def get_recent_expenses(username, limit=5):
+    """Get a user's most recent expenses, newest first."""
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, description, amount_cents, category, type, date
+        FROM expenses
+        WHERE user_id = ?
+        ORDER BY date DESC
+        LIMIT ?
+    """, (get_user_id(username), limit))
+    return [dict(row) for row in cursor.fetchall()]
+
+def get_expenses_between(username, start_date, end_date, expense_type=None):
+    """Get a user's expenses dated within [start_date, end_date], newest first."""
+    query = "SELECT * FROM expenses WHERE user_id = ? AND date >= ? AND date <= ?"
+    params = [get_user_id(username), start_date.isoformat(), end_date.isoformat()]
+    if expense_type is not None:
+        query += " AND type = ?"
+        params.append(expense_type)
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute(query + " ORDER BY date DESC", params)
+    return [dict(row) for row in cursor.fetchall()]
+
+def search_expenses(username, text, start=None, end=None, category=None, expense_type=None, page=0):
+    """One ranked page of the user's expenses matching text, with the history filters. Returns (rows, total)."""
+    return search.search_expenses(get_db(), get_user_id(username), text, start, end, category, expense_type, page)
+
+def get_duplicate_expenses(username):
+    """The user's expenses flagged as likely duplicate submissions, newest first."""
+    return duplicates.get_flagged(get_db(), get_user_id(username))
+
+def get_matching_expense_ids(username, text):
+    """Ids of all of the user's expenses matching text."""
+    return search.matching_ids(get_db(), get_user_id(username), text)
+
+@storage.serialized_write
+def update_finpet_name(username, new_name):
+    """Rename a user's FinPet."""
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("UPDATE finpet SET name = ? WHERE user_id = ?", (new_name, get_user_id(username)))
+    conn.commit()
+    return cursor.rowcount > 0
+
+@storage.serialized_write
+def update_wants_budget(username, budget_cents):
+    """Set a user's per-period 'wants' budget in cents."""
+    user_id = get_user_id(username)
+    conn = get_db()
+    cursor = conn.cursor()
+    # users.wants_budget_cents only seeds the budget row; kept in step for older readers
+    cursor.execute("UPDATE users SET wants_budget_cents = ? WHERE id = ?", (int(budget_cents), user_id))
+    return budgets.set_limit(conn, budgets.ensure_wants_budget(conn, user_id), budget_cents)
+
+@storage.serialized_write
+def update_wants_budget_period(username, period, week_start=0):
+    """Switch the 'wants' budget between weekly and monthly periods, and set the week's first day (0 = Monday)."""
+    conn = get_db()
+    budget_id = budgets.ensure_wants_budget(conn, get_user_id(username))
+    return budgets.set_period(conn, budget_id, period, week_start)
 
 # ------------------------
 # Data processing functions
 # ------------------------
 
 def get_expenses_df(username):
-    """Convert expenses to a pandas DataFrame."""
+    """Convert expenses to a pandas DataFrame with an int64 amount_cents column."""
     expenses = get_user_expenses(username)
     if not expenses:
-        return pd.DataFrame(columns=["description", "amount", "date", "category", "type"])
-    return pd.DataFrame(expenses)
+        return pd.DataFrame({
+            "description": pd.Series(dtype="object"),
+            "amount_cents": pd.Series(dtype="int64"),
+            "date": pd.Series(dtype="datetime64[ns]"),
+            "category": pd.Series(dtype="object"),
+            "type": pd.Series(dtype="object"),
+        })
+    df = pd.DataFrame(expenses)
+    df["amount_cents"] = df["amount_cents"].astype("int64")
+    return df
+
+def get_expense_store(username):
+    """The user's columnar expense store (see columnar.py), built on first use."""
+    return columnar.get_store(get_db(), get_user_id(username))
 
 def get_weekly_spending(username):
-    """Get spending data for the last 7 days by day."""
-    df = get_expenses_df(username)
-    if df.empty:
-        dates = [(datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(6, -1, -1)]
-        return pd.DataFrame({"date": dates, "amount": [0] * 7})
-    
-    if 'date' in df.columns:
-        df['date'] = pd.to_datetime(df['date'])
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=7)
-        mask = (df['date'] >= start_date) & (df['date'] <= end_date)
-        recent_df = df[mask].copy()
-        if not recent_df.empty:
-            recent_df['day'] = recent_df['date'].dt.strftime('%Y-%m-%d')
-            daily_spending = recent_df.groupby('day')['amount'].sum().reset_index()
-            all_days = pd.DataFrame({
-                'day': [(end_date - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(6, -1, -1)]
-            })
-            result = pd.merge(all_days, daily_spending, on='day', how='left').fillna(0)
-            return result
-    dates = [(datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(6, -1, -1)]
-    return pd.DataFrame({"day": dates, "amount": [0] * 7})
+    """Get spending data for the last 7 days by day, in cents with a dollar 'amount' column for charts."""
+    end_date = datetime.now()
+    first_day = (end_date - timedelta(days=6)).date()
+    totals = columnar.daily_totals(get_expense_store(username), first_day, 7, end=end_date)
+    return money.cents_column(pd.DataFrame({
+        "day": [(first_day + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(7)],
+        "amount_cents": totals,
+    }))
 
 def get_category_spending(username):
-    """Get spending by category."""
-    df = get_expenses_df(username)
-    if df.empty or 'category' not in df.columns:
-        return pd.DataFrame(columns=["category", "amount"])
-    return df.groupby('category')['amount'].sum().reset_index()
+    """Get spending by category, in cents with a dollar 'amount' column for charts."""
+    totals = columnar.totals_by(get_expense_store(username), "category")
+    if not totals:
+        return pd.DataFrame(columns=["category", "amount_cents", "amount"])
+    df = pd.DataFrame({"category": list(totals), "amount_cents": pd.Series(list(totals.values()), dtype="int64")})
+    return money.cents_column(df.sort_values("category", ignore_index=True))
 
 def get_needs_wants_ratio(username):
-    """Calculate the ratio of needs vs wants spending."""
-    df = get_expenses_df(username)
-    if df.empty or 'type' not in df.columns:
-        return {"Needs": 0, "Wants": 0}
-    type_spending = df.groupby('type')['amount'].sum().to_dict()
-    return type_spending
+    """Get needs vs wants spending in cents from the user's running counters."""
+    counters = achievements.get_counters(get_db(), get_user_id(username))
+    return {"Needs": counters["needs_cents"], "Wants": counters["wants_cents"]}
 
 # ------------------------
 # Dashboard helper functions
 # ------------------------
 
 def get_current_balance():
-    """Get current balance for the logged-in user."""
+    """Get current balance in cents for the logged-in user."""
     if not st.session_state.logged_in:
         return 0
-    funds = get_user_funds(st.session_state.username)
-    return funds.get("balance", 0)
+    get_user_funds(st.session_state.username)  # Make sure the funds row exists
+    return ledger.get_balance(get_db(), get_user_id(st.session_state.username))
 
 def get_weekly_expenses():
-    """Get total expenses for the current week."""
+    """Get total expenses in cents for the current week."""
     if not st.session_state.logged_in:
         return 0
-    df = get_expenses_df(st.session_state.username)
-    if df.empty:
-        return 0
-    if 'date' in df.columns:
-        df['date'] = pd.to_datetime(df['date'])
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=7)
-        mask = (df['date'] >= start_date) & (df['date'] <= end_date)
-        recent_df = df[mask]
-        if not recent_df.empty:
-            return recent_df['amount'].sum()
-    return 0
+    end_date = datetime.now()
+    return columnar.total_between(get_expense_store(st.session_state.username), end_date - timedelta(days=7), end_date)
 
 def get_expense_trend():
     """Calculate the trend in expenses compared to previous week."""
     if not st.session_state.logged_in:
         return 0
-    df = get_expenses_df(st.session_state.username)
-    if df.empty:
-        return 0
-    if 'date' in df.columns:
-        df['date'] = pd.to_datetime(df['date'])
-        current_end = datetime.now()
-        current_start = current_end - timedelta(days=7)
-        prev_end = current_start
-        prev_start = prev_end - timedelta(days=7)
-        current_total = df[(df['date'] >= current_start) & (df['date'] <= current_end)]['amount'].sum() if not df[(df['date'] >= current_start) & (df['date'] <= current_end)].empty else 0
-        prev_total = df[(df['date'] >= prev_start) & (df['date'] <= prev_end)]['amount'].sum() if not df[(df['date'] >= prev_start) & (df['date'] <= prev_end)].empty else 1
-        if prev_total == 0:
-            return 0
-        percent_change = ((current_total - prev_total) / prev_total) * 100
-        return percent_change
-    return 0
+    store = get_expense_store(st.session_state.username)
+    current_end = datetime.now()
+    current_start = current_end - timedelta(days=7)
+    prev_start = current_start - timedelta(days=7)
+    current_total = columnar.total_between(store, current_start, current_end)
+    # A previous week without spending counts as 1 cent, as before
+    prev_total = columnar.total_between(store, prev_start, current_start) or 1
+    return ((current_total - prev_total) / prev_total) * 100
 
 def plot_spending_trend(username):
     """Create a line chart of daily spending for the last 7 days."""
@@ -480,53 +688,129 @@ def plot_category_breakdown(username, chart_type="pie"):
         ).interactive()
         return chart
 
+def get_wants_budget_status(username):
+    """
+    Get the 'wants' budget for the current calendar period as a dict.
+
+    Includes limit_cents, spent_cents, remaining_cents, period, week_start,
+    period_start and period_end. Reads one per-period counter row.
+    """
+    return budgets.get_budget(get_db(), _wants_budget_id(username))
+
+def get_wants_budget_history(username, periods=4):
+    """Get (period_start, spent_cents) pairs for the last few 'wants' budget periods, oldest first."""
+    return budgets.get_history(get_db(), _wants_budget_id(username), periods)
+
+def _wants_budget_id(username):
+    # Seeded at registration and on startup, so this normally only reads
+    budget_id = budgets.get_wants_budget_id(get_db(), get_user_id(username))
+    if budget_id is None:
+        budget_id = _create_wants_budget(username)
+    return budget_id
+
+@storage.serialized_write
+def _create_wants_budget(username):
+    return budgets.ensure_wants_budget(get_db(), get_user_id(username))
+
 def get_weekly_wants_budget(username):
-    """Get the weekly budget for 'wants' expenses."""
+    """Get the budget for 'wants' expenses in cents."""
+    return get_wants_budget_status(username)["limit_cents"]
+
+def get_weekly_wants_spending(username):
+    """Get the current budget period's 'wants' spending in cents."""
+    return get_wants_budget_status(username)["spent_cents"]
+
+def get_envelopes(username):
+    """Get all of a user's category envelopes evaluated for the current period, as a DataFrame."""
+    return budgets.evaluate_envelopes(get_db(), get_user_id(username))
+
+@storage.serialized_write
+def add_envelope(username, category, limit_cents, period="month", rollover=True):
+    """Create a category envelope budget in cents. Returns False if the category already has one."""
+    budget_id = budgets.create_envelope(get_db(), get_user_id(username), category, limit_cents, period, rollover)
+    return budget_id is not None
+
+@storage.serialized_write
+def update_envelope_limit(username, budget_id, limit_cents):
+    """Change an envelope's per-period limit in cents, from the current period on."""
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute("SELECT wants_budget FROM users WHERE username = ?", (username,))
-    row = cursor.fetchone()
-    if row:
-        return row[0]
-    return 100.0
+    cursor.execute("SELECT 1 FROM budgets WHERE id = ? AND user_id = ?", (budget_id, get_user_id(username)))
+    if cursor.fetchone() is None:
+        return False
+    return budgets.set_limit(conn, budget_id, limit_cents)
 
-def get_weekly_wants_spending(username):
-    """Calculate the current week's 'wants' spending."""
-    df = get_expenses_df(username)
-    if df.empty:
-        return 0
-    if 'date' in df.columns and 'type' in df.columns:
-        df['date'] = pd.to_datetime(df['date'])
-        current_end = datetime.now()
-        current_start = current_end - timedelta(days=7)
-        mask = ((df['date'] >= current_start) & (df['date'] <= current_end) & (df['type'] == 'Wants'))
-        current_wants = df[mask]
-        return current_wants['amount'].sum() if not current_wants.empty else 0
-    return 0
+@storage.serialized_write
+def delete_envelope(username, budget_id):
+    """Delete one of a user's envelopes."""
+    return budgets.delete_budget(get_db(), get_user_id(username), budget_id)
+
+def get_recurring_expenses(username):
+    """Get the user's recurring expenses as of the last scan; adding an expense queues a new one."""
+    return recurring.get_series(get_db(), get_user_id(username))
+
+@storage.serialized_write
+def set_recurring_auto_create(username, series_id, enabled):
+    """Turn automatic entry of a recurring expense on or off."""
+    return recurring.set_auto_create(get_db(), get_user_id(username), series_id, enabled)
+
+@storage.serialized_write
+def create_due_recurring_expenses(username):
+    """Enter every auto-created recurring expense that has come due, in one transaction. Returns the expenses added."""
+    conn = get_db()
+    user_id = get_user_id(username)
+    due = recurring.get_due(conn, user_id)
+    if not due:
+        return []
+    get_user_funds(username)  # Make sure the funds row exists
+    created = []
+    for series, charge_date in due:
+        date = datetime.combine(charge_date, datetime.min.time())
+        expense_id = _record_expense(conn, user_id, series["description"], series["amount_cents"], date, series["category"], series["type"])
+        recurring.mark_created(conn, series["id"], charge_date)
+        created.append({
+            "id": expense_id,
+            "description": series["description"],
+            "amount_cents": series["amount_cents"],
+            "date": date,
+            "category": series["category"],
+            "type": series["type"],
+        })
+    conn.commit()
+    outbox.notify()
+    for expense in created:
+        suggestions.record(user_id, expense["description"], expense["amount_cents"], expense["date"],
+                           expense["category"], expense["type"])
+        columnar.append(user_id, expense["id"], expense["date"], expense["amount_cents"], expense["category"], expense["type"])
+    return created
+
+def get_recurring_forecast(username):
+    """Expected recurring charges in the next calendar month as (charges DataFrame, {type: cents})."""
+    start = budgets.next_period_start(budgets.period_start(datetime.now(), "month"), "month")
+    charges = recurring.forecast(get_db(), get_user_id(username), start, budgets.next_period_start(start, "month"))
+    return charges, charges.groupby("type")["amount_cents"].sum().to_dict()
 
 def generate_savings_tips(username):
     """Generate personalized savings tips based on spending patterns."""
-    df = get_expenses_df(username)
-    if df.empty:
+    store = get_expense_store(username)
+    if store["size"] == 0:
         return ["Start tracking your expenses to get personalized savings tips!"]
     tips = []
     tips.append("Set up automatic transfers to your savings account on payday.")
     tips.append("Try the 50/30/20 rule: 50% for needs, 30% for wants, 20% for savings.")
-    if 'category' in df.columns:
-        category_spending = df.groupby('category')['amount'].sum()
-        if 'Food' in category_spending and category_spending['Food'] > 100:
-            tips.append("Consider meal planning to reduce your food expenses.")
-        if 'Entertainment' in category_spending and category_spending['Entertainment'] > 50:
-            tips.append("Look for free or low-cost entertainment options in your area.")
-        if 'Shopping' in category_spending and category_spending['Shopping'] > 100:
-            tips.append("Try a 24-hour waiting period before making non-essential purchases.")
-    if 'type' in df.columns:
-        type_spending = df.groupby('type')['amount'].sum()
-        total = type_spending.sum()
-        if 'Wants' in type_spending and total > 0:
-            wants_percentage = (type_spending.get('Wants', 0) / total) * 100
-            if wants_percentage > 40:
-                tips.append(f"Your 'wants' spending is {wants_percentage:.1f}% of your total. Try to keep it under 30%.")
+    category_spending = columnar.totals_by(store, "category")
+    if category_spending.get('Food', 0) > money.to_cents(100):
+        tips.append("Consider meal planning to reduce your food expenses.")
+    if category_spending.get('Entertainment', 0) > money.to_cents(50):
+        tips.append("Look for free or low-cost entertainment options in your area.")
+    if category_spending.get('Shopping', 0) > money.to_cents(100):
+        tips.append("Try a 24-hour waiting period before making non-essential purchases.")
+    type_spending = columnar.totals_by(store, "type")
+    total = sum(type_spending.values())
+    if 'Wants' in type_spending and total > 0:
+        wants_percentage = (type_spending['Wants'] / total) * 100
+        if wants_percentage > 40:
+            tips.append(f"Your 'wants' spending is {wants_percentage:.1f}% of your total. Try to keep it under 30%.")
     if not get_zen_mode_status(username):
         tips.append("Activate Zen Mode to help you save money on non-essential purchases.")
     if len(tips) > 5:
@@ -0,0 +1,167 @@
+import argparse
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import archive
+import database
+import money
+
+# Zen Mode history and impact. Every activation and deactivation is logged in
+# zen_mode_events; the impact of each activation is measured by comparing the
+# user's daily wants spending in a window before it with the spending while it
+# lasted. Each window total is one range aggregate on the covering
+# idx_expenses_user_type_date index.
+
+# Days of wants spending compared on each side of an activation
+IMPACT_WINDOW_DAYS = 30
+
+# Sessions shorter than this are listed but left out of the overall impact
+MIN_SESSION_DAYS = 1
+
+# ------------------------
+# Events
+# ------------------------
+
+def set_zen_mode(conn, user_id, active, date=None):
+    """Turn Zen Mode on or off, logging the change. Runs in the caller's transaction. Returns True if it changed."""
+    cursor = conn.cursor()
+    cursor.execute("UPDATE users SET zen_mode = ? WHERE id = ? AND zen_mode IS NOT ?", (int(active), user_id, int(active)))
+    if cursor.rowcount == 0:
+        return False
+    date = date or datetime.now()
+    cursor.execute(
+        "INSERT INTO zen_mode_events (user_id, active, date) VALUES (?, ?, ?)",
+        (user_id, int(active), date.isoformat())
+    )
+    return True
+
+def get_events(conn, user_id):
+    """Get a user's Zen Mode changes, oldest first."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT active, date FROM zen_mode_events WHERE user_id = ? ORDER BY date, id", (user_id,))
+    return [{"active": bool(row[0]), "date": row[1]} for row in cursor.fetchall()]
+
+# ------------------------
+# Impact
+# ------------------------
+
+# ISO 8601 with a "T" so bounds compare correctly against stored expense dates. Whole
+# seconds: isoformat() leaves out a zero fraction, and "...:00" sorts before "...:00.000"
+_ISO = "'%Y-%m-%dT%H:%M:%S'"
+
+_IMPACT_QUERY = f'''
+WITH events AS (
+    SELECT active, date,
+           LEAD(date) OVER (ORDER BY date, id) AS next_date
+    FROM zen_mode_events
+    WHERE user_id = :user_id
+),
+sessions AS (
+    SELECT date AS started,
+           COALESCE(next_date, :now) AS ended,
+           next_date IS NULL AS ongoing,
+           MAX(strftime({_ISO}, date, '-{IMPACT_WINDOW_DAYS} days'),
+               MIN(date, COALESCE(:archived_first, (SELECT MIN(date) FROM expenses WHERE user_id = :user_id), date))) AS before_start,
+           MIN(COALESCE(next_date, :now), strftime({_ISO}, date, '+{IMPACT_WINDOW_DAYS} days')) AS after_end
+    FROM events
+    WHERE active
+)
+SELECT started, ended, ongoing, before_start, after_end,
+       julianday(started) - julianday(before_start) AS before_days,
+       julianday(after_end) - julianday(started) AS after_days,
+       (SELECT COALESCE(SUM(amount_cents), 0) FROM expenses
+        WHERE user_id = :user_id AND type = 'Wants' AND date >= before_start AND date < started) AS before_cents,
+       (SELECT COALESCE(SUM(amount_cents), 0) FROM expenses
+        WHERE user_id = :user_id AND type = 'Wants' AND date >= started AND date < after_end) AS after_cents
+FROM sessions
+ORDER BY started
+'''
+
+def session_impact(conn, user_id, now=None):
+    """
+    Wants spending before and during each Zen Mode activation.
+
+    Returns a DataFrame with one row per activation: daily wants spending in the
+    window before it and while it was on (up to IMPACT_WINDOW_DAYS each side),
+    the change in percent, and saved_cents, the before-rate difference over the
+    days measured.
+    """
+    now = now or datetime.now()
+    cold = archive.open_archive(conn, user_id)
+    if cold is not None and cold["rows"] == 0:
+        cold = None
+    # Archived expenses are older than the hot ones, so only the first can start the history
+    archived_first = None
+    if cold is not None:
+        archived_first = str(np.asarray(cold["micros"]).min().astype("datetime64[us]"))
+    df = pd.read_sql_query(_IMPACT_QUERY, conn, params={
+        "user_id": user_id, "now": now.isoformat(), "archived_first": archived_first,
+    })
+    if df.empty:
+        return df
+    # Windows reaching back before the archive's end also count archived wants
+    if cold is not None and (df["before_start"] < cold["through"]).any():
+        df["before_cents"] += archive.sums_between(cold, list(zip(df["before_start"], df["started"])), "Wants")
+        df["after_cents"] += archive.sums_between(cold, list(zip(df["started"], df["after_end"])), "Wants")
+    df["ongoing"] = df["ongoing"].astype(bool)
+    df["before_daily_cents"] = (df["before_cents"] / df["before_days"].where(df["before_days"] > 0)).fillna(0.0)
+    df["after_daily_cents"] = (df["after_cents"] / df["after_days"].where(df["after_days"] > 0)).fillna(0.0)
+    df["change_pct"] = (df["after_daily_cents"] / df["before_daily_cents"].where(df["before_daily_cents"] > 0) - 1) * 100
+    df["saved_cents"] = ((df["before_daily_cents"] - df["after_daily_cents"]) * df["after_days"]).round().astype("int64")
+    df["measured"] = (df["after_days"] >= MIN_SESSION_DAYS) & (df["before_days"] > 0)
+    return df
+
+def summarize_impact(sessions):
+    """Overall impact across measured sessions, or None if there are none."""
+    if sessions.empty:
+        return None
+    measured = sessions[sessions["measured"]]
+    if measured.empty:
+        return None
+    before_days = measured["before_days"].sum()
+    after_days = measured["after_days"].sum()
+    before_daily = measured["before_cents"].sum() / before_days
+    after_daily = measured["after_cents"].sum() / after_days
+    return {
+        "sessions": len(measured),
+        "zen_days": after_days,
+        "before_daily_cents": before_daily,
+        "after_daily_cents": after_daily,
+        "change_pct": (after_daily / before_daily - 1) * 100 if before_daily > 0 else None,
+        "saved_cents": int(measured["saved_cents"].sum()),
+    }
+
+# ------------------------
+# Command line interface
+# ------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report a user's Zen Mode impact.")
+    parser.add_argument("command", choices=["impact"])
+    parser.add_argument("--db", default=database.get_db_path(), help="SQLite database file")
+    parser.add_argument("--user", required=True, help="username to report on")
+    args = parser.parse_args(argv)
+
+    conn = database.connect(args.db)
+    try:
+        sessions = session_impact(conn, database.get_user_id(args.user, conn))
+        for session in sessions.itertuples():
+            print(
+                f"{session.started[:10]}: {money.format_money(round(session.before_daily_cents))}/day before, "
+                f"{money.format_money(round(session.after_daily_cents))}/day during ({session.after_days:.1f} days), "
+                f"saved {money.format_money(session.saved_cents)}"
+            )
+        summary = summarize_impact(sessions)
+        if summary is None:
+            print("No Zen Mode sessions to measure yet")
+        else:
+            print(f"Total saved over {summary['sessions']} sessions: {money.format_money(summary['saved_cents'])}")
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())